@@ -0,0 +1,68 @@
+"""Adaptive network caching: the cache size VLC gets per origin as history builds up.
+
+Runs one fixture server per simulated origin latency and opens a series of
+distinct media URLs from each through a host with ``probe_media`` and
+``adaptive_caching`` enabled (fake VLC in ``rc`` mode). Reports the
+``:network-caching`` option each click reached the player with, the learned
+per-origin averages, and the size of the persisted store.
+
+    python benchmarks/bench_adaptive_caching.py --latencies-ms 1,40,150 --clicks 8
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, free_port
+from http_fixtures import FixtureServer
+
+
+def caching_of(options):
+    for option in options:
+        if option.startswith(":network-caching="):
+            return int(option.split("=", 1)[1])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latencies-ms", default="1,40,150", help="comma-separated latency per origin")
+    parser.add_argument("--clicks", type=int, default=8, help="distinct URLs opened per origin")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    latencies = [float(value) for value in args.latencies_ms.split(",")]
+
+    state_dir = tempfile.mkdtemp(prefix="vlc_opener_origins_")
+    config = {"player_mode": "rc", "rc_port": free_port(), "probe_media": True,
+              "adaptive_caching": True, "state_dir": state_dir}
+    origins = {}
+    opened = 0
+    with contextlib.ExitStack() as stack:
+        servers = [stack.enter_context(FixtureServer(latency=latency / 1000)) for latency in latencies]
+        with HostEnvironment(config, player=FAKE_VLC) as environment:
+            host = HostProcess(environment)
+            for latency, server in zip(latencies, servers):
+                urls = [f"{server.base_url}/media/mp4/clip{index}.mp4" for index in range(args.clicks)]
+                for url in urls:
+                    reply = host.request({"url": url})
+                    assert reply.get("success"), reply
+                opened += len(urls)
+                environment.wait_for_events("play", opened)
+                plays = {event["url"]: event["options"] for event in environment.player_events("play")}
+                origins[server.base_url] = {"latency_ms": latency,
+                                            "caching": [caching_of(plays.get(url, [])) for url in urls]}
+            host.close()
+        store_path = os.path.join(state_dir, "origin_stats.json")
+        store_bytes = os.path.getsize(store_path) if os.path.exists(store_path) else 0
+
+    report = {
+        "benchmark": "adaptive_caching",
+        "clicks": args.clicks,
+        "origins": origins,
+        "store_bytes": store_bytes,
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Memory and latency with many clients: one host each vs. a shared broker.
+
+Simulates 1, 4 and 16 browser profiles, each with its own native host
+process. In ``standalone`` mode every host serves its client in-process; in
+``broker`` mode the hosts are thin forwarders to one shared daemon. Reports
+the total resident memory of all host processes (plus the daemon) and the
+request latency while every client clicks concurrently.
+
+``foreign`` runs a host whose broker port is held by another user's daemon
+(one with a different state directory, so a different token): it must serve
+its client itself at once rather than wait out a daemon startup (the script
+exits non-zero if it takes more than 2 s).
+
+    python benchmarks/bench_broker.py --clients 1,4,16 --clicks 20
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+
+from harness import HostEnvironment, HostProcess, emit, free_port, rss_kb, summarize
+
+
+def client_loop(host, clicks, samples, index):
+    for click in range(clicks):
+        start = time.monotonic()
+        reply = host.request({"id": click, "url": f"https://example.com/{index}/{click}.mp4"})
+        samples.append(time.monotonic() - start)
+        assert reply.get("success"), reply
+
+
+def run(mode, clients, args):
+    config = {}
+    if mode == "broker":
+        config = {"broker": True, "broker_port": free_port(), "broker_idle_timeout": 1,
+                  "state_dir": tempfile.mkdtemp(prefix="vlc_opener_broker_")}
+    with HostEnvironment(config) as environment:
+        connect_samples = []
+        hosts = []
+        for _ in range(clients):
+            start = time.monotonic()
+            host = HostProcess(environment)
+            ping = host.request({"action": "ping"})
+            connect_samples.append(time.monotonic() - start)
+            hosts.append(host)
+        pids = {host.process.pid for host in hosts} | {ping["pid"]}
+
+        samples = []
+        threads = [threading.Thread(target=client_loop, args=(host, args.clicks, samples, index))
+                   for index, host in enumerate(hosts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rss = sum(rss_kb(pid) for pid in pids)
+        for host in hosts:
+            host.close()
+    return {
+        "processes": len(pids),
+        "rss_mb": round(rss / 1024, 1),
+        "connect": summarize(connect_samples),
+        "click_to_reply": summarize(samples),
+    }
+
+
+def run_foreign():
+    port = free_port()
+    config = {"broker": True, "broker_port": port, "broker_idle_timeout": 5}
+    with HostEnvironment(dict(config, state_dir=tempfile.mkdtemp(prefix="vlc_opener_broker_"))) as owner_env:
+        owner = HostProcess(owner_env)
+        owner_pid = owner.request({"action": "ping"})["pid"]
+        with HostEnvironment(dict(config, state_dir=tempfile.mkdtemp(prefix="vlc_opener_broker_"))) as environment:
+            start = time.monotonic()
+            host = HostProcess(environment)
+            ping = host.request({"action": "ping"})
+            elapsed = time.monotonic() - start
+            reply = host.request({"url": "https://example.com/foreign.mp4"})
+            host.close()
+        owner.close()
+    return {"first_reply_ms": round(elapsed * 1000, 1), "served_in_process": ping["pid"] == host.process.pid,
+            "owner_pid": owner_pid, "open_success": bool(reply.get("success"))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", default="1,4,16", help="comma-separated client counts")
+    parser.add_argument("--clicks", type=int, default=20, help="clicks per client")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    report = {"benchmark": "broker", "clicks_per_client": args.clicks, "clients": {}}
+    for clients in args.clients.split(","):
+        report["clients"][clients] = {mode: run(mode, int(clients), args) for mode in ("standalone", "broker")}
+    report["foreign"] = run_foreign()
+    emit(report, args.output)
+    if not report["foreign"]["served_in_process"] or report["foreign"]["first_reply_ms"] > 2000:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
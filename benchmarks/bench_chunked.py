@@ -0,0 +1,119 @@
+"""Chunked messages: throughput and host memory for multi-megabyte payloads.
+
+Inbound, sends an ``enqueue`` request whose URL list totals N MB as chunked
+frames, keeping the protocol's window of unacknowledged chunks, to a host
+running ``slow_host.py`` (so the player itself costs nothing). Outbound,
+fills a host's persisted resolve cache to about N MB and asks for a ``dump``,
+acknowledging chunks as they arrive. Reports MB/s and the host's peak RSS
+(VmHWM), which should not grow with the payload size.
+
+    python benchmarks/bench_chunked.py --sizes-mb 4,16,64
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, HostEnvironment, HostProcess, emit, peak_rss_kb
+from vlc_host.chunked import CHUNK_BYTES, WINDOW, batches
+
+SLOW_HOST = os.path.join(REPO_DIR, "benchmarks", "slow_host.py")
+URL_PADDING = "x" * 160
+
+
+def urls(total_bytes):
+    index, sent = 0, 0
+    while sent < total_bytes:
+        url = f"https://cdn.example.com/{URL_PADDING}/{index}.mp4"
+        sent += len(url) + 3
+        index += 1
+        yield url
+
+
+def run_inbound(size_mb):
+    with HostEnvironment({"dedupe_window": 0}) as environment:
+        host = HostProcess(environment, [sys.executable, SLOW_HOST])
+        host.request({"action": "ping"})
+        idle_kb = peak_rss_kb(host.process.pid)
+        acked, chunk, sent_bytes = -1, 0, 0
+        start = time.perf_counter()
+        items = list(batches(urls(size_mb * 1024 * 1024), CHUNK_BYTES))
+        reply = None
+        for chunk, batch in enumerate(items):
+            while chunk - acked > WINDOW:
+                message = host.receive()
+                acked = message["ack"]
+            frame = {"id": 1, "chunk": chunk, "more": chunk < len(items) - 1, "items": batch}
+            if chunk == 0:
+                frame["action"] = "enqueue"
+            sent_bytes += len(json.dumps(frame))
+            host.send(frame)
+        while reply is None:
+            message = host.receive()
+            if "ack" not in message:
+                reply = message
+        elapsed = time.perf_counter() - start
+        assert reply.get("success"), reply
+        peak_kb = peak_rss_kb(host.process.pid)
+        host.close()
+    return {"size_mb": size_mb, "chunks": len(items), "enqueued": reply["enqueued"],
+            "mb_per_s": round(sent_bytes / elapsed / 1e6, 1), "seconds": round(elapsed, 3),
+            "idle_peak_rss_kb": idle_kb, "peak_rss_kb": peak_kb}
+
+
+def run_outbound(size_mb):
+    state_dir = tempfile.mkdtemp(prefix="vlc_opener_chunked_")
+    entries, expires_at = [], time.time() + 3600
+    for index, url in enumerate(urls(size_mb * 1024 * 1024)):
+        entries.append([url, url.replace("cdn.", "edge."), expires_at])
+    with open(os.path.join(state_dir, "resolve_cache.json"), "w") as f:
+        json.dump({"entries": entries}, f)
+    config = {"resolve_urls": True, "resolve_cache_size": len(entries), "resolve_ttl": 3600,
+              "state_dir": state_dir}
+    del entries
+    with HostEnvironment(config) as environment:
+        host = HostProcess(environment)
+        host.request({"action": "ping"})
+        loaded_kb = peak_rss_kb(host.process.pid)
+        received_bytes, received_items, chunks = 0, 0, 0
+        start = time.perf_counter()
+        host.send({"id": 1, "action": "dump"})
+        while True:
+            message = host.receive()
+            received_bytes += len(json.dumps(message))
+            received_items += len(message.get("items", []))
+            if "chunk" not in message:
+                break
+            chunks += 1
+            host.send({"id": 1, "ack": message["chunk"]})
+            if not message["more"]:
+                break
+        elapsed = time.perf_counter() - start
+        peak_kb = peak_rss_kb(host.process.pid)
+        host.close()
+    return {"size_mb": size_mb, "chunks": chunks, "items": received_items,
+            "mb_per_s": round(received_bytes / elapsed / 1e6, 1), "seconds": round(elapsed, 3),
+            "loaded_peak_rss_kb": loaded_kb, "peak_rss_kb": peak_kb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", default="4,16,64", help="comma-separated payload sizes")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    sizes = [int(value) for value in args.sizes_mb.split(",")]
+
+    report = {
+        "benchmark": "chunked",
+        "chunk_bytes": CHUNK_BYTES,
+        "window": WINDOW,
+        "inbound_enqueue": [run_inbound(size) for size in sizes],
+        "outbound_dump": [run_outbound(size) for size in sizes],
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
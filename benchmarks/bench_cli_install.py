@@ -0,0 +1,99 @@
+"""Headless installs: time per install and many at once.
+
+Runs ``python -m vlc_installer`` with the Linux backend, each install into
+its own target directory and its own ``XDG_CONFIG_HOME`` (standing in for
+one workstation each), from the repository's ``src`` tree:
+
+- ``single``: one install at a time, fresh and then re-run unchanged
+- ``parallel``: ``--parallel`` installs started together, ``--batches``
+  times
+
+Reports the wall time per install process (interpreter start included),
+the installs per second (bounded by the CPUs: installs are mostly
+bytecode compilation), the exit statuses, that every install wrote its
+launcher and registered its host manifest, and the first install's JSON
+result.
+
+    python benchmarks/bench_cli_install.py --parallel 16
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from harness import REPO_DIR, emit, summarize
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+EXTENSION_ID = "abcdefghijklmnopabcdefghijklmnop"
+
+
+def run_install(workdir, name):
+    target = os.path.join(workdir, name, "app")
+    config_home = os.path.join(workdir, name, "config")
+    env = dict(os.environ, XDG_CONFIG_HOME=config_home, PYTHONPATH=SRC_DIR)
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-m", "vlc_installer", "--backend", "linux", "--vlc-path", "/usr/bin/vlc",
+         "--extension-id", EXTENSION_ID, "--target", target, "--resources", SRC_DIR],
+        env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    try:
+        result = json.loads(process.stdout)
+    except ValueError:
+        result = {"ok": False, "error": process.stderr[-500:]}
+    manifest = os.path.join(config_home, "google-chrome", "NativeMessagingHosts", "com.vlc.opener.json")
+    complete = os.access(os.path.join(target, "scripts", "vlc_opener.sh"), os.X_OK) and os.path.isfile(manifest)
+    return seconds, process.returncode, result, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--parallel", type=int, default=16)
+    parser.add_argument("--batches", type=int, default=3)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_cli_")
+    report = {"benchmark": "cli_install", "parallel": args.parallel}
+
+    fresh, rerun, statuses, complete = [], [], [], True
+    for run in range(args.runs):
+        for samples in (fresh, rerun):
+            seconds, status, result, done = run_install(workdir, f"single{run}")
+            samples.append(seconds)
+            statuses.append(status)
+            complete = complete and done
+            if run == 0 and samples is fresh:
+                report["fresh_result"] = result
+    report["single"] = {"fresh": summarize(fresh), "rerun": summarize(rerun),
+                        "statuses": sorted(set(statuses)), "complete": complete}
+
+    times, statuses, complete, walls = [], [], True, []
+    with ThreadPoolExecutor(args.parallel) as pool:
+        for batch in range(args.batches):
+            start = time.perf_counter()
+            names = [f"batch{batch}_{index}" for index in range(args.parallel)]
+            for seconds, status, _, done in pool.map(lambda name: run_install(workdir, name), names):
+                times.append(seconds)
+                statuses.append(status)
+                complete = complete and done
+            walls.append(time.perf_counter() - start)
+    report["parallel_runs"] = {
+        "per_install": summarize(times),
+        "batch_wall": summarize(walls),
+        "installs_per_second": round(args.parallel * args.batches / sum(walls), 1),
+        "statuses": sorted(set(statuses)),
+        "complete": complete,
+    }
+    shutil.rmtree(workdir)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Burst throughput of the host with mixed fast and slow requests.
+
+Sends a burst where every other request is slow (its open blocks for
+``--slow-ms``), for several ``max_concurrency`` limits, and reports the burst
+completion time, throughput and the latency of the fast requests. With
+concurrent handling the burst time should fall roughly in proportion to the
+limit instead of growing with the number of slow requests.
+
+    python benchmarks/bench_concurrency.py --burst 64 --limits 1,2,4,8,16
+"""
+import argparse
+import os
+import sys
+import time
+
+from harness import REPO_DIR, HostEnvironment, HostProcess, emit, summarize
+
+SLOW_HOST = os.path.join(REPO_DIR, "benchmarks", "slow_host.py")
+
+
+def run(limit, args):
+    with HostEnvironment({"max_concurrency": limit}, player_env={"SLOW_PLAYER_MS": str(args.slow_ms)}) as environment:
+        host = HostProcess(environment, [sys.executable, SLOW_HOST])
+        host.request({"action": "ping"})
+        sent = {}
+        start = time.monotonic()
+        for index in range(args.burst):
+            kind = "slow" if index % 2 else "fast"
+            sent[index] = (kind, time.monotonic())
+            host.send({"id": index, "url": f"https://example.com/{kind}/{index}.mp4"})
+        latency = {"fast": [], "slow": []}
+        order = []
+        for _ in range(args.burst):
+            reply = host.receive()
+            kind, sent_at = sent[reply["id"]]
+            latency[kind].append(time.monotonic() - sent_at)
+            order.append(reply["id"])
+        elapsed = time.monotonic() - start
+        host.close()
+    return {
+        "burst_seconds": round(elapsed, 3),
+        "requests_per_s": round(args.burst / elapsed, 1),
+        "fast": summarize(latency["fast"]),
+        "slow": summarize(latency["slow"]),
+        "out_of_order_replies": sum(1 for position, index in enumerate(order) if position != index),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=64)
+    parser.add_argument("--slow-ms", type=int, default=50)
+    parser.add_argument("--limits", default="1,2,4,8,16", help="comma-separated max_concurrency values")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    emit({
+        "benchmark": "concurrency",
+        "burst": args.burst,
+        "slow_ms": args.slow_ms,
+        "sequential_estimate_s": round(args.burst // 2 * args.slow_ms / 1000, 3),
+        "limits": {limit: run(int(limit), args) for limit in args.limits.split(",")},
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
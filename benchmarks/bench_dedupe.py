@@ -0,0 +1,88 @@
+"""Duplicate clicks: how many player execs N identical opens produce.
+
+Sends bursts of N back-to-back opens of the same URL (pipelined, like a
+double-click plus re-fired menu events) to one host using ``stub_player.sh``
+as VLC, with coalescing on and off (the baseline also turns off player
+reuse, i.e. the host's original behaviour), and counts the execs the stub recorded.
+A second scenario repeats the URL after the window has expired while the
+first player (the fake VLC, in spawn mode) is still running; with
+``reuse_players`` on (it is off by default in spawn mode) it is left alone
+instead of spawning another.
+
+    python benchmarks/bench_dedupe.py --clicks 10 --bursts 5
+"""
+import argparse
+import os
+import time
+
+from harness import FAKE_VLC, REPO_DIR, HostEnvironment, HostProcess, emit
+
+STUB_PLAYER = os.path.join(REPO_DIR, "benchmarks", "stub_player.sh")
+
+
+def count_execs(environment):
+    try:
+        with open(environment.exec_log) as f:
+            return sum(1 for line in f if line.startswith("exec\t"))
+    except FileNotFoundError:
+        return 0
+
+
+def run_bursts(args, window):
+    config = {"dedupe_window": window, "reuse_players": window > 0}
+    with HostEnvironment(config, player=STUB_PLAYER) as environment:
+        host = HostProcess(environment)
+        replies = []
+        for burst in range(args.bursts):
+            url = f"https://example.com/dedupe/{burst}.mp4"
+            for _ in range(args.clicks):
+                host.send({"url": url})
+            replies += [host.receive() for _ in range(args.clicks)]
+        dedupe = host.request({"action": "stats"})["dedupe"]
+        host.close()
+        # The stub appends its line as soon as it runs; give the last ones a moment.
+        time.sleep(0.2)
+        return {
+            "clicks": args.clicks * args.bursts,
+            "replies": len(replies),
+            "successful_replies": sum(1 for reply in replies if reply.get("success")),
+            "coalesced_replies": sum(1 for reply in replies if reply.get("coalesced")),
+            "execs": count_execs(environment),
+            "dedupe": dedupe,
+        }
+
+
+def run_reuse(args):
+    config = {"dedupe_window": args.window, "reuse_players": True}
+    with HostEnvironment(config, player=FAKE_VLC) as environment:
+        host = HostProcess(environment)
+        url = "https://example.com/dedupe/reuse.mp4"
+        players = []
+        for _ in range(3):
+            players.append(host.request({"url": url}).get("player"))
+            environment.wait_for_events("start", 1)
+            time.sleep(args.window + 0.05)
+        starts = len(environment.player_events("start"))
+        host.close()
+        return {"opens": len(players), "player": players, "execs": starts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=10, help="identical opens per burst")
+    parser.add_argument("--bursts", type=int, default=5, help="bursts, each with its own URL")
+    parser.add_argument("--window", type=float, default=0.3, help="dedupe window for the reuse scenario (s)")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "dedupe",
+        "coalesced": run_bursts(args, 2.0),
+        "no_coalescing": run_bursts(args, 0),
+        "reuse_after_window": run_reuse(args),
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Installer system check: what is found, how fast, and how fast again.
+
+Runs ``vlc_installer.discovery.Discovery`` against ``fake_windows``'s
+typical machine (VLC on a second drive plus an old 32-bit copy, Chrome per
+user, Python 3.8, 3.11 and 3.12), whose every registry and filesystem call
+sleeps ``--latency-ms``:
+
+- ``legacy``: the fixed paths the installer used to check, one after another
+- ``sequential``: every probe on one worker
+- ``concurrent``: every probe on ``--workers`` workers
+- ``relaunch``: the same again with the cache the last run wrote; only
+  the version reads are saved
+- ``updated``: a relaunch after VLC was updated in place and Python 3.13
+  was installed; both must be found
+
+Each reports the time, the time to the first finding, the registry and
+filesystem calls made and the best candidate per product.
+
+    python benchmarks/bench_discovery.py --latency-ms 2 --workers 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fake_windows import PYTHON_CORE, typical_machine
+from harness import REPO_DIR, emit, summarize
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.discovery import Discovery  # noqa: E402
+
+LEGACY_PATHS = {
+    "vlc": [r"C:\Program Files\VideoLAN\VLC\vlc.exe", r"C:\Program Files (x86)\VideoLAN\VLC\vlc.exe"],
+    "chrome": [r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+               r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+               r"C:\Users\user\AppData\Local\Google\Chrome\Application\chrome.exe"],
+}
+
+
+def run_legacy(system):
+    start = time.perf_counter()
+    best = {"python": None}
+    for product, paths in LEGACY_PATHS.items():
+        best[product] = next((path for path in paths if system.mtime(path) is not None), None)
+    seconds = time.perf_counter() - start
+    # The old check_python only looked at the interpreter running the installer.
+    return seconds, None, {product: {"path": path} for product, path in best.items()}
+
+
+def run_discovery(system, cache_path, workers):
+    finder = Discovery(system, cache_path, workers)
+    first = []
+    start = time.perf_counter()
+
+    def found(candidate):
+        if not first:
+            first.append(time.perf_counter() - start)
+
+    finder.run(on_found=found)
+    seconds = time.perf_counter() - start
+    best = {}
+    for product in finder.found:
+        candidate = finder.best(product, (3, 9) if product == "python" else None)
+        best[product] = candidate.to_dict() if candidate else None
+    return seconds, first[0] if first else None, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="per registry or filesystem call")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--uninstall-entries", type=int, default=200)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_discovery_")
+    scenarios = ("legacy", "sequential", "concurrent", "relaunch", "updated")
+    times = {name: [] for name in scenarios}
+    firsts = {name: [] for name in scenarios}
+    results = {}
+    for run in range(args.runs):
+        system = typical_machine(args.latency_ms / 1000, args.uninstall_entries)
+        cache_path = os.path.join(workdir, f"discovery{run}.json")
+        for name in scenarios:
+            before = system.calls
+            if name == "legacy":
+                seconds, first, best = run_legacy(system)
+            else:
+                if name == "updated":
+                    system.touch(r"D:\Apps\VideoLAN\VLC\vlc.exe", (3, 0, 22, 0))
+                    python = r"C:\Users\user\AppData\Local\Programs\Python\Python313\python.exe"
+                    system.add_file(python, (3, 13, 1, 150))
+                    system.add_key("HKCU", rf"{PYTHON_CORE}\3.13\InstallPath", ExecutablePath=python)
+                workers = 1 if name == "sequential" else args.workers
+                seconds, first, best = run_discovery(
+                    system, cache_path if name in ("concurrent", "relaunch", "updated") else None, workers)
+            times[name].append(seconds)
+            if first is not None:
+                firsts[name].append(first)
+            results[name] = {"calls": system.calls - before, "best": best}
+    shutil.rmtree(workdir)
+
+    report = {"benchmark": "discovery", "runs": args.runs, "latency_ms": args.latency_ms,
+              "workers": args.workers, "uninstall_entries": args.uninstall_entries}
+    for name in scenarios:
+        report[name] = dict(results[name], time=summarize(times[name]))
+        if firsts[name]:
+            report[name]["first_finding"] = summarize(firsts[name])
+    report["concurrent_speedup"] = round(
+        report["sequential"]["time"]["mean_ms"] / report["concurrent"]["time"]["mean_ms"], 1)
+    emit(report, args.output)
+    updated = report["updated"]["best"]
+    if updated["vlc"]["version"] != "3.0.22.0" or not updated["python"]["version"].startswith("3.13."):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
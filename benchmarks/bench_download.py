@@ -0,0 +1,128 @@
+"""Installer downloads: throughput, dropped connections, resume, cache and checksums.
+
+Downloads from the fixture server's ``/flaky`` route with
+``vlc_installer.download.Downloader``:
+
+- ``clean``: a file served at ``--kbps`` KiB/s per connection, over one
+  connection and over ``--parallel`` ranges
+- ``flaky``: the same with every response cut off after ``--drop-kb`` KiB;
+  the download must still complete and match its SHA-256
+- ``resume``: ``retries=0``, so every dropped connection fails the run; each
+  new run resumes the partial file instead of starting over. Reports the
+  runs needed and the bytes fetched in total
+- ``cache``: fetching the same URL again, then by digest from a second
+  downloader sharing the cache directory, then again after the cached file
+  was overwritten, with no digest given: it must be rejected and downloaded
+  again
+- ``checksum``: a wrong expected SHA-256 is rejected and nothing is cached
+
+    python benchmarks/bench_download.py --mb 16 --drop-kb 1500 --parallel 4
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from harness import REPO_DIR, emit
+from http_fixtures import FixtureServer, flaky_body
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.download import DownloadError, Downloader  # noqa: E402
+
+
+class Progress:
+    def __init__(self):
+        self.calls = 0
+        self.last = 0
+        self.backwards = 0
+
+    def __call__(self, done, total):
+        self.calls += 1
+        if done < self.last:
+            self.backwards += 1
+        self.last = done
+
+
+def timed_fetch(downloader, url, digest, expected=None):
+    # digest=None fetches by whatever the cache index says; verified against expected.
+    progress = Progress()
+    start = time.perf_counter()
+    path = downloader.fetch(url, digest, progress)
+    seconds = time.perf_counter() - start
+    with open(path, "rb") as f:
+        verified = hashlib.sha256(f.read()).hexdigest() == (expected or digest)
+    return dict(downloader.stats(), seconds=round(seconds, 3), verified=verified,
+                progress_calls=progress.calls, progress_backwards=progress.backwards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=16, help="file size in MiB")
+    parser.add_argument("--kbps", type=int, default=8192, help="per-connection rate limit, KiB/s")
+    parser.add_argument("--drop-kb", type=int, default=1500, help="bytes per response before it is cut off, KiB")
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    size_kb = args.mb * 1024
+    digest = hashlib.sha256(flaky_body(size_kb * 1024)).hexdigest()
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_download_")
+    report = {"benchmark": "download", "mb": args.mb, "kbps": args.kbps, "drop_kb": args.drop_kb}
+    with FixtureServer() as server:
+        def url(name, **query):
+            query = "&".join(f"{key}={value}" for key, value in query.items())
+            return f"{server.base_url}/flaky/{size_kb}/{name}.exe?{query}"
+
+        for scenario, query in (("clean", {"kbps": args.kbps}),
+                                ("flaky", {"kbps": args.kbps, "drop_kb": args.drop_kb})):
+            report[scenario] = {}
+            for parallel in (1, args.parallel):
+                downloader = Downloader(os.path.join(workdir, f"{scenario}{parallel}"), parallel=parallel)
+                result = timed_fetch(downloader, url(scenario, **query), digest)
+                result["mb_per_s"] = round(args.mb * 1.048576 / result["seconds"], 1)
+                report[scenario][f"parallel_{parallel}"] = result
+
+        cache_dir = os.path.join(workdir, "resume")
+        runs, fetched = 0, 0
+        while True:
+            runs += 1
+            progress = Progress()
+            downloader = Downloader(cache_dir, retries=0)
+            try:
+                downloader.fetch(url("resume", drop_kb=args.drop_kb), digest, progress)
+                break
+            except DownloadError:
+                pass
+            finally:
+                fetched += progress.last - downloader.resumed_bytes
+        report["resume"] = {"runs": runs, "fetched_mb": round(fetched / 1048576, 2),
+                            "expected_runs": -(-size_kb // args.drop_kb)}
+
+        downloader = Downloader(os.path.join(workdir, "clean1"))
+        again = timed_fetch(downloader, url("clean", kbps=args.kbps), digest)
+        shared = timed_fetch(Downloader(os.path.join(workdir, "clean1")), url("elsewhere"), digest)
+        with open(downloader.cached(url("clean", kbps=args.kbps)), "r+b") as f:
+            f.write(b"tampered")
+        tampered = timed_fetch(Downloader(os.path.join(workdir, "clean1")), url("clean", kbps=args.kbps), None, digest)
+        report["cache"] = {"same_url": again, "by_digest": shared, "tampered": tampered}
+
+        checksum_dir = os.path.join(workdir, "checksum")
+        try:
+            Downloader(checksum_dir).fetch(url("bad"), "0" * 64)
+            rejected = False
+        except DownloadError:
+            rejected = True
+        blobs = os.path.join(checksum_dir, "sha256")
+        report["checksum"] = {"rejected": rejected, "cached_files": len(os.listdir(blobs)) if os.path.isdir(blobs) else 0}
+    shutil.rmtree(workdir)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""End-to-end latency from a simulated Chrome to the player exec.
+
+Acts as Chrome by writing length-prefixed messages to the host's stdin and
+uses ``stub_player.sh`` as VLC, which records when it was exec'd. Reports
+p50/p95/p99 for message -> reply and message -> player exec in each scenario:
+
+- ``one_shot``: a new host process per click (``sendNativeMessage``)
+- ``sustained``: one persistent host, clicks at a fixed rate
+- ``burst``: one persistent host, bursts of back-to-back clicks
+
+The JSON report carries the git revision and Python version so results can
+be tracked over time:
+
+    python benchmarks/bench_e2e_latency.py --output e2e.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from harness import REPO_DIR, HostEnvironment, HostProcess, emit, summarize
+
+STUB_PLAYER = os.path.join(REPO_DIR, "benchmarks", "stub_player.sh")
+SCENARIOS = ("one_shot", "sustained", "burst")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def exec_times(environment):
+    times = {}
+    try:
+        with open(environment.exec_log) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == "exec" and len(fields) >= 4:
+                    times.setdefault(fields[-1], float(fields[2]))
+    except FileNotFoundError:
+        pass
+    return times
+
+
+def wait_for_execs(environment, count, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        times = exec_times(environment)
+        if len(times) >= count or time.monotonic() > deadline:
+            return times
+        time.sleep(0.01)
+
+
+class Session:
+    """A persistent host plus a reader thread that timestamps every reply."""
+
+    def __init__(self, environment):
+        self.host = HostProcess(environment)
+        self.sent = {}
+        self.replied = {}
+        self.replies = []
+        self.order = []
+        self.lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        while True:
+            try:
+                reply = self.host.receive()
+            except (EOFError, ValueError):
+                return
+            received = time.time()
+            with self.lock:
+                # Replies carry the request id when the host echoes it;
+                # otherwise they arrive in request order.
+                key = reply.get("id") if reply.get("id") is not None else self.order[len(self.replies)]
+                self.replies.append(reply)
+                self.replied[key] = received
+
+    def click(self, key, url):
+        with self.lock:
+            self.order.append(key)
+            self.sent[key] = time.time()
+        self.host.send({"id": key, "url": url})
+
+    def wait(self, count, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while len(self.replies) < count and time.monotonic() < deadline:
+            time.sleep(0.002)
+
+    def close(self):
+        self.host.close()
+        self.reader.join(timeout=5)
+
+
+def results(sent, replied, urls, environment):
+    execs = wait_for_execs(environment, len(urls))
+    reply_latency = [replied[key] - sent[key] for key in sent if key in replied]
+    exec_latency = [execs[urls[key]] - sent[key] for key in sent if urls[key] in execs]
+    return {
+        "clicks": len(sent),
+        "replies": len(reply_latency),
+        "execs": len(exec_latency),
+        "message_to_reply": summarize(reply_latency),
+        "message_to_exec": summarize(exec_latency),
+    }
+
+
+def url_for(scenario, index):
+    return f"https://example.com/{scenario}/{index}.mp4"
+
+
+def run_one_shot(environment, args):
+    sent, replied, urls = {}, {}, {}
+    for index in range(args.clicks):
+        urls[index] = url_for("one_shot", index)
+        sent[index] = time.time()
+        host = HostProcess(environment)
+        host.request({"id": index, "url": urls[index]})
+        replied[index] = time.time()
+        host.close()
+    return results(sent, replied, urls, environment)
+
+
+def run_sustained(environment, args):
+    session = Session(environment)
+    urls = {}
+    interval = 1.0 / args.rate
+    start = time.monotonic()
+    for index in range(args.clicks):
+        delay = start + index * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        urls[index] = url_for("sustained", index)
+        session.click(index, urls[index])
+    session.wait(args.clicks)
+    session.close()
+    report = results(session.sent, session.replied, urls, environment)
+    report["rate_per_s"] = args.rate
+    return report
+
+
+def run_burst(environment, args):
+    session = Session(environment)
+    urls = {}
+    for burst in range(args.bursts):
+        for offset in range(args.burst_size):
+            index = burst * args.burst_size + offset
+            urls[index] = url_for("burst", index)
+            session.click(index, urls[index])
+        session.wait((burst + 1) * args.burst_size)
+        time.sleep(args.burst_gap)
+    session.close()
+    report = results(session.sent, session.replied, urls, environment)
+    report["burst_size"] = args.burst_size
+    report["bursts"] = args.bursts
+    return report
+
+
+RUNNERS = {"one_shot": run_one_shot, "sustained": run_sustained, "burst": run_burst}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--clicks", type=int, default=50, help="clicks for one_shot and sustained")
+    parser.add_argument("--rate", type=float, default=20.0, help="sustained clicks per second")
+    parser.add_argument("--burst-size", type=int, default=40)
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--burst-gap", type=float, default=0.5, help="seconds between bursts")
+    parser.add_argument("--player", default=STUB_PLAYER, help="player executable that logs its exec")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=JSON",
+                        help="extra host config, e.g. --config player_mode='\"rc\"'")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    config = {key: json.loads(value) for key, value in (item.split("=", 1) for item in args.config)}
+    report = {
+        "benchmark": "e2e_latency",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+        "scenarios": {},
+    }
+    for name in args.scenarios.split(","):
+        with HostEnvironment(config, player=args.player) as environment:
+            report["scenarios"][name] = RUNNERS[name](environment, args)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
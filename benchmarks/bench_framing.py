@@ -0,0 +1,127 @@
+"""Throughput of the native messaging frame codec (vlc_host.framing).
+
+Compares the incremental reader/decoder/writer with the original
+read(4) + read(n) / two-write implementation, for small and large payloads.
+The reader and writer run over in-memory streams so only codec cost is
+measured; the decoder is fed 4 KiB chunks like partial pipe reads.
+
+    python benchmarks/bench_framing.py --seconds 1
+"""
+import argparse
+import io
+import json
+import struct
+import time
+
+from harness import emit
+
+from vlc_host.framing import MAX_INCOMING_SIZE, FrameDecoder, FrameReader, FrameWriter, encode_frame
+
+PAYLOADS = {
+    "small": {"url": "https://example.com/media/video.mp4?token=" + "a" * 48},
+    "large": {"links": ["https://example.com/media/%06d.mp4" % i for i in range(14000)]},
+}
+
+
+def legacy_read(stream):
+    raw_length = stream.read(4)
+    if len(raw_length) == 0:
+        return None
+    message_length = struct.unpack('=I', raw_length)[0]
+    message = stream.read(message_length).decode('utf-8')
+    return json.loads(message)
+
+
+def legacy_write(stream, message):
+    encoded_content = json.dumps(message).encode('utf-8')
+    encoded_length = struct.pack('=I', len(encoded_content))
+    stream.write(encoded_length)
+    stream.write(encoded_content)
+    stream.flush()
+
+
+class NullSink(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return len(data)
+
+
+def measure(function, seconds):
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        frames += function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return frames, elapsed
+
+
+def bench_case(message, seconds):
+    frame = encode_frame(message, MAX_INCOMING_SIZE)
+    batch = max(1, (1 << 20) // len(frame))
+    data = frame * batch
+
+    reader = FrameReader(None)
+
+    def read_frames():
+        reader.stream = io.BufferedReader(io.BytesIO(data))
+        count = 0
+        while reader.read_message() is not None:
+            count += 1
+        return count
+
+    def read_legacy():
+        stream = io.BufferedReader(io.BytesIO(data))
+        count = 0
+        while legacy_read(stream) is not None:
+            count += 1
+        return count
+
+    decoder = FrameDecoder()
+
+    def decode_chunks():
+        count = 0
+        for offset in range(0, len(data), 4096):
+            count += len(decoder.feed(data[offset:offset + 4096]))
+        return count
+
+    writer = FrameWriter(io.BufferedWriter(NullSink()), max_size=MAX_INCOMING_SIZE)
+    legacy_sink = io.BufferedWriter(NullSink())
+
+    def write_frames():
+        for _ in range(batch):
+            writer.write_message(message)
+        return batch
+
+    def write_legacy():
+        for _ in range(batch):
+            legacy_write(legacy_sink, message)
+        return batch
+
+    results = {"frame_bytes": len(frame)}
+    for name, function in (("read", read_frames), ("read_legacy", read_legacy),
+                           ("decode_4k_chunks", decode_chunks),
+                           ("write", write_frames), ("write_legacy", write_legacy)):
+        frames, elapsed = measure(function, seconds)
+        results[name] = {
+            "frames_per_s": round(frames / elapsed),
+            "mb_per_s": round(frames * len(frame) / elapsed / 1e6, 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time per measurement")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    emit({
+        "benchmark": "framing",
+        "cases": {name: bench_case(message, args.seconds) for name, message in PAYLOADS.items()},
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
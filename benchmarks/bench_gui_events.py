@@ -0,0 +1,181 @@
+"""Installer GUI events: update rate and ordering, without a display.
+
+Drives ``vlc_installer.events`` the way the installer window does, with a
+fake ``after`` loop standing in for Tk's and a sink that records what would
+have been shown:
+
+- ``--threads`` workers each report a download of ``--mb`` MB in
+  ``--chunk-kb`` chunks through a weighted ``Progress``, plus a status
+  line per chunk, and post a ``call`` (the installer's dialogs and label
+  changes) every ``--call-every`` chunks
+- the pump drains the queue every ``--interval-ms`` on the loop's thread
+
+Reports events posted versus applied, the highest number of updates of one
+key in a tick and per second, the delay from posting to applying, and
+checks that progress never goes backwards, that every ``call`` sees the
+values its worker set before it and none set after, and that the final
+values are the last ones posted. Exits non-zero if a check fails.
+
+    python benchmarks/bench_gui_events.py --threads 4 --mb 64
+"""
+import argparse
+import heapq
+import os
+import sys
+import threading
+import time
+
+from harness import REPO_DIR, emit, summarize
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.events import EventQueue, Progress, Pump  # noqa: E402
+
+
+class FakeLoop:
+    """Tk's after() and mainloop(), on the calling thread."""
+
+    def __init__(self):
+        self.timers = []
+        self.sequence = 0
+        self.thread = None
+
+    def after(self, ms, fn):
+        self.sequence += 1
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, self.sequence, fn))
+
+    def run(self, until):
+        self.thread = threading.get_ident()
+        while self.timers and not until():
+            due, _, fn = heapq.heappop(self.timers)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            fn()
+
+
+class RecordingSink:
+    def __init__(self, loop):
+        self.loop = loop
+        self.values = {}
+        self.applied = []
+        self.wrong_thread = 0
+
+    def __call__(self, key, value):
+        if threading.get_ident() != self.loop.thread:
+            self.wrong_thread += 1
+        self.values[key] = value
+        self.applied.append((time.perf_counter(), key, value))
+
+
+def worker(events, index, args, checks):
+    progress = Progress(events, {"download": 3, "install": 2}, f"progress{index}")
+    total = args.mb * 1024 * 1024
+    chunk = args.chunk_kb * 1024
+    done = 0
+    chunks = 0
+    while done < total:
+        done = min(total, done + chunk)
+        chunks += 1
+        progress.update("download", done, total)
+        events.set(f"status{index}", (time.perf_counter(), f"{done}/{total}"))
+        if chunks % args.call_every == 0:
+            # A barrier: it must see this status line and no later one.
+            events.call(checks.barrier, index, f"{done}/{total}")
+        if args.chunk_delay_us:
+            time.sleep(args.chunk_delay_us / 1e6)
+    progress.finish("install")
+    events.set(f"status{index}", (time.perf_counter(), "done"))
+
+
+class Checks:
+    def __init__(self, sink):
+        self.sink = sink
+        self.barriers = 0
+        self.barrier_failures = 0
+
+    def barrier(self, index, expected):
+        self.barriers += 1
+        if self.sink.values.get(f"status{index}", (None, None))[1] != expected:
+            self.barrier_failures += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--mb", type=int, default=64, help="per worker")
+    parser.add_argument("--chunk-kb", type=int, default=16)
+    parser.add_argument("--chunk-delay-us", type=int, default=100)
+    parser.add_argument("--call-every", type=int, default=500, help="chunks between calls")
+    parser.add_argument("--interval-ms", type=int, default=50)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    loop = FakeLoop()
+    sink = RecordingSink(loop)
+    checks = Checks(sink)
+    events = EventQueue()
+    pump = Pump(events, sink, loop.after, args.interval_ms)
+    ticks = []
+
+    def tick():
+        before = len(sink.applied)
+        start = time.perf_counter()
+        Pump.tick(pump)
+        ticks.append((len(sink.applied) - before, time.perf_counter() - start))
+
+    pump.tick = tick
+    threads = [threading.Thread(target=worker, args=(events, index, args, checks)) for index in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    pump.start()
+    loop.run(lambda: not any(thread.is_alive() for thread in threads) and not events.stats()["pending"])
+    seconds = time.perf_counter() - start
+    pump.stop()
+
+    per_key = {}
+    for at, key, _ in sink.applied:
+        per_key.setdefault(key, []).append(at)
+    max_per_second = max(
+        max(sum(1 for other in times if at <= other < at + 1) for at in times) for times in per_key.values())
+    progress_backwards = 0
+    delays = []
+    for index in range(args.threads):
+        shown = [value for _, key, value in sink.applied if key == f"progress{index}"]
+        progress_backwards += sum(1 for before, after in zip(shown, shown[1:]) if after < before)
+        delays += [at - value[0] for at, key, value in sink.applied if key == f"status{index}"]
+    final_ok = all(sink.values.get(f"progress{index}") == 100.0 and sink.values[f"status{index}"][1] == "done"
+                   for index in range(args.threads))
+
+    stats = events.stats()
+    report = {
+        "benchmark": "gui_events",
+        "threads": args.threads,
+        "interval_ms": args.interval_ms,
+        "seconds": round(seconds, 3),
+        "posted": stats["posted"],
+        "coalesced": stats["coalesced"],
+        "applied": pump.applied,
+        "ticks": len(ticks),
+        "max_updates_per_tick": max(count for count, _ in ticks),
+        "max_updates_per_key_per_second": max_per_second,
+        "tick_ms": summarize([elapsed for _, elapsed in ticks]),
+        "post_to_apply": summarize(delays),
+        "checks": {
+            "progress_backwards": progress_backwards,
+            "barriers": checks.barriers,
+            "barrier_failures": checks.barrier_failures,
+            "applied_off_loop_thread": sink.wrong_thread,
+            "final_values": final_ok,
+        },
+    }
+    emit(report, args.output)
+    failed = progress_backwards or checks.barrier_failures or sink.wrong_thread or not final_ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Playback history: index cost at 100k+ entries and resume positions end to end.
+
+``index`` drives ``vlc_host.history.History`` in process at each of
+``--sizes`` entries (URLs spread over a thousand hosts): microseconds per
+recorded open and per resume lookup, which should not grow with the size,
+prefix and recent query latency, the time and bytes of appending changes,
+of compacting and of loading the log, and that retention holds the index to
+``max_entries``, also when loading a log written with a higher limit.
+
+``host`` runs the host with ``fake_vlc.py`` playing at ``--rate`` playback
+seconds per second:
+
+- ``rc``: open a URL, let it play, open another one, then the first again;
+  the second open of the first URL must start where it was left, and so
+  must an open from a restarted host (the log is reloaded)
+- ``spawn``: each URL gets its own player, which exits after
+  ``--lifetime`` seconds and writes its position to a fake VLC recently
+  played file; the next open of that URL must start there
+- ``large``: open and ``history`` query latency with a ``--large``-entry
+  history on disk, against the same opens with history off, and the time to
+  a host's first reply and first open (which waits for the history to load)
+- ``expired``: a host with ``history_max_age_days`` whose log holds entries
+  older than that; opens must succeed and the old entries must be gone
+
+    python benchmarks/bench_history.py --sizes 10000,100000,200000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, free_port, summarize
+
+from vlc_host.history import History  # noqa: E402
+
+
+def url_for(index):
+    return f"https://media{index % 1000}.example.com/show/{index // 1000}/episode{index}.mp4"
+
+
+def micros(seconds, count):
+    return round(seconds * 1e6 / count, 3)
+
+
+def bench_index(size, workdir, queries):
+    path = os.path.join(workdir, f"history{size}.jsonl")
+    history = History(max_entries=size)
+    urls = [url_for(index) for index in range(size)]
+    start = time.perf_counter()
+    for url in urls:
+        history.record_open(url)
+    record_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    history.save(path)
+    first_save = time.perf_counter() - start
+
+    sample = random.Random(size).sample(urls, min(queries, size))
+    start = time.perf_counter()
+    for index, url in enumerate(sample):
+        history.record_position(url, 60 + index % 600, 3600)
+    position_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    history.save(path)
+    append_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    resumed = sum(1 for url in sample if history.resume_position(url) is not None)
+    lookup_seconds = time.perf_counter() - start
+    misses = [url + "?missing" for url in sample]
+    start = time.perf_counter()
+    for url in misses:
+        history.resume_position(url)
+    miss_seconds = time.perf_counter() - start
+
+    prefix_times, prefix_counts = [], []
+    for index in range(queries // 10):
+        start = time.perf_counter()
+        items = history.prefix(f"https://MEDIA{index % 1000}.example.com/show/", 50)
+        prefix_times.append(time.perf_counter() - start)
+        prefix_counts.append(len(items))
+    recent_times = []
+    for _ in range(queries // 10):
+        start = time.perf_counter()
+        history.recent(50)
+        recent_times.append(time.perf_counter() - start)
+
+    # Reopening everything doubles the log, so the next save compacts it.
+    for url in urls:
+        history.record_open(url)
+    appended_bytes = os.path.getsize(path)
+    start = time.perf_counter()
+    history.save(path)
+    compact_seconds = time.perf_counter() - start
+
+    reloaded = History(max_entries=size)
+    start = time.perf_counter()
+    reloaded.load(path)
+    load_seconds = time.perf_counter() - start
+    intact = len(reloaded) == size and reloaded.get(sample[0])["position"] == history.get(sample[0])["position"] \
+        and reloaded.recent(1)[0]["url"] == history.recent(1)[0]["url"]
+
+    bounded = History(max_entries=size // 2)
+    for url in urls:
+        bounded.record_open(url)
+    # The same log read with half the limit drops the oldest half as it loads.
+    trimmed = History(max_entries=size // 2)
+    trimmed.load(path)
+    return {
+        "entries": size,
+        "record_open_us": micros(record_seconds, size),
+        "record_position_us": micros(position_seconds, len(sample)),
+        "resume_hit_us": micros(lookup_seconds, len(sample)),
+        "resume_miss_us": micros(miss_seconds, len(misses)),
+        "resumed": resumed,
+        "prefix_50": summarize(prefix_times),
+        "prefix_mean_results": round(sum(prefix_counts) / max(1, len(prefix_counts)), 1),
+        "recent_50": summarize(recent_times),
+        "first_save_ms": round(first_save * 1000, 3),
+        "append_save_ms": round(append_seconds * 1000, 3),
+        "bytes_before_compaction": appended_bytes,
+        "compact_ms": round(compact_seconds * 1000, 3),
+        "bytes_after_compaction": os.path.getsize(path),
+        "load_ms": round(load_seconds * 1000, 3),
+        "reload_intact": intact,
+        "compactions": history.compactions,
+        "retention": {"max_entries": bounded.max_entries, "entries": len(bounded),
+                      "evictions": bounded.evictions, "sorted_keys": len(bounded.keys)},
+        "over_limit_load": {"max_entries": trimmed.max_entries, "entries": len(trimmed),
+                            "sorted_keys": len(trimmed.keys),
+                            "newest_kept": trimmed.get(urls[-1]) is not None and trimmed.get(urls[0]) is None},
+    }
+
+
+def host_config(mode, state_dir, **extra):
+    config = {"player_mode": mode, "rc_port": free_port(), "history": True, "state_dir": state_dir,
+              "player_sample_interval": 0.2, "dedupe_window": 0}
+    config.update(extra)
+    return config
+
+
+def start_time_of(environment, url):
+    # The :start-time option the player was last given for url, or None.
+    for event in reversed(environment.player_events("play")):
+        if event["url"] == url:
+            starts = [option for option in event["options"] if option.startswith(":start-time=")]
+            return float(starts[-1].split("=", 1)[1]) if starts else None
+    return None
+
+
+def wait_for_position(host, url, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        items = host.request({"action": "history", "url": url})["items"]
+        if items and items[0]["position"] or time.monotonic() > deadline:
+            return items[0] if items else None
+        time.sleep(0.05)
+
+
+def bench_rc(workdir, args):
+    state_dir = os.path.join(workdir, "rc_state")
+    first, second = "https://example.com/film.mp4", "https://example.com/other.mp4"
+    player_env = {"FAKE_VLC_RATE": str(args.rate)}
+    with HostEnvironment(host_config("rc", state_dir), player=FAKE_VLC, player_env=player_env) as environment:
+        host = HostProcess(environment)
+        try:
+            host.request({"url": first})
+            environment.wait_for_events("play", 1)
+            time.sleep(args.play)
+            host.request({"url": second})
+            environment.wait_for_events("play", 2)
+            left_at = host.request({"action": "history", "url": first})["items"][0]["position"]
+            reply = host.request({"url": first})
+            environment.wait_for_events("play", 3)
+            resumed_at = start_time_of(environment, first)
+            recent = host.request({"action": "history", "limit": 5})["items"]
+        finally:
+            host.close()
+        restarted = HostProcess(environment)
+        try:
+            history = restarted.request({"action": "history", "prefix": "https://EXAMPLE.com/"})["items"]
+            after_restart = restarted.request({"url": first})
+        finally:
+            restarted.close()
+    return {
+        "played_s": round(args.play * args.rate, 1),
+        "left_at": left_at,
+        "reply_start_time": reply.get("start_time"),
+        "player_start_time": resumed_at,
+        "recent": [item["url"] for item in recent],
+        "after_restart": {"entries": [[item["url"], item["count"], item["position"]] for item in history],
+                          "reply_start_time": after_restart.get("start_time")},
+        "resumed": bool(resumed_at) and abs(resumed_at - left_at) <= 1
+        and after_restart.get("start_time", 0) >= left_at,
+    }
+
+
+def bench_spawn(workdir, args):
+    state_dir = os.path.join(workdir, "spawn_state")
+    recents = os.path.join(workdir, "vlc-qt-interface.conf")
+    url = "https://example.com/stream,part1.mp4"
+    config = host_config("spawn", state_dir, vlc_recents_file=recents)
+    player_env = {"FAKE_VLC_RATE": str(args.rate), "FAKE_VLC_LIFETIME": str(args.lifetime),
+                  "FAKE_VLC_RECENTS": recents}
+    with HostEnvironment(config, player=FAKE_VLC, player_env=player_env) as environment:
+        host = HostProcess(environment)
+        try:
+            host.request({"url": url})
+            environment.wait_for_events("exit", 1)
+            item = wait_for_position(host, url)
+            reply = host.request({"url": url})
+            environment.wait_for_events("play", 2)
+            resumed_at = start_time_of(environment, url)
+        finally:
+            host.close()
+    return {
+        "played_s": round(args.lifetime * args.rate, 1),
+        "left_at": item and item["position"],
+        "reply_start_time": reply.get("start_time"),
+        "player_start_time": resumed_at,
+        "resumed": bool(resumed_at) and abs(resumed_at - item["position"]) <= 1,
+    }
+
+
+def bench_large(workdir, args):
+    state_dir = os.path.join(workdir, "large_state")
+    os.makedirs(state_dir)
+    history = History(max_entries=args.large)
+    for index in range(args.large):
+        history.record_open(url_for(index))
+    history.save(os.path.join(state_dir, "history.jsonl"))
+    report = {"entries": args.large}
+    for name, enabled in (("history_off", False), ("history_on", True)):
+        config = host_config("spawn", state_dir, history=enabled)
+        with HostEnvironment(config) as environment:
+            start = time.perf_counter()
+            host = HostProcess(environment)
+            host.request({"action": "ping"})
+            first_reply = time.perf_counter() - start
+            opens, queries = [], []
+            try:
+                for index in range(args.opens):
+                    start = time.perf_counter()
+                    reply = host.request({"url": url_for(index * 7919 % (2 * args.large))})
+                    opens.append(time.perf_counter() - start)
+                    assert reply.get("success"), reply
+                if enabled:
+                    for index in range(args.opens):
+                        message = {"action": "history", "prefix": f"https://media{index}.example.com/"} \
+                            if index % 2 else {"action": "history"}
+                        start = time.perf_counter()
+                        assert host.request(message)["items"]
+                        queries.append(time.perf_counter() - start)
+                stats = host.request({"action": "stats"}).get("history")
+            finally:
+                host.close()
+        # The first open waits for the history to finish loading.
+        report[name] = {"first_reply_ms": round(first_reply * 1000, 3),
+                        "first_open_ms": round(opens[0] * 1000, 3), "open": summarize(opens[1:])}
+        if enabled:
+            report[name].update(query=summarize(queries), stats=stats)
+    return report
+
+
+def bench_expired(workdir, args):
+    state_dir = os.path.join(workdir, "expired_state")
+    os.makedirs(state_dir)
+    week_ago = time.time() - 7 * 86400
+    old = History(clock=lambda: week_ago)
+    for index in range(10):
+        old.record_open(url_for(index))
+    old.save(os.path.join(state_dir, "history.jsonl"))
+    with HostEnvironment(host_config("spawn", state_dir, history_max_age_days=1)) as environment:
+        host = HostProcess(environment)
+        try:
+            reply = host.request({"url": url_for(100)})
+            items = host.request({"action": "history"}).get("items", [])
+        finally:
+            host.close()
+    return {"stale_entries": 10, "open": reply, "entries": [item["url"] for item in items],
+            "ok": bool(reply.get("success")) and [item["url"] for item in items] == [url_for(100)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,200000", help="comma-separated index sizes")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=60.0, help="fake playback seconds per second")
+    parser.add_argument("--play", type=float, default=1.0, help="seconds to play before switching (rc)")
+    parser.add_argument("--lifetime", type=float, default=1.0, help="seconds each spawned player lives")
+    parser.add_argument("--large", type=int, default=100000, help="entries in the host's history")
+    parser.add_argument("--opens", type=int, default=200)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_history_")
+    try:
+        report = {"benchmark": "history",
+                  "index": [bench_index(int(size), workdir, args.queries) for size in args.sizes.split(",")],
+                  "host": {"rc": bench_rc(workdir, args), "spawn": bench_spawn(workdir, args),
+                           "large": bench_large(workdir, args), "expired": bench_expired(workdir, args)}}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    emit(report, args.output)
+    checks = [entry["reload_intact"] and entry["retention"]["entries"] == entry["entries"] // 2
+              and entry["over_limit_load"]["entries"] == entry["over_limit_load"]["sorted_keys"] == entry["entries"] // 2
+              and entry["over_limit_load"]["newest_kept"]
+              for entry in report["index"]] + [report["host"]["rc"]["resumed"], report["host"]["spawn"]["resumed"],
+                                               report["host"]["expired"]["ok"]]
+    if not all(checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
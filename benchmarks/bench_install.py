@@ -0,0 +1,81 @@
+"""Installer file layout: fresh install versus re-install and upgrade.
+
+Runs ``vlc_installer.install.install`` against the repository's ``src``
+tree as the installer's bundled resources, into a temporary directory, with
+``fake_windows.FakeEffects`` standing in for the registry and the desktop:
+
+- ``fresh``: an empty target directory
+- ``reinstall``: the same install again, nothing changed
+- ``upgrade``: one host module changed since the last install
+- ``repair``: every file rewritten and the host recompiled (``force=True``),
+  which is what every run did before installs were incremental (minus the
+  icon downloads, which are gone)
+
+Each scenario reports time and the files written, left alone and removed.
+
+    python benchmarks/bench_install.py --runs 20
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fake_windows import FakeEffects
+from harness import REPO_DIR, emit, summarize
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.install import install as run_install  # noqa: E402
+
+
+def install(target, resources, force=False):
+    start = time.perf_counter()
+    report = run_install(FakeEffects(), target, resources, "/usr/bin/vlc", sys.executable, force=force)
+    return time.perf_counter() - start, report["files"]
+
+
+def counts(summary):
+    return {"written": len(summary["written"]), "unchanged": summary["unchanged"], "removed": len(summary["removed"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_install_")
+    # A private copy of the resources, so the upgrade scenario can edit one.
+    resources = os.path.join(workdir, "resources")
+    for name in ("extension", "scripts"):
+        shutil.copytree(os.path.join(SRC_DIR, name), os.path.join(resources, name),
+                        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    module = os.path.join(resources, "scripts", "vlc_host", "coalesce.py")
+
+    times = {name: [] for name in ("fresh", "reinstall", "upgrade", "repair")}
+    results = {}
+    for run in range(args.runs):
+        target = os.path.join(workdir, f"install{run}")
+        for name in times:
+            if name == "upgrade":
+                with open(module, "a") as f:
+                    f.write(f"# run {run}\n")
+            seconds, summary = install(target, resources, force=name == "repair")
+            times[name].append(seconds)
+            results[name] = counts(summary)
+        shutil.rmtree(target)
+    shutil.rmtree(workdir)
+
+    report = {"benchmark": "install", "runs": args.runs}
+    for name, samples in times.items():
+        report[name] = dict(results[name], time=summarize(samples))
+    report["reinstall_speedup"] = round(report["fresh"]["time"]["mean_ms"] / report["reinstall"]["time"]["mean_ms"], 1)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
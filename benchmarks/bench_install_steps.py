@@ -0,0 +1,131 @@
+"""Install steps: serial versus concurrent, and rollback after a failure.
+
+Runs ``vlc_installer.install.install`` against the repository's ``src``
+tree as the bundled resources, into a temporary directory, with
+``fake_windows.FakeEffects`` standing in for the registry and the desktop
+(``--registry-ms`` per registry call, ``--shortcut-ms`` per shortcut, which
+is what a COM shortcut costs):
+
+- ``serial``: one worker, every step after the other, as the installer
+  used to run them
+- ``concurrent``: ``--workers`` workers; independent steps overlap
+- ``rollback_fresh``: a fresh install whose registry write fails; the
+  install directory, the registry and the desktop must end up as before
+- ``rollback_upgrade``: an upgrade (one host module changed) whose
+  registry write fails; every installed file must be back to the previous
+  install's content
+
+Reports total time, per-step start and duration, and for the rollbacks what
+was undone and whether the machine matches its state before the install.
+
+    python benchmarks/bench_install_steps.py --runs 10 --workers 4
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from fake_windows import FakeEffects
+from harness import REPO_DIR, emit, summarize
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.install import install  # noqa: E402
+from vlc_installer.steps import StepError  # noqa: E402
+
+
+def snapshot(root):
+    # Relative path -> SHA-256 of every file under root, bytecode aside.
+    result = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+        for name in filenames:
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                result[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return result
+
+
+def machine_state(target, fake):
+    pycache = os.path.join(target, "scripts", "vlc_host", "__pycache__")
+    return {"files": snapshot(target) if os.path.isdir(target) else None,
+            "bytecode": os.path.isdir(pycache),
+            "registry": dict(fake.registry), "shortcuts": dict(fake.shortcuts)}
+
+
+def run_install(target, resources, fake, workers):
+    start = time.perf_counter()
+    report = install(fake, target, resources, "/usr/bin/vlc", sys.executable, workers=workers)
+    return time.perf_counter() - start, report
+
+
+def run_rollback(target, resources, args, upgrade, module):
+    fake = FakeEffects(registry_latency=args.registry_ms / 1000, shortcut_latency=args.shortcut_ms / 1000)
+    if upgrade:
+        install(fake, target, resources, "/usr/bin/vlc", sys.executable, workers=args.workers)
+        with open(module, "a") as f:
+            f.write("# changed\n")
+    before = machine_state(target, fake)
+    fake.fail.add("registry_set")
+    start = time.perf_counter()
+    try:
+        install(fake, target, resources, "/usr/bin/vlc", sys.executable, workers=args.workers)
+        raise SystemExit("the injected failure did not fail the install")
+    except StepError as e:
+        seconds = time.perf_counter() - start
+        report = e.report
+        failed = e.step
+    after = machine_state(target, fake)
+    shutil.rmtree(target, ignore_errors=True)
+    return {
+        "failed_step": failed,
+        "time_ms": round(seconds * 1000, 3),
+        "steps": {name: timing["status"] for name, timing in report["steps"].items()},
+        "not_run": report["not_run"],
+        "undone": report["undone"],
+        "rollback_failures": report["rollback_failures"],
+        "restored": after == before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--registry-ms", type=float, default=5.0)
+    parser.add_argument("--shortcut-ms", type=float, default=150.0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="vlc_opener_steps_")
+    resources = os.path.join(workdir, "resources")
+    for name in ("extension", "scripts"):
+        shutil.copytree(os.path.join(SRC_DIR, name), os.path.join(resources, name),
+                        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    module = os.path.join(resources, "scripts", "vlc_host", "coalesce.py")
+
+    report = {"benchmark": "install_steps", "runs": args.runs, "workers": args.workers,
+              "registry_ms": args.registry_ms, "shortcut_ms": args.shortcut_ms}
+    for name, workers in (("serial", 1), ("concurrent", args.workers)):
+        times = []
+        for run in range(args.runs):
+            target = os.path.join(workdir, f"{name}{run}")
+            fake = FakeEffects(registry_latency=args.registry_ms / 1000, shortcut_latency=args.shortcut_ms / 1000)
+            seconds, result = run_install(target, resources, fake, workers)
+            times.append(seconds)
+            shutil.rmtree(target)
+        report[name] = {"time": summarize(times), "steps": result["steps"]}
+    report["speedup"] = round(report["serial"]["time"]["mean_ms"] / report["concurrent"]["time"]["mean_ms"], 1)
+    report["rollback_fresh"] = run_rollback(os.path.join(workdir, "fresh"), resources, args, False, module)
+    report["rollback_upgrade"] = run_rollback(os.path.join(workdir, "upgrade"), resources, args, True, module)
+    shutil.rmtree(workdir)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
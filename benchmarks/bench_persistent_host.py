@@ -0,0 +1,65 @@
+"""Per-click latency: one host process per click vs. one persistent host.
+
+One-shot mode mirrors ``chrome.runtime.sendNativeMessage``: spawn the host,
+send one message, read one reply, close stdin. Persistent mode mirrors a
+``chrome.runtime.connectNative`` port: one host serves every click.
+
+    python benchmarks/bench_persistent_host.py --clicks 200 --output bench.json
+"""
+import argparse
+
+from harness import HostEnvironment, HostProcess, emit, summarize, timed
+
+MESSAGE = {"url": "https://example.com/video.mp4"}
+
+
+def one_shot_click(environment):
+    host = HostProcess(environment)
+    reply = host.request(MESSAGE)
+    host.close()
+    return reply
+
+
+def run_one_shot(environment, clicks):
+    samples = []
+    for _ in range(clicks):
+        elapsed, reply = timed(one_shot_click, environment)
+        assert reply.get("success"), reply
+        samples.append(elapsed)
+    return samples
+
+
+def run_persistent(environment, clicks):
+    samples = []
+    host = HostProcess(environment)
+    try:
+        for _ in range(clicks):
+            elapsed, reply = timed(host.request, MESSAGE)
+            assert reply.get("success"), reply
+            samples.append(elapsed)
+    finally:
+        host.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=100)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    with HostEnvironment() as environment:
+        one_shot = summarize(run_one_shot(environment, args.clicks))
+        persistent = summarize(run_persistent(environment, args.clicks))
+
+    emit({
+        "benchmark": "persistent_host",
+        "clicks": args.clicks,
+        "one_shot": one_shot,
+        "persistent": persistent,
+        "speedup_p50": round(one_shot["p50_ms"] / max(persistent["p50_ms"], 1e-9), 1),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
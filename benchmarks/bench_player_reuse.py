@@ -0,0 +1,71 @@
+"""Latency and memory of N consecutive opens: spawn-per-URL vs. one RC-controlled VLC.
+
+The player is ``fake_vlc.py`` unless ``--player`` names a real VLC binary.
+The fake simulates VLC's startup time and resident memory so the numbers are
+meaningful without a display:
+
+    python benchmarks/bench_player_reuse.py --opens 10 --startup-ms 300 --rss-mb 60
+"""
+import argparse
+import sys
+import time
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, free_port, rss_kb, summarize
+
+
+def run(mode, args):
+    config = {"player_mode": mode, "rc_port": free_port()}
+    player_env = {
+        "FAKE_VLC_STARTUP_MS": str(args.startup_ms),
+        "FAKE_VLC_RSS_MB": str(args.rss_mb),
+    }
+    with HostEnvironment(config, player=args.player, player_env=player_env) as environment:
+        host = HostProcess(environment)
+        reply_samples = []
+        play_samples = []
+        try:
+            for index in range(args.opens):
+                url = f"https://example.com/video{index}.mp4"
+                sent = time.monotonic()
+                reply = host.request({"url": url})
+                reply_samples.append(time.monotonic() - sent)
+                assert reply.get("success"), reply
+                played = environment.wait_for_events("play", index + 1)
+                play_samples.append(played[index]["t"] - sent)
+            pids = environment.player_pids()
+            rss = sum(rss_kb(pid) for pid in pids)
+        finally:
+            host.close()
+    return {
+        "click_to_reply": summarize(reply_samples),
+        "click_to_play": summarize(play_samples),
+        "player_processes": len(pids),
+        "player_rss_mb": round(rss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--opens", type=int, default=10)
+    parser.add_argument("--player", default=FAKE_VLC, help="player executable (default: fake_vlc.py)")
+    parser.add_argument("--startup-ms", type=int, default=300, help="fake player startup time")
+    parser.add_argument("--rss-mb", type=int, default=60, help="fake player resident memory")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    if args.player != FAKE_VLC:
+        print("note: click_to_play is only measured with the fake player", file=sys.stderr)
+
+    spawn = run("spawn", args)
+    rc = run("rc", args)
+    emit({
+        "benchmark": "player_reuse",
+        "opens": args.opens,
+        "spawn": spawn,
+        "rc": rc,
+        "saved_rss_mb": round(spawn["player_rss_mb"] - rc["player_rss_mb"], 1),
+        "saved_click_to_play_p50_ms": round(spawn["click_to_play"]["p50_ms"] - rc["click_to_play"]["p50_ms"], 3),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Playlist expansion: time to first entry and host memory for large playlists.
+
+Serves generated M3U, PLS and XSPF playlists from the local fixture server
+(streamed, with a pause every 1000 entries so downloading takes a while) and
+opens each through a host with ``expand_playlists`` and the fake VLC in
+``rc`` mode. Reports when the first entry started playing and when the last
+was enqueued, both relative to when the server finished sending the file,
+the entry counts, and the host's peak RSS. Some relative entries have a
+space in their name; VLC's RC interface would split those, so they must
+arrive percent-encoded, and the script exits non-zero if any were split.
+
+    python benchmarks/bench_playlist.py --entries 1000,100000 --delay-ms 5
+"""
+import argparse
+import sys
+import time
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, free_port, peak_rss_kb
+from http_fixtures import FixtureServer
+
+
+def run(server, kind, entries, delay_ms):
+    config = {"player_mode": "rc", "rc_port": free_port(), "expand_playlists": True,
+              "dedupe_window": 0, "playlist_max_entries": entries * 2}
+    path = f"/playlist/{kind}/{entries}/list.{kind}?delay_ms={delay_ms}"
+    with HostEnvironment(config, player=FAKE_VLC) as environment:
+        host = HostProcess(environment)
+        host.request({"action": "ping"})
+        idle_kb = peak_rss_kb(host.process.pid)
+        start = time.monotonic()
+        reply = host.request({"url": server.base_url + path})
+        done = time.monotonic()
+        assert reply.get("success"), reply
+        peak_kb = peak_rss_kb(host.process.pid)
+        host.close()
+        plays = environment.player_events("play")
+        enqueued = environment.player_events("enqueue")
+        stray = environment.player_events("stray")
+        finished = server.finished.get(path)
+        first = plays[0]["t"] if plays else None
+    return {
+        "kind": kind,
+        "entries": entries,
+        "playlist": reply.get("playlist"),
+        "played": len(plays),
+        "enqueued": len(enqueued),
+        "escaped_spaces": sum(1 for event in plays + enqueued if "%20" in event["url"]),
+        "split_entries": len(stray),
+        "first_entry_ms": round((first - start) * 1000, 1) if first else None,
+        "download_ms": round((finished - start) * 1000, 1) if finished else None,
+        "reply_ms": round((done - start) * 1000, 1),
+        "first_entry_before_download_done": bool(first and finished and first < finished),
+        "idle_peak_rss_kb": idle_kb,
+        "peak_rss_kb": peak_kb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", default="1000,100000", help="comma-separated playlist sizes")
+    parser.add_argument("--kinds", default="m3u,pls,xspf")
+    parser.add_argument("--delay-ms", type=float, default=5.0, help="server pause per 1000 entries")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    results = []
+    with FixtureServer() as server:
+        for entries in [int(value) for value in args.entries.split(",")]:
+            for kind in args.kinds.split(","):
+                results.append(run(server, kind, entries, args.delay_ms))
+    emit({"benchmark": "playlist", "delay_ms": args.delay_ms, "results": results}, args.output)
+    if any(result["split_entries"] or not result["escaped_spaces"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Media probing: detected kind, VLC options and added click latency per stream kind.
+
+Serves one sample of each kind from a local fixture server with artificial
+latency, and opens each through a host with ``probe_media`` enabled and the
+fake VLC in ``rc`` mode: cold (one ranged GET per URL), again in the same host
+(probe cache hit), and with probing disabled as a baseline. The options each
+item reached the player with are read back from the fake VLC's event log.
+
+    python benchmarks/bench_probe.py --latency-ms 30 --rounds 5
+"""
+import argparse
+import tempfile
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, free_port, summarize, timed
+from http_fixtures import MEDIA_SAMPLES, FixtureServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="server latency per request")
+    parser.add_argument("--rounds", type=int, default=5, help="distinct URLs per kind")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    with FixtureServer(latency=args.latency_ms / 1000) as server:
+        urls = {kind: [f"{server.base_url}/media/{kind}/item{index}" for index in range(args.rounds)]
+                for kind in MEDIA_SAMPLES}
+        config = {"player_mode": "rc", "rc_port": free_port(), "probe_media": True,
+                  "state_dir": tempfile.mkdtemp(prefix="vlc_opener_probe_")}
+        kinds = {}
+        with HostEnvironment(config, player=FAKE_VLC) as environment:
+            host = HostProcess(environment)
+            # Start the player first so every measured click is a plain RC "add".
+            host.request({"url": f"{server.base_url}/media/mp4/warmup", "probe": False})
+            environment.wait_for_events("play", 1)
+            for kind, kind_urls in urls.items():
+                before = server.requests
+                cold, warm, baseline, detected = [], [], [], set()
+                for url in kind_urls:
+                    elapsed, reply = timed(host.request, {"url": url})
+                    assert reply.get("success"), reply
+                    cold.append(elapsed)
+                    detected.add(reply.get("media"))
+                origin_requests = server.requests - before
+                for url in kind_urls:
+                    elapsed, reply = timed(host.request, {"url": url})
+                    warm.append(elapsed)
+                for url in kind_urls:
+                    elapsed, reply = timed(host.request, {"url": url, "probe": False})
+                    baseline.append(elapsed)
+                options = [event["options"] for event in environment.player_events("play")
+                           if event["url"] == kind_urls[0]]
+                kinds[kind] = {
+                    "detected": sorted(detected),
+                    "options": options[0] if options else None,
+                    "origin_requests": origin_requests,
+                    "cold": summarize(cold),
+                    "cached": summarize(warm),
+                    "no_probe": summarize(baseline),
+                }
+            stats = host.request({"action": "stats"})["caches"]["probe_cache"]
+            host.close()
+
+    report = {
+        "benchmark": "probe",
+        "latency_ms": args.latency_ms,
+        "rounds": args.rounds,
+        "kinds": kinds,
+        "cache": stats,
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Relay proxy: cookie-protected playback, seek cost and per-stream throughput.
+
+Serves an N MiB body from the local fixture server that only answers
+requests carrying the right cookie, registers it with a host through an
+``open`` request carrying ``headers`` and ``"relay": true``, then plays the
+part of VLC against the relay URL from the reply:
+
+- ``access``: a direct request without the cookie versus one through the relay
+- ``seeks``: K seeks, each an open-ended range request read for 256 KiB and then
+  abandoned the way VLC does; reports time to first byte and origin TCP
+  connections, direct (with the cookie) versus relayed
+- ``concurrent``: S clients each reading the whole body through the relay at
+  once; reports aggregate MB/s and the relay's per-stream statistics
+
+    python benchmarks/bench_relay.py --size-mb 16 --seeks 20 --streams 8
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from harness import HostEnvironment, HostProcess, emit, summarize
+from http_fixtures import FixtureServer
+
+COOKIE = "session=ok"
+SEEK_READ = 256 * 1024
+
+
+def get(url, headers=None, read=None):
+    # (status, bytes read, seconds to first byte) for one request on a fresh connection.
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    try:
+        started = time.perf_counter()
+        conn.request("GET", parts.path, headers=headers or {})
+        response = conn.getresponse()
+        first = response.read(1)
+        ttfb = time.perf_counter() - started
+        body = len(first)
+        while read is None or body < read:
+            chunk = response.read(min(65536, read - body) if read else 65536)
+            if not chunk:
+                break
+            body += len(chunk)
+        return response.status, body, ttfb
+    finally:
+        conn.close()
+
+
+def seek_offsets(count, size):
+    rng = random.Random(1)
+    return [rng.randrange(0, size - SEEK_READ) for _ in range(count)]
+
+
+def run_seeks(server, url, offsets, headers):
+    before = server.connections
+    samples = []
+    for offset in offsets:
+        status, body, ttfb = get(url, dict(headers, Range=f"bytes={offset}-"), read=SEEK_READ)
+        assert status == 206, status
+        samples.append(ttfb)
+        # Give background reconnects a moment, like the gap between real seeks.
+        time.sleep(0.02)
+    return dict(summarize(samples), origin_connections=server.connections - before)
+
+
+def run_concurrent(url, streams, size):
+    results = [None] * streams
+
+    def reader(index):
+        results[index] = get(url)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=reader, args=(index,)) for index in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    assert all(status == 200 and body == size for status, body, _ in results), results
+    return {"streams": streams, "seconds": round(elapsed, 3),
+            "aggregate_mb_per_s": round(streams * size / elapsed / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--seeks", type=int, default=20)
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="origin latency per request")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    with FixtureServer(latency=args.latency_ms / 1000) as server, HostEnvironment() as environment:
+        origin_url = f"{server.base_url}/protected/{args.size_mb}/movie.mp4"
+        host = HostProcess(environment)
+        reply = host.request({"url": origin_url, "relay": True,
+                              "headers": {"Cookie": COOKIE, "Referer": "https://example.com/watch"}})
+        assert reply.get("success"), reply
+        relay_url = reply["relay_url"]
+
+        access = {"direct_without_cookie": get(origin_url, read=1)[0],
+                  "relayed": get(relay_url, {"Range": "bytes=0-0"}, read=1)[0]}
+        offsets = seek_offsets(args.seeks, size)
+        seeks = {"direct": run_seeks(server, origin_url, offsets, {"Cookie": COOKIE}),
+                 "relayed": run_seeks(server, relay_url, offsets, {})}
+        concurrent = run_concurrent(relay_url, args.streams, size)
+        relay_stats = host.request({"action": "stats"})["relay"]
+        host.close()
+
+    report = {
+        "benchmark": "relay",
+        "size_mb": args.size_mb,
+        "latency_ms": args.latency_ms,
+        "access_status": access,
+        "seeks": seeks,
+        "concurrent": concurrent,
+        "relay": relay_stats,
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Click latency with URL resolution: cold chains vs. cached results.
+
+Serves redirect chains from a local fixture server with artificial latency
+per request, and opens each short link through a host with
+``resolve_urls`` enabled: once cold, once more in the same host (LRU hit),
+and once in a fresh host process (hit from the persisted cache). The links
+redirect with 301s; the same links behind 302s without caching headers
+(like a signed-URL endpoint) must be resolved again on every open, and the
+script exits non-zero if they are cached.
+
+    python benchmarks/bench_resolver.py --links 20 --hops 3 --latency-ms 30
+"""
+import argparse
+import sys
+import tempfile
+
+from harness import HostEnvironment, HostProcess, emit, summarize, timed
+from http_fixtures import FixtureServer
+
+
+def open_links(environment, urls):
+    host = HostProcess(environment)
+    samples = []
+    for url in urls:
+        elapsed, reply = timed(host.request, {"url": url})
+        assert reply.get("success"), reply
+        samples.append(elapsed)
+    stats = host.request({"action": "stats"})["caches"]["resolve_cache"]
+    host.close()
+    return samples, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=20)
+    parser.add_argument("--hops", type=int, default=3, help="redirects per link")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="server latency per request")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    with FixtureServer(latency=args.latency_ms / 1000) as server:
+        urls = [f"{server.base_url}/moved/{args.hops}/video{index}.mp4" for index in range(args.links)]
+        temporary = [f"{server.base_url}/chain/{args.hops}/video{index}.mp4" for index in range(args.links)]
+        config = {"resolve_urls": True, "state_dir": tempfile.mkdtemp(prefix="vlc_opener_resolve_")}
+        with HostEnvironment(config) as environment:
+            # Each link twice in one host: cold resolution, then an in-memory hit.
+            before = server.requests
+            samples, _ = open_links(environment, urls + urls)
+            cold_requests = server.requests - before
+            # A fresh host process: hits come from the persisted cache.
+            before = server.requests
+            restart_samples, stats = open_links(environment, urls)
+            restart_requests = server.requests - before
+            # Temporary redirects: every open resolves the chain again.
+            before = server.requests
+            temporary_samples, temporary_stats = open_links(environment, temporary + temporary)
+            temporary_requests = server.requests - before
+
+    report = {
+        "benchmark": "resolver",
+        "links": args.links,
+        "hops": args.hops,
+        "latency_ms": args.latency_ms,
+        "cold": dict(summarize(samples[:args.links]), origin_requests=cold_requests),
+        "warm_same_host": summarize(samples[args.links:]),
+        "warm_after_restart": dict(summarize(restart_samples), origin_requests=restart_requests),
+        "cache": stats,
+        "temporary_redirects": dict(summarize(temporary_samples), origin_requests=temporary_requests,
+                                    cached=temporary_stats["entries"] - stats["entries"]),
+    }
+    emit(report, args.output)
+    if report["temporary_redirects"]["cached"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Segment prefetching: stalls and segment latency for HLS and DASH on a jittery origin.
+
+Plays the part of VLC's adaptive demuxer against the fixture server's
+``/hls`` and ``/dash`` routes: it loads the manifest, fetches each segment
+just in time (at most ``--buffer`` segments ahead of the playback clock)
+and counts a stall whenever a segment arrives after it was due. Each
+stream (HLS VOD, HLS live, DASH VOD) is played directly from the origin,
+through the relay without prefetching, and through the relay with the
+segment prefetcher; the prefetched runs also report the host's segment
+cache statistics (hit rate, spills to disk, prefetched bytes never played).
+
+    python benchmarks/bench_segments.py --segments 20 --segment-ms 500 --jitter-ms 600
+"""
+import argparse
+import time
+from urllib.parse import urljoin
+from urllib.request import urlopen
+from xml.etree.ElementTree import fromstring
+
+from harness import HostEnvironment, HostProcess, emit, summarize
+from http_fixtures import FixtureServer
+from vlc_host.segments import dash_tracks
+
+
+def get(url):
+    with urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def hls_segments(url):
+    # (media sequence, [(sequence, absolute segment URL)]) of a media playlist.
+    sequence, uris = 0, []
+    for line in get(url).decode("utf-8").splitlines():
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":")[1])
+        elif line and not line.startswith("#"):
+            uris.append(urljoin(url, line))
+    return [(sequence + index, uri) for index, uri in enumerate(uris)]
+
+
+def dash_segments(url):
+    root = fromstring(get(url))
+    ns = root.tag[:root.tag.index("}") + 1]
+    segments = next(iter(dash_tracks(root, ns, url).values()))
+    # The initialization segment is needed before the first media segment.
+    return [(index, segment) for index, segment in enumerate(segments)]
+
+
+def play(url, kind, live, count, duration, buffer):
+    # Fetches count segments on a just-in-time schedule; reports startup time, stalls and latencies.
+    opened = time.perf_counter()
+    listing = dash_segments(url) if kind == "dash" else hls_segments(url)
+    if live:
+        # Like VLC, start three segments from the live edge.
+        listing = listing[-3:]
+    played, latencies, stalls, stalled = 0, [], 0, 0.0
+    play_start = startup = None
+    next_sequence = listing[0][0]
+    while played < count:
+        pending = [entry for entry in listing if entry[0] >= next_sequence]
+        if not pending:
+            # Live: wait for the next segment to be published.
+            time.sleep(duration / 4)
+            listing = hls_segments(url)
+            continue
+        sequence, segment = pending[0]
+        if play_start is not None:
+            wait = play_start + (played - buffer) * duration - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        started = time.perf_counter()
+        get(segment)
+        done = time.perf_counter()
+        latencies.append(done - started)
+        if play_start is None:
+            play_start, startup = done, done - opened
+        else:
+            due = play_start + played * duration
+            if done > due:
+                stalls += 1
+                stalled += done - due
+                play_start += done - due
+        played += 1
+        next_sequence = sequence + 1
+    return {"startup_ms": round(startup * 1000, 1), "stalls": stalls, "stalled_ms": round(stalled * 1000, 1),
+            "segment_latency": summarize(latencies)}
+
+
+def run(server, args, kind, live):
+    query = f"kb={args.kb}&segment_ms={args.segment_ms}&jitter_ms={args.jitter_ms}"
+    if kind == "dash":
+        origin = f"{server.base_url}/dash/{args.segments}/manifest.mpd?{query}"
+    else:
+        origin = f"{server.base_url}/hls/{'live' if live else 'vod'}/{args.segments}/index.m3u8?{query}"
+    duration = args.segment_ms / 1000
+    results = {"direct": play(origin, kind, live, args.segments, duration, args.buffer)}
+    config = {"prefetch_ahead": args.ahead, "prefetch_workers": args.workers,
+              "segment_memory_mb": args.memory_mb, "segment_disk_mb": args.disk_mb}
+    for mode in ("relay", "prefetch"):
+        with HostEnvironment(config) as environment:
+            host = HostProcess(environment)
+            reply = host.request({"url": origin, "relay": True, "prefetch": mode == "prefetch"})
+            assert reply.get("success"), reply
+            result = play(reply["relay_url"], kind, live, args.segments, duration, args.buffer)
+            stats = host.request({"action": "stats"})
+            if "segments" in stats:
+                result["cache"] = stats["segments"]
+            host.close()
+        results[mode] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, default=20, help="segments played per stream")
+    parser.add_argument("--segment-ms", type=int, default=500, help="segment duration")
+    parser.add_argument("--kb", type=int, default=256, help="segment size in KiB")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="origin latency per request")
+    parser.add_argument("--jitter-ms", type=int, default=600, help="extra per-segment delay, up to this much")
+    parser.add_argument("--buffer", type=int, default=1, help="segments the player fetches ahead itself")
+    parser.add_argument("--ahead", type=int, default=3, help="prefetch_ahead")
+    parser.add_argument("--workers", type=int, default=3, help="prefetch_workers")
+    parser.add_argument("--memory-mb", type=float, default=0.5, help="segment_memory_mb (small, to exercise the disk tier)")
+    parser.add_argument("--disk-mb", type=float, default=64.0, help="segment_disk_mb")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    with FixtureServer(latency=args.latency_ms / 1000) as server:
+        report = {
+            "benchmark": "segments",
+            "segment_ms": args.segment_ms,
+            "segment_kb": args.kb,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "hls_vod": run(server, args, "hls", live=False),
+            "hls_live": run(server, args, "hls", live=True),
+            "dash_vod": run(server, args, "dash", live=False),
+        }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cold-start time of the native host: process spawn to first framed reply.
+
+Each launch variant runs against its own copy of ``src/scripts``:
+
+- ``shell_shim``: a shell starts Python, like the old ``vlc_opener.bat`` via cmd.exe
+- ``default``: Python started directly with site and no precompiled bytecode
+- ``fast``: ``python -I -S`` with the ``vlc_host`` package precompiled, as the
+  installer's launcher does
+
+Every launch answers one message, either a URL to open (with ``true`` as the
+player) or an invalid one that takes the error path.
+
+    python benchmarks/bench_startup.py --runs 30 --output startup.json
+"""
+import argparse
+import compileall
+import os
+import shutil
+import sys
+import tempfile
+
+from harness import SCRIPTS_DIR, HostEnvironment, HostProcess, emit, summarize, timed
+
+MESSAGES = {
+    "open": {"url": "https://example.com/video.mp4"},
+    "error_path": {"url": ""},
+}
+
+
+def prepare_copy(directory, precompile):
+    target = os.path.join(directory, "scripts")
+    shutil.copytree(SCRIPTS_DIR, target, ignore=shutil.ignore_patterns("__pycache__"))
+    if precompile:
+        compileall.compile_dir(target, quiet=1)
+    return os.path.join(target, "vlc_opener.py")
+
+
+def variants(directory):
+    python = sys.executable
+    slow = prepare_copy(os.path.join(directory, "slow"), precompile=False)
+    fast = prepare_copy(os.path.join(directory, "fast"), precompile=True)
+    return {
+        # -B keeps these copies free of bytecode, so every launch compiles.
+        "shell_shim": ["/bin/sh", "-c", f'"{python}" -B "{slow}"'],
+        "default": [python, "-B", slow],
+        "fast": [python, "-I", "-S", fast],
+    }
+
+
+def launch(environment, command, message):
+    host = HostProcess(environment, command)
+    reply = host.request(message)
+    host.close()
+    return reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = {"benchmark": "startup", "runs": args.runs, "python": sys.version.split()[0], "variants": {}}
+    directory = tempfile.mkdtemp(prefix="vlc_opener_startup_")
+    try:
+        with HostEnvironment() as environment:
+            for name, command in variants(directory).items():
+                results = {}
+                for message_name, message in MESSAGES.items():
+                    launch(environment, command, message)  # warm the OS file cache
+                    samples = []
+                    for _ in range(args.runs):
+                        elapsed, reply = timed(launch, environment, command, message)
+                        assert reply is not None and "success" in reply, reply
+                        samples.append(elapsed)
+                    results[message_name] = summarize(samples)
+                report["variants"][name] = results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
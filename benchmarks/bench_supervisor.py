@@ -0,0 +1,131 @@
+"""Player supervision: zombies, the live-player cap and resource sampling.
+
+Runs a persistent host in spawn mode with ``fake_vlc.py`` as the player.
+
+- ``reaping``: opens N URLs whose players exit after a moment, with a long
+  sampling interval, and counts the host's zombie children before and after
+  a ``status`` request (which reaps, as every sampling interval does)
+- ``cap``: opens N URLs with ``max_players`` = K; each player allocates
+  ``--player-mb`` MB and every other one keeps part of a core busy. Reports
+  the live players and their total RSS from ``{"action": "status"}``, and
+  how many of the closed players were idle (they should go first)
+- ``status``: latency of ``status`` requests, with and without a fresh sample
+
+    python benchmarks/bench_supervisor.py --players 12 --max-players 4
+"""
+import argparse
+import os
+import time
+
+from harness import FAKE_VLC, HostEnvironment, HostProcess, emit, summarize
+
+
+def children(pid):
+    # (live, zombie) counts of a process's direct children, from /proc.
+    live = zombies = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            if fields[0] == "Z":
+                zombies += 1
+            else:
+                live += 1
+    return live, zombies
+
+
+def run_reaping(args):
+    config = {"player_sample_interval": 60, "dedupe_window": 0}
+    with HostEnvironment(config, player=FAKE_VLC, player_env={"FAKE_VLC_LIFETIME": "0.1"}) as environment:
+        host = HostProcess(environment)
+        for index in range(args.players):
+            host.request({"url": f"https://example.com/reap/{index}.mp4"})
+        environment.wait_for_events("exit", args.players)
+        time.sleep(0.2)
+        before = children(host.process.pid)
+        status = host.request({"action": "status"})
+        after = children(host.process.pid)
+        host.close()
+    return {"players": args.players, "zombies_before_reap": before[1], "zombies_after_reap": after[1],
+            "live_children": after[0], "reaped": status["reaped"], "tracked": len(status["players"])}
+
+
+def run_cap(args):
+    config = {"max_players": args.max_players, "player_sample_interval": args.interval,
+              "dedupe_window": 0, "reuse_players": False}
+    with HostEnvironment(config, player=FAKE_VLC) as environment:
+        host = HostProcess(environment)
+        busy = set()
+        for index in range(args.players):
+            url = f"https://example.com/cap/{index}.mp4?fake_rss_mb={args.player_mb}"
+            if index % 2:
+                url += "&fake_cpu=30"
+            reply = host.request({"url": url})
+            if index % 2:
+                busy.add(reply["pid"])
+            # Let the supervisor sample this player before the next open.
+            time.sleep(args.interval * 2.5)
+        status = host.request({"action": "status", "sample": True})
+        started = {record["pid"] for record in environment.player_events("start")}
+        live = {player["pid"] for player in status["players"]}
+        closed = started - live
+        host.close()
+    return {
+        "players": args.players,
+        "max_players": args.max_players,
+        "live": status["live"],
+        "live_rss_mb": round(status["rss_kb"] / 1024, 1),
+        "closed": status["closed"],
+        "closed_idle": len(closed - busy),
+        "closed_busy": len(closed & busy),
+        "live_busy": len(live & busy),
+        "cpu_percent": [player["cpu_percent"] for player in status["players"]],
+    }
+
+
+def run_status(args):
+    config = {"player_sample_interval": 60, "dedupe_window": 0}
+    with HostEnvironment(config, player=FAKE_VLC) as environment:
+        host = HostProcess(environment)
+        for index in range(args.players):
+            host.request({"url": f"https://example.com/status/{index}.mp4"})
+        # Let the players finish starting up first.
+        environment.wait_for_events("play", args.players)
+        samples = {}
+        for sample in (False, True):
+            latencies = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                host.request({"action": "status", "sample": sample})
+                latencies.append(time.perf_counter() - start)
+            samples["sampled" if sample else "cached"] = summarize(latencies)
+        host.close()
+    return dict(samples, players=args.players)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=12)
+    parser.add_argument("--max-players", type=int, default=4)
+    parser.add_argument("--player-mb", type=int, default=32, help="memory each capped player allocates")
+    parser.add_argument("--interval", type=float, default=0.2, help="player_sample_interval (s)")
+    parser.add_argument("--requests", type=int, default=50, help="status requests to time")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "supervisor",
+        "reaping": run_reaping(args),
+        "cap": run_cap(args),
+        "status": run_status(args),
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Request tracing: instrumentation overhead, log rotation and metrics export.
+
+- ``instrumentation``: cost per request of the tracing calls themselves,
+  measured in process: starting a trace, recording the stages an ``open``
+  goes through and finishing it, and separately the background drain
+  (histograms plus one JSON log line) per trace. Traces are drained every
+  ``--batch`` requests, outside the timed part, as the host's drain thread
+  would
+- ``host``: ``ping`` and ``open`` latency against a persistent host with
+  ``"tracing": false`` and with tracing and its log on, plus the host's own per-stage
+  histograms from ``{"action": "stats"}``
+- ``export``: trace log files and sizes after the run with a small
+  ``trace_log_bytes``, and the latency of scraping ``/metrics``
+
+    python benchmarks/bench_tracing.py --requests 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+from urllib.request import urlopen
+
+from harness import HostEnvironment, HostProcess, emit, free_port, summarize
+from vlc_host import tracing
+
+OPEN_STAGES = ("read", "decode", "queue", "validate", "probe", "spawn", "reply")
+
+
+def run_instrumentation(args):
+    tracer = tracing.Tracer(os.path.join(tempfile.mkdtemp(prefix="vlc_opener_tracing_"), "trace.log"),
+                            interval=3600)
+    token = tracing.current.set(None)
+    # Most of the cost is clock reads, whose price depends on the machine.
+    started = time.perf_counter_ns()
+    for _ in range(args.iterations):
+        tracing.now()
+    clock = (time.perf_counter_ns() - started) / args.iterations
+    # The same calls the host makes, outside and inside a request.
+    started = time.perf_counter_ns()
+    for _ in range(args.iterations):
+        mark = tracing.now()
+        tracing.add("probe", mark)
+    untraced = (time.perf_counter_ns() - started) / args.iterations
+
+    traced = drained = 0
+    for first in range(0, args.iterations, args.batch):
+        started = time.perf_counter_ns()
+        for index in range(first, min(first + args.batch, args.iterations)):
+            trace = tracer.start()
+            tracing.current.set(trace)
+            for stage in OPEN_STAGES:
+                tracing.lap(stage)
+            trace.action = "open"
+            trace.request_id = index
+            trace.success = True
+            tracer.finish(trace)
+        traced += time.perf_counter_ns() - started
+        started = time.perf_counter_ns()
+        tracer.drain()
+        drained += time.perf_counter_ns() - started
+    tracing.current.reset(token)
+    tracer.close()
+    traced /= args.iterations
+    drained /= args.iterations
+    return {
+        "iterations": args.iterations,
+        "clock_read_ns": round(clock, 1),
+        "untraced_stage_ns": round(untraced, 1),
+        "traced_request_ns": round(traced, 1),
+        "drain_per_trace_ns": round(drained, 1),
+    }
+
+
+def time_requests(host, message, count):
+    latencies = []
+    for index in range(count):
+        start = time.perf_counter()
+        host.request(dict(message, id=index, url=f"{message['url']}{index}.mp4") if "url" in message else message)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def run_host(args, state_dir):
+    results = {}
+    for enabled in (False, True):
+        config = {"tracing": enabled, "trace_log": enabled, "state_dir": state_dir, "dedupe_window": 0,
+                  "reuse_players": False, "trace_log_bytes": args.log_kb * 1024}
+        with HostEnvironment(config) as environment:
+            host = HostProcess(environment)
+            # Warm up imports and the player before timing.
+            host.request({"action": "ping"})
+            host.request({"url": "https://example.com/warmup.mp4"})
+            result = {
+                "ping": time_requests(host, {"action": "ping"}, args.requests),
+                "open": time_requests(host, {"url": "https://example.com/bench/"}, args.opens),
+            }
+            if enabled:
+                result["stages"] = host.request({"action": "stats"})["tracing"]["stages"]
+            host.close()
+        results["on" if enabled else "off"] = result
+    results["ping_overhead_us"] = round((results["on"]["ping"]["mean_ms"] - results["off"]["ping"]["mean_ms"]) * 1000, 1)
+    results["open_overhead_us"] = round((results["on"]["open"]["mean_ms"] - results["off"]["open"]["mean_ms"]) * 1000, 1)
+    return results
+
+
+def run_export(args, state_dir):
+    port = free_port()
+    config = {"state_dir": state_dir, "trace_log": True, "trace_log_bytes": args.log_kb * 1024,
+              "metrics_port": port, "metrics_file": os.path.join(state_dir, "metrics.prom")}
+    with HostEnvironment(config) as environment:
+        host = HostProcess(environment)
+        for index in range(50):
+            host.request({"id": index, "action": "ping"})
+        latencies = []
+        for _ in range(args.scrapes):
+            start = time.perf_counter()
+            with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                body = response.read()
+            latencies.append(time.perf_counter() - start)
+        host.close()
+    logs = sorted(name for name in os.listdir(state_dir) if name.startswith("trace.log"))
+    return {
+        "log_files": {name: os.path.getsize(os.path.join(state_dir, name)) for name in logs},
+        "log_limit_bytes": args.log_kb * 1024,
+        "metrics_file_bytes": os.path.getsize(config["metrics_file"]),
+        "metrics_bytes": len(body),
+        "scrape": summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="ping requests timed per mode")
+    parser.add_argument("--opens", type=int, default=200, help="open requests timed per mode")
+    parser.add_argument("--iterations", type=int, default=200000, help="in-process traces")
+    parser.add_argument("--batch", type=int, default=1000, help="in-process traces per drain")
+    parser.add_argument("--log-kb", type=int, default=64, help="trace_log_bytes, in KiB")
+    parser.add_argument("--scrapes", type=int, default=100)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix="vlc_opener_tracing_")
+    report = {
+        "benchmark": "tracing",
+        "instrumentation": run_instrumentation(args),
+        "host": run_host(args, state_dir),
+        "export": run_export(args, state_dir),
+    }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
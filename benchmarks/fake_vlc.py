@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Stand-in for the VLC executable used by the benchmarks.
+
+Accepts the subset of the VLC command line the host uses. URLs given on the
+command line are "played" once the simulated startup delay has passed; with
+``--rc-host=HOST:PORT`` it also serves a minimal RC interface that accepts
+``add``/``enqueue`` and friends, splitting their argument on spaces as VLC
+does: the first word is the MRL, later ones options, and any other words
+are logged as ``stray``. Every event is appended as a JSON line to
+``$FAKE_VLC_LOG`` with a ``time.monotonic()`` timestamp, which on Linux is
+comparable across processes.
+
+A played URL can also ask for resources, for supervisor tests:
+``fake_rss_mb=N`` in its query allocates and touches N MB more, and
+``fake_cpu=P`` keeps about P percent of one core busy.
+
+Playback time advances at ``FAKE_VLC_RATE`` seconds per second from the
+item's ``:start-time`` option, and is reported by ``get_time``. On exit the
+time each played item was stopped at is written to ``FAKE_VLC_RECENTS`` in
+the format of VLC's ``vlc-qt-interface.conf``.
+
+Environment:
+    FAKE_VLC_LOG         event log path (events are dropped when unset)
+    FAKE_VLC_STARTUP_MS  simulated startup time before playing (default 0)
+    FAKE_VLC_RSS_MB      memory to allocate and touch, like a real player (default 0)
+    FAKE_VLC_LIFETIME    seconds to stay alive; negative means until killed (default -1)
+    FAKE_VLC_RATE        playback seconds per wall-clock second (default 0: time stands still)
+    FAKE_VLC_RECENTS     recently played file to write on exit (default: none)
+"""
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+LOG_PATH = os.environ.get("FAKE_VLC_LOG")
+STARTUP = float(os.environ.get("FAKE_VLC_STARTUP_MS", "0")) / 1000
+RSS_MB = int(os.environ.get("FAKE_VLC_RSS_MB", "0"))
+LIFETIME = float(os.environ.get("FAKE_VLC_LIFETIME", "-1"))
+RATE = float(os.environ.get("FAKE_VLC_RATE", "0"))
+RECENTS_PATH = os.environ.get("FAKE_VLC_RECENTS")
+
+# "time" is the position when "since" was the monotonic time.
+state = {"time": 0, "since": 0.0, "length": 3600, "playing": None, "playlist": [], "stopped": {}}
+ballasts = []
+
+
+def log(event, **fields):
+    if not LOG_PATH:
+        return
+    record = dict(fields, event=event, pid=os.getpid(), t=time.monotonic())
+    fd = os.open(LOG_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(record) + "\n").encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def allocate(mb):
+    ballast = bytearray(mb * 1024 * 1024)
+    for offset in range(0, len(ballast), 4096):
+        ballast[offset] = 1
+    ballasts.append(ballast)
+
+
+def burn(percent):
+    # Busy for percent% of every 100 ms.
+    while True:
+        deadline = time.monotonic() + percent / 1000
+        while time.monotonic() < deadline:
+            pass
+        time.sleep(max(0.0, (100 - percent) / 1000))
+
+
+def position():
+    return int(state["time"] + RATE * (time.monotonic() - state["since"]))
+
+
+def play(url, options=()):
+    if state["playing"] is not None:
+        state["stopped"][state["playing"]] = position()
+    start = [option.split("=", 1)[1] for option in options if option.startswith(":start-time=")]
+    state["playing"] = url
+    state["time"] = int(float(start[-1])) if start else 0
+    state["since"] = time.monotonic()
+    state["playlist"].append(url)
+    log("play", url=url, options=list(options))
+    query = parse_qs(urlsplit(url).query)
+    if "fake_rss_mb" in query:
+        allocate(int(query["fake_rss_mb"][0]))
+    if "fake_cpu" in query:
+        threading.Thread(target=burn, args=(min(100.0, float(query["fake_cpu"][0])),), daemon=True).start()
+
+
+def handle_command(line):
+    command, _, argument = line.strip().partition(" ")
+    if command in ("add", "enqueue"):
+        url, *words = argument.split(" ")
+        options = [word for word in words if word.startswith(":")]
+        stray = [word for word in words if word and not word.startswith(":")]
+        if stray:
+            log("stray", url=url, words=stray)
+        if command == "add" or state["playing"] is None:
+            play(url, options)
+        else:
+            state["playlist"].append(url)
+            log("enqueue", url=url)
+        return ""
+    if command == "get_time":
+        return str(position())
+    if command == "get_length":
+        return str(state["length"])
+    if command == "is_playing":
+        return "1" if state["playing"] else "0"
+    if command == "play":
+        log("resume", url=state["playing"])
+        return ""
+    if command == "seek":
+        state["time"] = int(argument or 0)
+        state["since"] = time.monotonic()
+        return ""
+    if command == "status":
+        return f"( new input: {state['playing']} )\n( state playing )" if state["playing"] else "( state stopped )"
+    if command in ("quit", "shutdown"):
+        exit_player()
+    return ""
+
+
+def write_recents():
+    # VLC's Qt settings: a comma-separated list, items with commas quoted, times in milliseconds.
+    if state["playing"] is not None:
+        state["stopped"][state["playing"]] = position()
+    urls = list(state["stopped"])
+    with open(RECENTS_PATH, "w") as f:
+        f.write("[RecentsMRL]\n")
+        f.write("list=" + ", ".join(f'"{url}"' if "," in url else url for url in urls) + "\n")
+        f.write("times=" + ", ".join(str(state["stopped"][url] * 1000) for url in urls) + "\n")
+
+
+def exit_player():
+    log("exit")
+    if RECENTS_PATH:
+        write_recents()
+    os._exit(0)
+
+
+def serve_rc(host, port):
+    server = socket.create_server((host, port))
+    log("rc_listening", port=port)
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
+
+
+def serve_connection(conn):
+    with conn:
+        conn.sendall(b"VLC media player (fake)\nCommand Line Interface initialized.\n> ")
+        buffer = b""
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                log("command", line=line.decode("utf-8", "replace"))
+                reply = handle_command(line.decode("utf-8", "replace"))
+                conn.sendall((reply + "\n> " if reply else "> ").encode("utf-8"))
+
+
+def main():
+    signal.signal(signal.SIGTERM, lambda *_: exit_player())
+    log("start", argv=sys.argv[1:])
+    allocate(RSS_MB)
+
+    rc_host = None
+    urls = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--rc-host="):
+            rc_host = arg.split("=", 1)[1]
+        elif arg.startswith(":") and urls:
+            urls[-1][1].append(arg)
+        elif not arg.startswith("-"):
+            urls.append((arg, []))
+
+    time.sleep(STARTUP)
+    if rc_host:
+        host, _, port = rc_host.rpartition(":")
+        threading.Thread(target=serve_rc, args=(host, int(port)), daemon=True).start()
+    for url, options in urls:
+        play(url, options)
+
+    if LIFETIME >= 0:
+        time.sleep(LIFETIME)
+        exit_player()
+    else:
+        threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""An in-memory Windows machine for the installer benchmarks.
+
+``FakeSystem`` has the methods of ``vlc_installer.discovery.WindowsSystem``
+over dictionaries: files (path -> mtime and version), registry keys
+((hive, key) -> values) and environment variables. Paths and keys are
+case-insensitive, as on Windows. ``latency`` seconds are slept on every
+registry or filesystem call, standing in for a cold disk and registry
+hive, and ``calls`` counts them.
+
+``FakeEffects`` is ``vlc_installer.effects.WindowsEffects`` over a registry
+dictionary and a set of shortcuts, with a delay per call and failures on
+demand.
+"""
+import ntpath
+import os
+import sys
+import threading
+import time
+
+from harness import REPO_DIR
+
+SRC_DIR = os.path.join(REPO_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from vlc_installer.effects import WindowsEffects  # noqa: E402
+
+VLC_UNINSTALL = r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"
+PYTHON_CORE = r"SOFTWARE\Python\PythonCore"
+
+
+class FakeSystem:
+    def __init__(self, environ=None, latency=0.0):
+        self.env = dict(environ or {})
+        self.latency = latency
+        self.files = {}
+        self.directories = {}
+        self.keys = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def add_file(self, path, version=None, mtime=1):
+        path = ntpath.normpath(path)
+        self.files[path.lower()] = [mtime, version]
+        parent, name = ntpath.split(path)
+        while name:
+            self.directories.setdefault(parent.lower(), {})[name.lower()] = name
+            parent, name = ntpath.split(parent)
+
+    def touch(self, path, version=None):
+        # A newer file at path, as an update would leave.
+        entry = self.files[ntpath.normpath(path).lower()]
+        entry[0] += 1
+        if version is not None:
+            entry[1] = version
+
+    def add_key(self, hive, key, **values):
+        self.keys.setdefault((hive, key.lower()), {}).update(
+            {("" if name == "default" else name).lower(): value for name, value in values.items()})
+        parent, _, name = key.rpartition("\\")
+        while name:
+            self.keys.setdefault((hive, parent.lower()), {})
+            self.directories.setdefault((hive, parent.lower()), {})[name.lower()] = name
+            parent, _, name = parent.rpartition("\\")
+
+    def wait(self):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def environ(self, name):
+        return self.env.get(name)
+
+    def mtime(self, path):
+        self.wait()
+        entry = self.files.get(ntpath.normpath(path).lower())
+        return entry[0] if entry else None
+
+    def listdir(self, path):
+        self.wait()
+        return list(self.directories.get(ntpath.normpath(path).lower(), {}).values())
+
+    def registry_value(self, hive, key, name=""):
+        self.wait()
+        return self.keys.get((hive, key.lower()), {}).get(name.lower())
+
+    def registry_subkeys(self, hive, key):
+        self.wait()
+        return list(self.directories.get((hive, key.lower()), {}).values())
+
+    def file_version(self, path):
+        self.wait()
+        entry = self.files.get(ntpath.normpath(path).lower())
+        return entry[1] if entry else None
+
+
+def typical_machine(latency=0.0, uninstall_entries=200, path_dirs=25):
+    # A machine where none of the three programs is where the old fixed paths looked.
+    system = FakeSystem({
+        "ProgramFiles": r"C:\Program Files",
+        "ProgramFiles(x86)": r"C:\Program Files (x86)",
+        "ProgramW6432": r"C:\Program Files",
+        "LOCALAPPDATA": r"C:\Users\user\AppData\Local",
+        "PATH": ";".join([rf"C:\Tools\bin{index}" for index in range(path_dirs)]
+                         + [r"C:\Windows\system32", r"C:\Users\user\AppData\Local\Programs\Python\Python312"]),
+    }, latency)
+    # VLC on a second drive, known only to its uninstall entry.
+    system.add_file(r"D:\Apps\VideoLAN\VLC\vlc.exe", (3, 0, 21, 0))
+    system.add_key("HKLM", rf"{VLC_UNINSTALL}\VLC media player", DisplayName="VLC media player",
+                   DisplayVersion="3.0.21", InstallLocation=r"D:\Apps\VideoLAN\VLC",
+                   DisplayIcon=r"D:\Apps\VideoLAN\VLC\vlc.exe,0")
+    # An old 32-bit VLC left behind in Program Files (x86).
+    system.add_file(r"C:\Program Files (x86)\VideoLAN\VLC\vlc.exe", (2, 2, 8, 0))
+    # Chrome installed per user, registered in App Paths.
+    chrome = r"C:\Users\user\AppData\Local\Google\Chrome\Application\chrome.exe"
+    system.add_file(chrome, (126, 0, 6478, 127))
+    system.add_key("HKCU", rf"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\chrome.exe", default=chrome)
+    # Three Pythons: 3.8 for all users, 3.11 and 3.12 per user.
+    system.add_file(r"C:\Program Files\Python38\python.exe", (3, 8, 10, 150))
+    system.add_key("HKLM", r"SOFTWARE\Python\PythonCore\3.8\InstallPath", default="C:\\Program Files\\Python38\\")
+    for minor, patch in ((11, 9), (12, 4)):
+        directory = rf"C:\Users\user\AppData\Local\Programs\Python\Python3{minor}"
+        system.add_file(rf"{directory}\python.exe", (3, minor, patch, 150))
+        system.add_key("HKCU", rf"{PYTHON_CORE}\3.{minor}\InstallPath", default=directory,
+                       ExecutablePath=rf"{directory}\python.exe")
+    # Everything else a workstation has installed.
+    for index in range(uninstall_entries):
+        system.add_key("HKLM", rf"{VLC_UNINSTALL}\{{{index:08d}-0000-0000-0000-000000000000}}",
+                       DisplayName=f"Some Application {index}", DisplayVersion=f"1.{index}",
+                       InstallLocation=rf"C:\Program Files\Vendor{index}")
+    return system
+
+
+class FakeEffects(WindowsEffects):
+    def __init__(self, desktop=r"C:\Users\user\Desktop", registry_latency=0.0, shortcut_latency=0.0, fail=()):
+        self.desktop = desktop
+        self.registry_latency = registry_latency
+        self.shortcut_latency = shortcut_latency
+        # Names of the methods that raise, e.g. {"registry_set"}.
+        self.fail = set(fail)
+        self.registry = {}
+        self.shortcuts = {}
+
+    def check(self, name, latency):
+        if latency:
+            time.sleep(latency)
+        if name in self.fail:
+            raise OSError(f"{name} failed (injected)")
+
+    def registry_get(self, key):
+        self.check("registry_get", self.registry_latency)
+        return self.registry.get(key.lower())
+
+    def registry_set(self, key, value):
+        self.check("registry_set", self.registry_latency)
+        self.registry[key.lower()] = value
+
+    def registry_delete(self, key):
+        self.check("registry_delete", self.registry_latency)
+        self.registry.pop(key.lower(), None)
+
+    def desktop_dir(self):
+        return self.desktop
+
+    def shortcut_exists(self, path):
+        return path.lower() in self.shortcuts
+
+    def create_shortcut(self, path, target, working_dir, icon):
+        self.check("create_shortcut", self.shortcut_latency)
+        self.shortcuts[path.lower()] = (target, working_dir, icon)
+
+    def remove_shortcut(self, path):
+        self.check("remove_shortcut", 0)
+        self.shortcuts.pop(path.lower(), None)
@@ -0,0 +1,207 @@
+"""Helpers shared by the benchmarks: act as Chrome towards a native host.
+
+The benchmarks run on Linux against ``src/scripts/vlc_opener.py`` with a
+throwaway config that points ``vlc_path`` at a stub player, so no VLC or
+Chrome installation is needed.
+"""
+import json
+import os
+import shutil
+import signal
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(REPO_DIR, "src", "scripts")
+HOST_SCRIPT = os.path.join(SCRIPTS_DIR, "vlc_opener.py")
+FAKE_VLC = os.path.join(REPO_DIR, "benchmarks", "fake_vlc.py")
+
+
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+def encode_frame(message):
+    payload = json.dumps(message).encode("utf-8")
+    return struct.pack("=I", len(payload)) + payload
+
+
+def read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("host closed stdout")
+        data += chunk
+    return data
+
+
+def read_frame(stream):
+    length = struct.unpack("=I", read_exact(stream, 4))[0]
+    return json.loads(read_exact(stream, length))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return latency statistics in milliseconds for a list of seconds."""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        "count": len(millis),
+        "mean_ms": round(statistics.fmean(millis), 3) if millis else 0.0,
+        "p50_ms": round(percentile(millis, 0.50), 3),
+        "p95_ms": round(percentile(millis, 0.95), 3),
+        "p99_ms": round(percentile(millis, 0.99), 3),
+        "max_ms": round(max(millis), 3) if millis else 0.0,
+    }
+
+
+class HostEnvironment:
+    """A temporary directory holding the host config and stub player."""
+
+    def __init__(self, config=None, player=None, player_env=None):
+        self.directory = tempfile.mkdtemp(prefix="vlc_opener_bench_")
+        self.config_path = os.path.join(self.directory, "vlc_opener.json")
+        self.player_log = os.path.join(self.directory, "player.log")
+        self.exec_log = os.path.join(self.directory, "exec.log")
+        self.player_env = dict(player_env or {})
+        config = dict(config or {})
+        config.setdefault("vlc_path", player or shutil.which("true") or "true")
+        with open(self.config_path, "w") as f:
+            json.dump(config, f)
+
+    def env(self):
+        env = dict(os.environ)
+        env["VLC_OPENER_CONFIG"] = self.config_path
+        env["FAKE_VLC_LOG"] = self.player_log
+        env["STUB_PLAYER_LOG"] = self.exec_log
+        env.update(self.player_env)
+        return env
+
+    def player_events(self, event=None):
+        return [record for record in read_events(self.player_log)
+                if event is None or record["event"] == event]
+
+    def wait_for_events(self, event, count, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.player_events(event)
+            if len(events) >= count or time.monotonic() > deadline:
+                return events
+            time.sleep(0.005)
+
+    def player_pids(self):
+        return sorted({record["pid"] for record in self.player_events("start")})
+
+    def kill_players(self):
+        for pid in self.player_pids():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def close(self):
+        self.kill_players()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HostProcess:
+    """One native host process, driven over its stdin/stdout pipes."""
+
+    def __init__(self, environment, command=None):
+        self.process = subprocess.Popen(
+            command or [sys.executable, HOST_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=environment.env(),
+        )
+
+    def send(self, message):
+        self.process.stdin.write(encode_frame(message))
+        self.process.stdin.flush()
+
+    def receive(self):
+        return read_frame(self.process.stdout)
+
+    def request(self, message):
+        self.send(message)
+        return self.receive()
+
+    def close(self, timeout=10):
+        if self.process.stdin and not self.process.stdin.closed:
+            self.process.stdin.close()
+        try:
+            return self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            return self.process.wait()
+
+
+def read_events(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def rss_kb(pid):
+    """Resident set size of a live process in KiB (Linux), 0 if it is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size (VmHWM) of a live process in KiB (Linux), 0 if it is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def emit(report, output=None):
+    """Print a report as JSON, optionally also writing it to a file."""
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,380 @@
+"""Local HTTP stand-in servers for the benchmarks.
+
+``FixtureServer`` runs a threaded HTTP/1.1 server on a loopback port with
+keep-alive, HEAD and single-range GET support, optional artificial latency
+per request, and a count of the requests it served. Routes:
+
+- ``/chain/<n>/<name>``: redirects (302) to ``/chain/<n-1>/<name>``; ``/chain/0/<name>`` is a small media file
+- ``/moved/<n>/<name>``: like ``/chain`` but the redirects are permanent (301)
+- ``/nohead/<n>/<name>``: like ``/chain`` but answers HEAD with 405
+- ``/nostore/<n>/<name>``: like ``/chain`` but the redirects say ``Cache-Control: no-store``
+- ``/media/<kind>/<name>``: a small body of the given kind (see ``MEDIA_SAMPLES``), served
+  with its usual Content-Type; ``mislabeled`` is an MP4 sent as ``application/octet-stream``
+- ``/playlist/<format>/<n>/<name>[?delay_ms=D]``: a generated ``m3u``, ``pls`` or ``xspf``
+  playlist of n entries, streamed without a Content-Length and pausing D ms every 1000
+  entries. Entries mix relative and absolute URLs, every 4th relative one has a space in
+  its name, every 10th repeats the one before and every 1000th is a ``file:`` URL; ``finished[path]`` records when the body was done
+- ``/protected/<mb>/<name>``: an ``mb`` MiB body with range support, answered with 403
+  unless the request carries ``Cookie: session=ok``
+- ``/hls/<vod|live>/<n>/index.m3u8[?kb=K&segment_ms=S&jitter_ms=J]``: an HLS media playlist of
+  n segments of K KiB and S ms each; ``live`` is a sliding window of the last n segments,
+  one more published every S ms since the server started. Each segment takes up to J ms
+  longer than the latency (a fixed pseudo-random amount per URL)
+- ``/dash/<n>/manifest.mpd[?...]``: the same as a static DASH manifest with a
+  ``SegmentTemplate`` (``init.m4s`` and ``seg$Number$.m4s``)
+- ``/flaky/<kb>/<name>[?drop_kb=D&kbps=R]``: ``kb`` KiB of pseudo-random bytes (the same for
+  every request; ``flaky_body`` returns them) with an ETag and range support. Each response
+  hangs up after D KiB of its body, and each connection sends at most R KiB per second
+
+``connections`` counts the TCP connections the server accepted.
+"""
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MEDIA_BODY = b"\x00" * 4096
+
+HLS_MASTER = (b"#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1280000,RESOLUTION=1280x720\n"
+              b"720p.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=640000\n360p.m3u8\n")
+HLS_MEDIA = (b"#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:0\n"
+             + b"".join(b"#EXTINF:6.0,\nsegment%d.ts\n" % i for i in range(10)) + b"#EXT-X-ENDLIST\n")
+DASH_MPD = (b'<?xml version="1.0" encoding="UTF-8"?>\n'
+            b'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT60S">'
+            b'<Period><AdaptationSet mimeType="video/mp4"><Representation id="1" bandwidth="800000"/>'
+            b'</AdaptationSet></Period></MPD>\n')
+MP4_BODY = b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00isomiso2avc1mp41" + MEDIA_BODY
+TS_BODY = b"".join(b"\x47\x40\x00\x10" + b"\xff" * 184 for _ in range(22))
+MKV_BODY = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01" + MEDIA_BODY
+MP3_BODY = b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x64" + MEDIA_BODY
+AAC_BODY = b"\xff\xf1\x50\x80\x02\x1f\xfc" + MEDIA_BODY
+OGG_BODY = b"OggS\x00\x02" + MEDIA_BODY
+
+# kind: (body, Content-Type)
+MEDIA_SAMPLES = {
+    "hls": (HLS_MASTER, "application/vnd.apple.mpegurl"),
+    "hls-media": (HLS_MEDIA, "application/vnd.apple.mpegurl"),
+    "dash": (DASH_MPD, "application/dash+xml"),
+    "mp4": (MP4_BODY, "video/mp4"),
+    "ts": (TS_BODY, "video/mp2t"),
+    "mkv": (MKV_BODY, "video/x-matroska"),
+    "mp3": (MP3_BODY, "audio/mpeg"),
+    "aac": (AAC_BODY, "audio/aac"),
+    "ogg": (OGG_BODY, "audio/ogg"),
+    "mislabeled": (MP4_BODY, "application/octet-stream"),
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.dispatch(head=True)
+
+    def do_GET(self):
+        self.dispatch(head=False)
+
+    def dispatch(self, head):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.paths.append((self.command, self.path))
+        if server.latency:
+            time.sleep(server.latency)
+        parts = self.path.lstrip("/").split("/")
+        route = server.routes.get(parts[0])
+        if route is None:
+            return self.send_body(404, b"not found", "text/plain", head)
+        route(self, parts[1:], head)
+
+    def send_body(self, status, body, content_type, head, headers=()):
+        range_header = self.headers.get("Range")
+        start, end = 0, len(body) - 1
+        if status == 200 and range_header and range_header.startswith("bytes="):
+            first, _, last = range_header[6:].partition("-")
+            start = int(first) if first else max(0, len(body) - int(last))
+            end = min(int(last), len(body) - 1) if first and last else len(body) - 1
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1 if body else 0))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if not head and body:
+            try:
+                self.wfile.write(memoryview(body)[start:end + 1])
+            except ConnectionError:
+                # The client hung up mid-body, as players do when seeking.
+                self.close_connection = True
+
+    def redirect(self, location, head, headers=(), status=302):
+        self.send_response(status)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+
+def chain_route(prefix, head_allowed=True, headers=(), status=302):
+    def route(handler, parts, head):
+        if head and not head_allowed:
+            return handler.send_body(405, b"", "text/plain", head)
+        count, name = int(parts[0]), "/".join(parts[1:])
+        if count > 0:
+            return handler.redirect(f"/{prefix}/{count - 1}/{name}", head, headers, status)
+        handler.send_body(200, MEDIA_BODY, "video/mp4", head)
+    return route
+
+
+def media_route(handler, parts, head):
+    sample = MEDIA_SAMPLES.get(parts[0]) if parts else None
+    if sample is None:
+        return handler.send_body(404, b"not found", "text/plain", head)
+    handler.send_body(200, sample[0], sample[1], head)
+
+
+def protected_route(handler, parts, head):
+    if "session=ok" not in (handler.headers.get("Cookie") or ""):
+        return handler.send_body(403, b"forbidden", "text/plain", head)
+    size = int(parts[0]) * 1024 * 1024
+    server = handler.server
+    with server.lock:
+        body = server.bodies.get(size)
+        if body is None:
+            body = server.bodies[size] = bytes(range(256)) * (size // 256)
+    handler.send_body(200, body, "video/mp4", head)
+
+
+def playlist_entry(index):
+    if index % 1000 == 999:
+        return "file:///etc/passwd"
+    if index % 10 == 9:
+        index -= 1
+    if index % 8 == 3:
+        return f"media/Show {index}.mp4"
+    return f"media/{index}.mp4" if index % 2 else f"http://127.0.0.1:1/abs/{index}.mp4"
+
+
+def playlist_lines(kind, count):
+    if kind == "m3u":
+        yield "#EXTM3U\n"
+        for index in range(count):
+            yield f"#EXTINF:-1,Entry {index}\n{playlist_entry(index)}\n"
+    elif kind == "pls":
+        yield "[playlist]\n"
+        for index in range(count):
+            yield f"File{index + 1}={playlist_entry(index)}\nTitle{index + 1}=Entry {index}\n"
+        yield f"NumberOfEntries={count}\nVersion=2\n"
+    else:
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<playlist version="1" xmlns="http://xspf.org/ns/0/"><trackList>\n'
+        for index in range(count):
+            yield f"<track><location>{playlist_entry(index)}</location><title>Entry {index}</title></track>\n"
+        yield "</trackList></playlist>\n"
+
+
+def playlist_route(handler, parts, head):
+    kind, count = parts[0], int(parts[1])
+    delay = float(parse_qs(urlsplit(handler.path).query).get("delay_ms", ["0"])[0]) / 1000
+    content_type = {"m3u": "audio/x-mpegurl", "pls": "audio/x-scpls", "xspf": "application/xspf+xml"}[kind]
+    handler.send_response(200)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Connection", "close")
+    handler.end_headers()
+    handler.close_connection = True
+    if head:
+        return
+    buffer = []
+    try:
+        for index, line in enumerate(playlist_lines(kind, count)):
+            buffer.append(line)
+            if index % 1000 == 999:
+                handler.wfile.write("".join(buffer).encode("utf-8"))
+                handler.wfile.flush()
+                buffer = []
+                if delay:
+                    time.sleep(delay)
+        handler.wfile.write("".join(buffer).encode("utf-8"))
+    except OSError:
+        return
+    with handler.server.lock:
+        handler.server.finished[handler.path] = time.monotonic()
+
+
+def segment_params(handler):
+    query = parse_qs(urlsplit(handler.path).query)
+    return (int(query.get("kb", ["256"])[0]), float(query.get("segment_ms", ["1000"])[0]) / 1000,
+            float(query.get("jitter_ms", ["0"])[0]) / 1000, urlsplit(handler.path).query)
+
+
+def send_segment(handler, size, jitter, head):
+    if jitter:
+        time.sleep(random.Random(handler.path).uniform(0, jitter))
+    server = handler.server
+    with server.lock:
+        body = server.bodies.get(size)
+        if body is None:
+            body = server.bodies[size] = bytes(range(256)) * (size // 256)
+    handler.send_body(200, body, "video/mp2t", head)
+
+
+def flaky_body(size):
+    return random.Random(size).randbytes(size)
+
+
+def flaky_route(handler, parts, head):
+    size = int(parts[0]) * 1024
+    query = parse_qs(urlsplit(handler.path).query)
+    drop = int(query.get("drop_kb", ["0"])[0]) * 1024
+    rate = int(query.get("kbps", ["0"])[0]) * 1024
+    server = handler.server
+    with server.lock:
+        body = server.bodies.get(("flaky", size))
+        if body is None:
+            body = server.bodies[("flaky", size)] = flaky_body(size)
+    start, end, status = 0, size - 1, 200
+    range_header = handler.headers.get("Range")
+    if range_header and range_header.startswith("bytes=") and \
+            handler.headers.get("If-Range") in (None, f'"{size}"'):
+        first, _, last = range_header[6:].partition("-")
+        start = int(first) if first else max(0, size - int(last))
+        end = min(int(last), size - 1) if first and last else size - 1
+        status = 206
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/octet-stream")
+    handler.send_header("Content-Length", str(end - start + 1))
+    handler.send_header("Accept-Ranges", "bytes")
+    handler.send_header("ETag", f'"{size}"')
+    if status == 206:
+        handler.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+    handler.end_headers()
+    if head:
+        return
+    stop = min(end + 1, start + drop) if drop else end + 1
+    step = 64 * 1024
+    try:
+        for offset in range(start, stop, step):
+            handler.wfile.write(memoryview(body)[offset:min(offset + step, stop)])
+            if rate:
+                time.sleep(min(step, stop - offset) / rate)
+    except ConnectionError:
+        pass
+    if stop <= end:
+        # Hang up part way through the body, as a dropped connection would.
+        handler.close_connection = True
+        handler.wfile.flush()
+        handler.connection.shutdown(socket.SHUT_RDWR)
+
+
+def hls_route(handler, parts, head):
+    mode, count, name = parts[0], int(parts[1]), parts[2].partition("?")[0]
+    kb, duration, jitter, query = segment_params(handler)
+    first, last = 0, count - 1
+    if mode == "live":
+        last = int((time.monotonic() - handler.server.started) / duration)
+        first = max(0, last - count + 1)
+    if name.startswith("seg"):
+        index = int(name[3:].partition(".")[0])
+        if not first <= index <= last:
+            return handler.send_body(404, b"not found", "text/plain", head)
+        return send_segment(handler, kb * 1024, jitter, head)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{max(1, round(duration))}",
+             f"#EXT-X-MEDIA-SEQUENCE:{first}"]
+    for index in range(first, last + 1):
+        lines += [f"#EXTINF:{duration:.3f},", f"seg{index}.ts?{query}"]
+    if mode != "live":
+        lines.append("#EXT-X-ENDLIST")
+    handler.send_body(200, ("\n".join(lines) + "\n").encode("utf-8"), "application/vnd.apple.mpegurl", head)
+
+
+def dash_route(handler, parts, head):
+    count, name = int(parts[0]), parts[1].partition("?")[0]
+    kb, duration, jitter, query = segment_params(handler)
+    if name.endswith(".m4s"):
+        return send_segment(handler, kb * 1024, jitter, head)
+    mpd = (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+           f'mediaPresentationDuration="PT{count * duration:.3f}S" minBufferTime="PT2S">'
+           f'<Period><AdaptationSet mimeType="video/mp4">'
+           f'<SegmentTemplate timescale="1000" duration="{int(duration * 1000)}" startNumber="0" '
+           f'initialization="init.m4s?{query}" media="seg$Number$.m4s?{query}"/>'
+           f'<Representation id="video" bandwidth="800000"/></AdaptationSet></Period></MPD>\n')
+    handler.send_body(200, mpd.encode("utf-8").replace(b"&", b"&amp;"), "application/dash+xml", head)
+
+
+class CountingServer(ThreadingHTTPServer):
+    connections = 0
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping connections (seeks, pooled connections being
+        # replaced) is part of what the benchmarks exercise, not an error.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FixtureServer:
+    def __init__(self, latency=0.0):
+        self.httpd = CountingServer(("127.0.0.1", 0), FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.paths = []
+        self.httpd.routes = {
+            "chain": chain_route("chain"),
+            "moved": chain_route("moved", status=301),
+            "nohead": chain_route("nohead", head_allowed=False),
+            "nostore": chain_route("nostore", headers=[("Cache-Control", "no-store")]),
+            "media": media_route,
+            "playlist": playlist_route,
+            "protected": protected_route,
+            "hls": hls_route,
+            "dash": dash_route,
+            "flaky": flaky_route,
+        }
+        self.httpd.started = time.monotonic()
+        self.httpd.finished = {}
+        self.httpd.bodies = {}
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    @property
+    def finished(self):
+        return self.httpd.finished
+
+    def add_route(self, name, route):
+        self.httpd.routes[name] = route
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,41 @@
+"""Run the real host with a player whose opens take a configurable time.
+
+Used by bench_concurrency.py: URLs containing ``/slow/`` block for
+``$SLOW_PLAYER_MS`` milliseconds (like a slow spawn or URL probe), all others
+return at once. Everything else -- framing, dispatch, concurrency limit --
+is the unmodified host.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "scripts"))
+
+import vlc_opener
+from vlc_host import player
+
+SLOW_SECONDS = float(os.environ.get("SLOW_PLAYER_MS", "50")) / 1000
+
+
+class SlowPlayer:
+    mode = "slow"
+
+    def open(self, url, options=()):
+        if "/slow/" in url:
+            time.sleep(SLOW_SECONDS)
+        return {"player": "slow"}
+
+    def enqueue(self, urls):
+        return {"player": "slow"}
+
+    def reuse(self, url):
+        return None
+
+    def close(self):
+        pass
+
+
+player.create_player = lambda config, supervisor=None: SlowPlayer()
+
+if __name__ == "__main__":
+    vlc_opener.main()
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+# Minimal player stand-in for the latency harness: records the moment it was
+# exec'd (wall clock, from bash without forking) and its arguments, then exits.
+# Line format: exec<TAB>pid<TAB>epoch seconds<TAB>arguments...
+IFS=$'\t'
+printf 'exec\t%s\t%s\t%s\n' "$$" "${EPOCHREALTIME:-$(date +%s.%N)}" "$*" >> "${STUB_PLAYER_LOG:-/dev/null}"
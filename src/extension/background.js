@@ -1,15 +1,258 @@
+const HOST_NAME = "com.vlc.opener";
+const RECONNECT_MIN_DELAY = 500;
+const RECONNECT_MAX_DELAY = 30000;
+// Chunked messages: items per frame (by JSON length) and unacknowledged frames in flight.
+const CHUNK_BYTES = 256 * 1024;
+const CHUNK_WINDOW = 4;
+const MEDIA_LINK_PATTERN = /\.(m3u8?|mpd|mp4|m4v|mkv|webm|mov|ts|mp3|m4a|aac|ogg|oga|opus|flac|pls|xspf)(\?|#|$)/i;
+
+let port = null;
+let pending = new Map();
+let outgoing = new Map();
+let nextRequestId = 1;
+let reconnectDelay = RECONNECT_MIN_DELAY;
+let reconnectTimer = null;
+
 chrome.contextMenus.create({
   id: "openInVLC",
   title: "Open in VLC",
   contexts: ["link", "video", "audio"]
   });
 
+chrome.contextMenus.create({
+  id: "openInVLCWithCookies",
+  title: "Open in VLC with this site's cookies",
+  contexts: ["link", "video", "audio"],
+  // Only http(s) URLs have an origin to ask cookie access for.
+  targetUrlPatterns: ["http://*/*", "https://*/*"]
+  });
+
+chrome.contextMenus.create({
+  id: "enqueuePageInVLC",
+  title: "Enqueue media links on this page in VLC",
+  contexts: ["page"]
+  });
+
+function connect() {
+  if (port) {
+    return port;
+  }
+  clearTimeout(reconnectTimer);
+  reconnectTimer = null;
+
+  port = chrome.runtime.connectNative(HOST_NAME);
+  // Replies carry the id of their request and may arrive out of order.
+  port.onMessage.addListener((response) => {
+    reconnectDelay = RECONNECT_MIN_DELAY;
+    if (response.ack !== undefined) {
+      receiveAck(response);
+      return;
+    }
+    if (response.chunk !== undefined) {
+      response = receiveChunk(response);
+      if (!response) {
+        return;
+      }
+    }
+    const entry = pending.get(response.id);
+    if (entry) {
+      pending.delete(response.id);
+      entry.callback(response);
+    }
+  });
+  port.onDisconnect.addListener(() => {
+    const error = chrome.runtime.lastError;
+    const failed = pending;
+    port = null;
+    pending = new Map();
+    failed.forEach((entry) => entry.callback({
+      success: false,
+      error: error ? error.message : "Native host disconnected"
+    }));
+    scheduleReconnect();
+  });
+  return port;
+}
+
+function scheduleReconnect() {
+  if (reconnectTimer) {
+    return;
+  }
+  reconnectTimer = setTimeout(() => {
+    reconnectTimer = null;
+    connect();
+  }, reconnectDelay);
+  reconnectDelay = Math.min(reconnectDelay * 2, RECONNECT_MAX_DELAY);
+}
+
+// onItems, if given, receives the items of a chunked reply batch by batch
+// instead of having them collected into response.items.
+function sendToHost(message, callback, onItems) {
+  const id = nextRequestId++;
+  pending.set(id, { callback, onItems });
+  connect().postMessage({ ...message, id });
+  return id;
+}
+
+function* itemBatches(items) {
+  let batch = [];
+  let size = 0;
+  for (const item of items) {
+    const length = JSON.stringify(item).length + 1;
+    if (batch.length && size + length > CHUNK_BYTES) {
+      yield batch;
+      batch = [];
+      size = 0;
+    }
+    batch.push(item);
+    size += length;
+  }
+  yield batch;
+}
+
+// Sends message with a list of items that may be too big for one frame, in
+// chunks the host acknowledges as it consumes them.
+async function sendChunked(message, items, callback, onItems) {
+  const stream = { acked: -1, wake: null, finished: false };
+  const id = nextRequestId++;
+  outgoing.set(id, stream);
+  pending.set(id, {
+    onItems,
+    callback: (response) => {
+      // The reply (or a disconnect) ends the stream, even part way through.
+      stream.finished = true;
+      outgoing.delete(id);
+      wakeStream(stream);
+      callback(response);
+    }
+  });
+  const target = connect();
+  let chunk = 0;
+  let previous = null;
+  for (const batch of itemBatches(items)) {
+    if (previous && !(await postChunk(target, stream, message, id, chunk++, previous, true))) {
+      return;
+    }
+    previous = batch;
+  }
+  await postChunk(target, stream, message, id, chunk, previous, false);
+}
+
+async function postChunk(target, stream, message, id, chunk, items, more) {
+  while (!stream.finished && chunk - stream.acked > CHUNK_WINDOW) {
+    await new Promise((resolve) => { stream.wake = resolve; });
+  }
+  if (stream.finished) {
+    return false;
+  }
+  const frame = chunk === 0 ? { ...message, id, chunk, more, items } : { id, chunk, more, items };
+  target.postMessage(frame);
+  return true;
+}
+
+function wakeStream(stream) {
+  const wake = stream.wake;
+  stream.wake = null;
+  if (wake) {
+    wake();
+  }
+}
+
+function receiveAck(response) {
+  const stream = outgoing.get(response.id);
+  if (stream && response.ack > stream.acked) {
+    stream.acked = response.ack;
+    wakeStream(stream);
+  }
+}
+
+// Collects a chunked reply; returns the whole reply once its last chunk is in.
+function receiveChunk(response) {
+  const entry = pending.get(response.id);
+  if (!entry) {
+    return null;
+  }
+  const { chunk, more, items, ...head } = response;
+  if (chunk === 0) {
+    entry.reply = { ...head, items: [] };
+  }
+  if (entry.onItems) {
+    entry.onItems(items);
+  } else {
+    for (const item of items) {
+      entry.reply.items.push(item);
+    }
+  }
+  port.postMessage({ id: response.id, ack: chunk });
+  return more ? null : entry.reply;
+}
+
+function collectMediaLinks(pattern) {
+  const links = new Set();
+  for (const element of document.querySelectorAll("a[href], video[src], audio[src], source[src]")) {
+    const url = element.href || element.src;
+    if (url && new RegExp(pattern, "i").test(url)) {
+      links.add(url);
+    }
+  }
+  return [...links];
+}
+
+// Request headers the host's relay can send to the origin on VLC's behalf.
+function requestHeaders(tab, cookies) {
+  const headers = { "User-Agent": navigator.userAgent };
+  if (tab && /^https?:/.test(tab.url || "")) {
+    headers.Referer = tab.url;
+  }
+  if (cookies && cookies.length) {
+    headers.Cookie = cookies.map((cookie) => `${cookie.name}=${cookie.value}`).join("; ");
+  }
+  return headers;
+}
+
 chrome.contextMenus.onClicked.addListener((info, tab) => {
-if (info.menuItemId === "openInVLC") {
-    chrome.runtime.sendNativeMessage("com.vlc.opener", {
-    url: info.linkUrl || info.srcUrl
+const url = info.linkUrl || info.srcUrl;
+// blob: and data: URLs have a "null" origin, so they can only be opened plainly.
+if (info.menuItemId === "openInVLC" || info.menuItemId === "openInVLCWithCookies" && !/^https?:/i.test(url)) {
+    sendToHost({
+    url,
+    headers: requestHeaders(tab)
     }, (response) => {
     console.log("Response:", response);
     });
   }
-});
\ No newline at end of file
+else if (info.menuItemId === "openInVLCWithCookies") {
+    // Asked for per site, from the click itself (permission requests need a user gesture).
+    chrome.permissions.request({
+    permissions: ["cookies"],
+    origins: [new URL(url).origin + "/*"]
+    }, (granted) => {
+    const send = (cookies) => sendToHost({
+      url,
+      headers: requestHeaders(tab, cookies),
+      relay: true
+    }, (response) => {
+      console.log("Response:", response);
+    });
+    if (granted && chrome.cookies) {
+      chrome.cookies.getAll({ url }, send);
+    } else {
+      send([]);
+    }
+    });
+  }
+if (info.menuItemId === "enqueuePageInVLC") {
+    chrome.scripting.executeScript({
+    target: { tabId: tab.id },
+    func: collectMediaLinks,
+    args: [MEDIA_LINK_PATTERN.source]
+    }, (results) => {
+    const links = (results && results[0] && results[0].result) || [];
+    sendChunked({ action: "enqueue" }, links, (response) => {
+      console.log("Response:", response);
+    });
+    });
+  }
+});
+
+connect();
@@ -0,0 +1 @@
+"""Components of the VLC Opener native messaging host (``vlc_opener.py``)."""
@@ -0,0 +1,234 @@
+"""Shared broker daemon and the thin forwarders that talk to it.
+
+With ``"broker": true`` in the config, the first host to run starts a
+detached daemon (``vlc_opener.py --broker-daemon``) listening on
+``127.0.0.1:<broker_port>``, by default a port derived from the user so
+that users of one machine each get their own. Every host process, including the first, then
+only relays raw frames between Chrome and that daemon, so all browser
+profiles and windows share one service: one set of players, caches and
+stats. The daemon exits after ``broker_idle_timeout`` seconds without clients.
+
+Connections are authenticated with a random token that the daemon writes to
+``broker.json`` in the per-user state directory. A daemon that refuses our
+token belongs to someone else, and waiting for ours to bind its port would
+be in vain, so the host serves Chrome itself straight away.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+from vlc_host.framing import HEADER, encode_frame, decode_payload
+
+BROKER_FILE = "broker.json"
+# Default ports are spread over this range, below every OS's ephemeral ports.
+PORT_BASE = 20000
+PORT_RANGE = 10000
+DEFAULT_IDLE_TIMEOUT = 300.0
+DEFAULT_STARTUP_TIMEOUT = 5.0
+
+
+class BrokerUnavailable(OSError):
+    pass
+
+
+class BrokerRefused(BrokerUnavailable):
+    # A broker answered but did not accept our token.
+    pass
+
+
+def default_port():
+    if hasattr(os, "getuid"):
+        user = os.getuid()
+    else:
+        import getpass
+        import zlib
+        user = zlib.crc32(getpass.getuser().encode("utf-8"))
+    return PORT_BASE + user % PORT_RANGE
+
+
+def broker_file(state_dir):
+    return os.path.join(state_dir, BROKER_FILE)
+
+
+def read_token(state_dir):
+    try:
+        with open(broker_file(state_dir), "r") as f:
+            return json.load(f).get("token")
+    except (OSError, ValueError):
+        return None
+
+
+def write_token(state_dir, token, port):
+    os.makedirs(state_dir, exist_ok=True)
+    path = broker_file(state_dir)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"token": token, "port": port, "pid": os.getpid()}, f)
+    os.replace(temp_path, path)
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise BrokerUnavailable("broker closed the connection")
+        data += chunk
+    return data
+
+
+def connect(state_dir, port, timeout=2.0):
+    # Without a token of ours the hello still goes out: if a broker answers, it is not ours.
+    token = read_token(state_dir) or ""
+    try:
+        sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+    except OSError as e:
+        raise BrokerUnavailable(str(e))
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(encode_frame({"action": "hello", "token": token}))
+        length = HEADER.unpack(_recv_exact(sock, HEADER.size))[0]
+        reply = decode_payload(_recv_exact(sock, length))
+        if not reply.get("success"):
+            raise BrokerRefused(reply.get("error", "broker refused the connection"))
+        sock.settimeout(None)
+        return sock
+    except BrokerUnavailable:
+        sock.close()
+        raise
+    except (OSError, ValueError) as e:
+        sock.close()
+        raise BrokerUnavailable(str(e))
+
+
+def start_daemon(script_path):
+    import subprocess
+    args = [sys.executable, "-I", "-S", script_path, "--broker-daemon"]
+    options = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+               "stderr": subprocess.DEVNULL, "close_fds": True}
+    if os.name == "nt":
+        flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        try:
+            # Leave Chrome's job object so the daemon outlives this host.
+            return subprocess.Popen(args, creationflags=flags | subprocess.CREATE_BREAKAWAY_FROM_JOB, **options)
+        except OSError:
+            return subprocess.Popen(args, creationflags=flags, **options)
+    return subprocess.Popen(args, start_new_session=True, **options)
+
+
+def ensure_broker(state_dir, port, script_path, startup_timeout=DEFAULT_STARTUP_TIMEOUT):
+    try:
+        return connect(state_dir, port)
+    except BrokerRefused:
+        # Another user's daemon holds the port; ours could never bind it.
+        raise
+    except BrokerUnavailable:
+        pass
+    start_daemon(script_path)
+    deadline = time.monotonic() + startup_timeout
+    while True:
+        try:
+            return connect(state_dir, port)
+        except BrokerUnavailable:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.02)
+
+
+def forward(sock, stdin=None, stdout=None):
+    """Relay raw bytes between Chrome's pipes and the broker until both sides close."""
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+
+    def upstream():
+        try:
+            while True:
+                data = stdin.read1(65536)
+                if not data:
+                    break
+                sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            # Half-close: the daemon finishes in-flight requests, then closes.
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    threading.Thread(target=upstream, daemon=True).start()
+    try:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            stdout.write(data)
+            stdout.flush()
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+class BrokerDaemon:
+    def __init__(self, service, state_dir, port=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.service = service
+        self.state_dir = state_dir
+        self.port = port or default_port()
+        self.idle_timeout = idle_timeout
+        self.clients = 0
+        self.total_clients = 0
+        self.token = None
+
+    async def serve(self):
+        import asyncio
+        import secrets
+        self.token = secrets.token_hex(16)
+        self.idle = asyncio.Event()
+        # Binding the user's port is what makes the daemon a single instance:
+        # a second daemon started in a race fails here and exits.
+        server = await asyncio.start_server(self.handle_client, "127.0.0.1", self.port)
+        write_token(self.state_dir, self.token, self.port)
+        self.service.broker = self
+        async with server:
+            while True:
+                self.idle.clear()
+                try:
+                    await asyncio.wait_for(self.idle.wait(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if self.clients == 0:
+                        break
+
+    async def handle_client(self, reader, writer):
+        import hmac
+        from vlc_host.framing import FrameError
+        from vlc_host.session import StreamSession, read_frame
+        try:
+            payload = await read_frame(reader, max_size=4096)
+            hello = decode_payload(payload) if payload else {}
+        except (FrameError, ValueError, ConnectionError):
+            hello = {}
+        token = hello.get("token") if isinstance(hello, dict) else None
+        if not isinstance(token, str) or not hmac.compare_digest(token, self.token):
+            writer.write(encode_frame({"success": False, "error": "Bad broker token"}))
+            writer.close()
+            return
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(encode_frame({"success": True, "pid": os.getpid()}))
+
+        self.clients += 1
+        self.total_clients += 1
+        try:
+            await StreamSession(self.service, reader, writer).run()
+        finally:
+            self.clients -= 1
+            self.idle.set()
+            writer.close()
+
+    def status(self):
+        return {"pid": os.getpid(), "port": self.port, "clients": self.clients,
+                "total_clients": self.total_clients}
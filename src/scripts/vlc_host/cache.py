@@ -0,0 +1,102 @@
+"""Bounded LRU cache with per-entry TTL, hit/miss counters and JSON persistence.
+
+Expiry uses wall-clock time so entries saved by one host process stay valid
+(or expire) correctly when a later process loads them. The cache is not
+thread-safe; the host only touches it from the event loop thread.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, max_entries=1024, ttl=300.0, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > self.clock():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+            self.expirations += 1
+            self.dirty = True
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self.entries[key] = (value, self.clock() + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.dirty = True
+
+    def pop(self, key, default=None):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return default
+        self.dirty = True
+        return entry[0]
+
+    def clear(self):
+        self.entries.clear()
+        self.dirty = True
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def load(self, path):
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = self.clock()
+        # Saved oldest first, so re-inserting rebuilds the LRU order.
+        for key, value, expires_at in saved.get("entries", []):
+            if expires_at > now:
+                self.entries[key] = (value, expires_at)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.dirty = False
+
+    def save(self, path):
+        if not self.dirty:
+            return
+        now = self.clock()
+        entries = [[key, value, expires_at] for key, (value, expires_at) in self.entries.items()
+                   if expires_at > now]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"entries": entries}, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        self.dirty = False
@@ -0,0 +1,130 @@
+"""Chunked messages: one request or reply spread over many frames.
+
+Large messages keep their bulk in a list under ``items``, split into
+sequenced frames of about ``CHUNK_BYTES``. The first frame carries the rest
+of the message::
+
+    {"id": 7, "action": "enqueue", "chunk": 0, "more": true, "items": [...]}
+    {"id": 7, "chunk": 1, "more": true, "items": [...]}
+    {"id": 7, "chunk": 2, "more": false, "items": [...]}
+
+The receiver acknowledges every chunk once it has consumed it with
+``{"id": 7, "ack": <chunk>}``, and a sender never has more than ``WINDOW``
+unacknowledged chunks in flight. Neither side ever holds more than a window
+of chunks, however long the list is. Both directions work the same way;
+replies are sent chunked when their ``items`` is an ``ItemStream`` or would
+not fit in one frame.
+"""
+import asyncio
+import json
+
+CHUNK_BYTES = 256 * 1024
+WINDOW = 4
+
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def batches(items, max_bytes=CHUNK_BYTES):
+    # Lists of items whose encoded size stays under max_bytes (an item larger
+    # than that goes alone). Always yields at least one, possibly empty, list.
+    batch, size = [], 0
+    for item in items:
+        length = len(_encode_json(item).encode("utf-8")) + 1
+        if batch and size + length > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(item)
+        size += length
+    yield batch
+
+
+async def iter_batches(items):
+    # The batches of an ``items`` field: a plain list is one batch.
+    if items is None:
+        return
+    if isinstance(items, list):
+        yield items
+        return
+    async for batch in items:
+        yield batch
+
+
+class ItemStream:
+    """Marks a reply's ``items`` as an iterable to send chunked."""
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+
+class IncomingChunks:
+    def __init__(self, message_id, send, window=WINDOW):
+        self.message_id = message_id
+        self.send = send
+        self.window = window
+        self.expected = 0
+        self.queue = asyncio.Queue()
+        self.done = False
+
+    def feed(self, message):
+        if self.done or message.get("chunk") != self.expected:
+            raise ValueError(f"unexpected chunk {message.get('chunk')} for request {self.message_id}")
+        # The sender's window bounds the queue; more means a broken sender.
+        if self.queue.qsize() >= self.window:
+            raise ValueError(f"request {self.message_id} sent more than {self.window} unacknowledged chunks")
+        self.queue.put_nowait(message)
+        self.expected += 1
+        self.done = not message.get("more")
+
+    def close(self):
+        # The connection ended: wake the handler instead of leaving it waiting.
+        self.queue.put_nowait(None)
+
+    async def batches(self):
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                raise ConnectionResetError(f"connection closed inside request {self.message_id}")
+            yield message.get("items") or []
+            # Acknowledged only now that the handler has dealt with the batch.
+            await self.send({"id": self.message_id, "ack": message["chunk"]})
+            if not message.get("more"):
+                return
+
+
+class OutgoingChunks:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.acked = -1
+        self.changed = asyncio.Event()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.changed.set()
+
+    def ack(self, chunk):
+        if isinstance(chunk, int) and chunk > self.acked:
+            self.acked = chunk
+            self.changed.set()
+
+    async def send_reply(self, send, reply, items, max_bytes=CHUNK_BYTES):
+        chunk = 0
+        pending = None
+        for batch in batches(items, max_bytes):
+            if pending is not None:
+                await self._send_chunk(send, reply, chunk, pending, True)
+                chunk += 1
+            pending = batch
+        await self._send_chunk(send, reply, chunk, pending, False)
+
+    async def _send_chunk(self, send, reply, chunk, batch, more):
+        while chunk - self.acked > self.window:
+            if self.closed:
+                raise ConnectionResetError("connection closed inside a chunked reply")
+            self.changed.clear()
+            await self.changed.wait()
+        if chunk == 0:
+            frame = dict(reply, chunk=0, more=more, items=batch)
+        else:
+            frame = {"id": reply.get("id"), "chunk": chunk, "more": more, "items": batch}
+        await send(frame)
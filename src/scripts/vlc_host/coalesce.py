@@ -0,0 +1,88 @@
+"""Collapse repeated opens of the same URL into one launch.
+
+A double-click or a re-fired context-menu event sends the same URL several
+times within a fraction of a second. ``Coalescer.run`` keys requests by
+normalized URL: a request that arrives while an identical one is still being
+handled waits for that one's reply, and one that arrives within ``window``
+seconds after it completed gets the same reply again. Only the first request
+launches anything; every caller still gets a reply, marked ``coalesced``.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    # Scheme and host are case-insensitive, default ports and fragments
+    # don't change what is fetched. The path and query are left alone.
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    if parts.hostname:
+        netloc = parts.hostname
+        if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+            netloc = f"{netloc}:{parts.port}"
+        if parts.username is not None:
+            netloc = parts.netloc.rpartition("@")[0] + "@" + netloc
+    return urlunsplit((scheme, netloc, parts.path or ("/" if netloc else ""), parts.query, ""))
+
+
+class Coalescer:
+    def __init__(self, window=2.0, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.inflight = {}
+        # key -> (completed_at, reply), oldest first.
+        self.recent = OrderedDict()
+        self.launches = 0
+        self.joined = 0
+        self.repeated = 0
+
+    async def run(self, key, handler):
+        # Returns (reply, coalesced).
+        future = self.inflight.get(key)
+        if future is not None:
+            self.joined += 1
+            return dict(await asyncio.shield(future)), True
+        self._expire()
+        if key in self.recent:
+            self.repeated += 1
+            return dict(self.recent[key][1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        self.launches += 1
+        try:
+            try:
+                reply = await handler()
+            except Exception as e:
+                reply = {"success": False, "error": str(e)}
+            future.set_result(dict(reply))
+        finally:
+            del self.inflight[key]
+            if not future.done():
+                future.cancel()
+        # Failures are not remembered, so the next click retries.
+        if reply.get("success"):
+            self.recent[key] = (self.clock(), dict(reply))
+        return reply, False
+
+    def _expire(self):
+        cutoff = self.clock() - self.window
+        while self.recent:
+            key, (completed_at, _) = next(iter(self.recent.items()))
+            if completed_at > cutoff:
+                break
+            del self.recent[key]
+
+    def stats(self):
+        return {
+            "window": self.window,
+            "launches": self.launches,
+            "suppressed": self.joined + self.repeated,
+            "joined_in_flight": self.joined,
+            "repeated_in_window": self.repeated,
+        }
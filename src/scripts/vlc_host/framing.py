@@ -0,0 +1,152 @@
+"""Length-prefixed JSON frames of the Chrome native messaging protocol.
+
+Each frame is a 32-bit native-endian length followed by that many bytes of
+UTF-8 JSON. Chrome sends at most 64 MiB per message to a host and accepts at
+most 1 MB per message from it.
+"""
+import json
+import struct
+import time
+
+HEADER = struct.Struct("=I")
+MAX_INCOMING_SIZE = 64 * 1024 * 1024
+MAX_OUTGOING_SIZE = 1024 * 1024
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+# json.dumps() builds a new encoder per call when given any option.
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class FrameError(Exception):
+    # The byte stream itself is broken (truncated or oversized frame), so no
+    # further frames can be trusted. A bad payload raises ValueError instead.
+    pass
+
+
+def decode_payload(view):
+    # str() decodes straight from the buffer, without an intermediate bytes copy.
+    return json.loads(str(view, "utf-8"))
+
+
+def encode_frame(message, max_size=MAX_OUTGOING_SIZE):
+    payload = _encode_json(message).encode("utf-8")
+    if len(payload) > max_size:
+        raise FrameError(f"message of {len(payload)} bytes exceeds the {max_size} byte limit")
+    return HEADER.pack(len(payload)) + payload
+
+
+class FrameBuffer:
+    def __init__(self, max_size=MAX_INCOMING_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.max_size = max_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+
+    def _reserve(self, length):
+        if length > self.max_size:
+            raise FrameError(f"frame of {length} bytes exceeds the {self.max_size} byte limit")
+        if length > len(self._buffer):
+            size = len(self._buffer)
+            while size < length:
+                size *= 2
+            self._buffer = bytearray(min(size, self.max_size))
+            self._view = memoryview(self._buffer)
+        return self._view[:length]
+
+
+class FrameReader(FrameBuffer):
+    """Pull frames from a blocking binary stream, tolerating short reads."""
+
+    def __init__(self, stream, max_size=MAX_INCOMING_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(max_size, buffer_size)
+        self.stream = stream
+        # perf_counter_ns() when the last frame header was complete, for request tracing.
+        self.header_at = 0
+
+    def _fill(self, view):
+        filled = self.stream.readinto(view) or 0
+        while filled < len(view):
+            count = self.stream.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        return filled
+
+    def read_payload(self):
+        # The returned view is only valid until the next read.
+        header = self.stream.read(HEADER.size)
+        while 0 < len(header) < HEADER.size:
+            more = self.stream.read(HEADER.size - len(header))
+            if not more:
+                raise FrameError("stream ended inside a frame header")
+            header += more
+        if not header:
+            return None
+        self.header_at = time.perf_counter_ns()
+        length = HEADER.unpack(header)[0]
+        payload = self._reserve(length)
+        if self._fill(payload) < length:
+            raise FrameError("stream ended inside a frame payload")
+        return payload
+
+    def read_message(self):
+        payload = self.read_payload()
+        if payload is None:
+            return None
+        return decode_payload(payload)
+
+
+class FrameDecoder(FrameBuffer):
+    """Push arbitrary chunks of bytes in, get complete messages out.
+
+    A payload that is not valid UTF-8 JSON shows up in the returned list as
+    its ValueError, so the frames after it are still delivered.
+    """
+
+    def __init__(self, max_size=MAX_INCOMING_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(max_size, buffer_size)
+        self._header = bytearray(HEADER.size)
+        self._header_filled = 0
+        self._payload = None
+        self._filled = 0
+
+    def feed(self, data):
+        messages = []
+        with memoryview(data) as view:
+            while view:
+                if self._payload is None:
+                    count = min(HEADER.size - self._header_filled, len(view))
+                    self._header[self._header_filled:self._header_filled + count] = view[:count]
+                    self._header_filled += count
+                    view = view[count:]
+                    if self._header_filled < HEADER.size:
+                        break
+                    self._payload = self._reserve(HEADER.unpack(self._header)[0])
+                    self._header_filled = 0
+                    self._filled = 0
+                count = min(len(self._payload) - self._filled, len(view))
+                self._payload[self._filled:self._filled + count] = view[:count]
+                self._filled += count
+                view = view[count:]
+                if self._filled == len(self._payload):
+                    payload, self._payload = self._payload, None
+                    try:
+                        messages.append(decode_payload(payload))
+                    except ValueError as e:
+                        messages.append(e)
+        return messages
+
+    @property
+    def pending(self):
+        return self._header_filled > 0 or self._payload is not None
+
+
+class FrameWriter:
+    """Write each message as a single header-plus-payload write."""
+
+    def __init__(self, stream, max_size=MAX_OUTGOING_SIZE):
+        self.stream = stream
+        self.max_size = max_size
+
+    def write_message(self, message):
+        self.stream.write(encode_frame(message, self.max_size))
+        self.stream.flush()
@@ -0,0 +1,309 @@
+"""Playback history: what was opened, how often, and where it was left.
+
+Entries are keyed by normalized URL (``coalesce.normalize_url``) and hold an
+open count, when the URL was last opened, and the last known playback
+position and length in seconds. Lookups are dictionary lookups, so the host
+can check for a resume position on every open. The entries are kept in
+order of last open, which makes ``recent`` O(limit), and their keys in a
+sorted list, which makes ``prefix`` a bisection plus O(limit).
+
+On disk the history is a JSON-lines log in the state directory, one full
+entry per line; the last line for a key wins. Changes are appended when the
+host saves its caches, so an open costs one short write rather than
+rewriting every entry. Once the log holds more than twice as many lines as
+there are entries it is compacted: rewritten with one line per entry,
+oldest first. Past ``max_entries``, or when older than ``max_age``
+seconds, the least recently opened entries are dropped.
+
+Positions also come from VLC's own list of recently played media, which it
+saves (with the time each item was stopped at) when it exits; see
+``read_vlc_recents``. Unlike the caches, the history is updated from the
+supervisor thread as well as the event loop, so it has a lock.
+"""
+import bisect
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from vlc_host.coalesce import normalize_url
+
+DEFAULT_MAX_ENTRIES = 100000
+# Positions closer than this to the start or the end are not resumed from.
+MIN_RESUME = 10
+END_MARGIN = 15
+# Logs shorter than this are never compacted.
+MIN_COMPACT_LINES = 1024
+
+
+def normalize_prefix(prefix):
+    # Like normalize_url for a partial URL: only the scheme and host are case-insensitive.
+    scheme, sep, rest = prefix.partition("://")
+    if not sep:
+        return prefix
+    host, slash, path = rest.partition("/")
+    return f"{scheme.lower()}://{host.lower()}{slash}{path}"
+
+
+def vlc_recents_path():
+    # Where VLC's Qt interface keeps its recently played media.
+    if os.name == "nt":
+        return os.path.join(os.environ.get("APPDATA", ""), "vlc", "vlc-qt-interface.ini")
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_home, "vlc", "vlc-qt-interface.conf")
+
+
+def split_qt_list(value):
+    # QSettings writes a string list comma separated, quoting items that need it.
+    items, item, quoted, escaped = [], [], False, False
+    for ch in value:
+        if escaped:
+            item.append(ch)
+            escaped = False
+        elif ch == "\\" and quoted:
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            items.append("".join(item).strip())
+            item = []
+        else:
+            item.append(ch)
+    items.append("".join(item).strip())
+    return items
+
+
+def read_vlc_recents(path=None):
+    # {normalized URL: position in seconds} from VLC's [RecentsMRL] section,
+    # which lists the media (list=) and the millisecond time each was stopped at (times=).
+    try:
+        with open(path or vlc_recents_path(), "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    section, values = None, {}
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            section = line
+        elif section == "[RecentsMRL]" and "=" in line:
+            name, _, value = line.partition("=")
+            values[name.strip()] = split_qt_list(value)
+    positions = {}
+    for url, millis in zip(values.get("list", []), values.get("times", [])):
+        try:
+            positions[normalize_url(url)] = int(millis) // 1000
+        except ValueError:
+            continue
+    return positions
+
+
+class History:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=0.0, clock=time.time):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.clock = clock
+        # key -> [count, last_opened, position, length], least recently opened first.
+        self.entries = OrderedDict()
+        # The same keys, sorted, for prefix queries.
+        self.keys = []
+        self.lock = threading.Lock()
+        self.path = None
+        # Keys changed since the last save; their current entries get appended.
+        self.changed = set()
+        self.log_lines = 0
+        self.lookups = 0
+        self.hits = 0
+        self.resumes = 0
+        self.positions = 0
+        self.evictions = 0
+        self.compactions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, url):
+        key = normalize_url(url)
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.hits += 1
+            return self._item(key, entry)
+
+    def resume_position(self, url):
+        # Seconds to start url at, or None to start from the beginning.
+        item = self.get(url)
+        if item is None:
+            return None
+        position, length = item["position"], item["length"]
+        if position < MIN_RESUME or (length and position > length - END_MARGIN):
+            return None
+        with self.lock:
+            self.resumes += 1
+        return position
+
+    def record_open(self, url):
+        key = normalize_url(url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [0, 0.0, 0, 0]
+                bisect.insort(self.keys, key)
+            else:
+                self.entries.move_to_end(key)
+            entry[0] += 1
+            entry[1] = round(self.clock(), 1)
+            self.changed.add(key)
+            self._expire()
+
+    def record_position(self, url, position, length=0):
+        # A position within END_MARGIN of the end means the media was played
+        # to the end, so it is stored as 0: the next open starts over.
+        key = normalize_url(url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+            length = max(0, int(length or 0)) or entry[3]
+            position = max(0, int(position))
+            if length and position > length - END_MARGIN:
+                position = 0
+            if (entry[2], entry[3]) == (position, length):
+                return False
+            entry[2], entry[3] = position, length
+            self.positions += 1
+            self.changed.add(key)
+            return True
+
+    def recent(self, limit=50):
+        with self.lock:
+            items = []
+            for key in reversed(self.entries):
+                if len(items) >= limit:
+                    break
+                items.append(self._item(key, self.entries[key]))
+            return items
+
+    def prefix(self, prefix, limit=50):
+        # Entries whose normalized URL starts with prefix, in URL order.
+        prefix = normalize_prefix(prefix)
+        with self.lock:
+            index = bisect.bisect_left(self.keys, prefix)
+            items = []
+            for key in self.keys[index:index + limit]:
+                if not key.startswith(prefix):
+                    break
+                items.append(self._item(key, self.entries[key]))
+            return items
+
+    def _item(self, key, entry):
+        count, last_opened, position, length = entry
+        return {"url": key, "count": count, "last_opened": last_opened,
+                "position": position, "length": length}
+
+    def _expire(self):
+        # Drops the least recently opened entries past max_entries or max_age.
+        oldest = self.clock() - self.max_age if self.max_age else None
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_entries and (oldest is None or entry[1] >= oldest):
+                break
+            del self.entries[key]
+            del self.keys[bisect.bisect_left(self.keys, key)]
+            self.changed.discard(key)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "resumes": self.resumes,
+                "positions": self.positions,
+                "evictions": self.evictions,
+                "log_lines": self.log_lines,
+                "compactions": self.compactions,
+            }
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return
+        # Every entry is a new list: the cyclic GC would otherwise run over
+        # and over while they are built, for nothing.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self._load(text.splitlines())
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _load(self, lines):
+        try:
+            records = json.loads("[" + ",".join(lines) + "]")
+        except ValueError:
+            # A line torn by a crash mid-write: keep every other one.
+            records = []
+            for line in lines:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+        with self.lock:
+            entries = self.entries
+            for record in records:
+                if not isinstance(record, list) or len(record) != 5:
+                    continue
+                key = record[0]
+                entry = entries.get(key)
+                if entry is not None and entry[1] != record[2]:
+                    # Opened again since its earlier line.
+                    entries.move_to_end(key)
+                entries[key] = record[1:]
+            self.log_lines = len(lines)
+            self.keys = sorted(entries)
+            self._expire()
+            self.changed.clear()
+
+    def save(self, path=None):
+        # Appends the changed entries, in the order they were opened, or
+        # compacts the log once it would hold twice as many lines as entries.
+        path = path or self.path
+        with self.lock:
+            limit = max(MIN_COMPACT_LINES, 2 * len(self.entries))
+            if not path or (not self.changed and self.log_lines <= limit):
+                return
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if self.log_lines + len(self.changed) > limit:
+                self._compact(path)
+            else:
+                if len(self.changed) * 8 > len(self.entries):
+                    keys = [key for key in self.entries if key in self.changed]
+                else:
+                    keys = sorted(self.changed, key=lambda key: self.entries[key][1])
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(self._line(key) for key in keys))
+                self.log_lines += len(keys)
+            self.changed.clear()
+
+    def _line(self, key):
+        count, last_opened, position, length = self.entries[key]
+        return f"[{json.dumps(key)},{count},{last_opened},{position},{length}]\n"
+
+    def _compact(self, path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("".join(self._line(key) for key in self.entries))
+        os.replace(temp_path, path)
+        self.log_lines = len(self.entries)
+        self.compactions += 1
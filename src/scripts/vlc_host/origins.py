@@ -0,0 +1,121 @@
+"""Per-origin network history used to size VLC's network cache.
+
+Each origin keeps a sample count, exponentially weighted averages of connect
+time and RTT (time to the response headers), a failure count and when it was
+last seen. Entries are updated in place as samples arrive, the least recently
+seen origin is dropped past ``max_origins``, and the store is persisted as one
+compact JSON file like the caches. Not thread-safe; the host only touches it
+from the event loop thread.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Weight of a new sample in the moving averages.
+ALPHA = 0.3
+MIN_CACHING_MS = 300
+MAX_CACHING_MS = 5000
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+class OriginStats:
+    def __init__(self, max_origins=256, clock=time.time):
+        self.max_origins = max_origins
+        self.clock = clock
+        # origin -> [samples, connect_ms, rtt_ms, failures, last_seen]
+        self.entries = OrderedDict()
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _entry(self, origin):
+        entry = self.entries.get(origin)
+        if entry is None:
+            entry = self.entries[origin] = [0, 0.0, 0.0, 0, 0.0]
+            while len(self.entries) > self.max_origins:
+                self.entries.popitem(last=False)
+        self.entries.move_to_end(origin)
+        entry[4] = round(self.clock(), 1)
+        self.dirty = True
+        return entry
+
+    def record(self, origin, connect_ms, rtt_ms):
+        entry = self._entry(origin)
+        if entry[0] == 0:
+            entry[1], entry[2] = connect_ms, rtt_ms
+        else:
+            entry[1] += ALPHA * (connect_ms - entry[1])
+            entry[2] += ALPHA * (rtt_ms - entry[2])
+        entry[1], entry[2] = round(entry[1], 2), round(entry[2], 2)
+        entry[0] += 1
+
+    def record_failure(self, origin):
+        self._entry(origin)[3] += 1
+
+    def get(self, origin):
+        entry = self.entries.get(origin)
+        if entry is None:
+            return None
+        samples, connect_ms, rtt_ms, failures, last_seen = entry
+        return {"samples": samples, "connect_ms": connect_ms, "rtt_ms": rtt_ms,
+                "failures": failures, "last_seen": last_seen}
+
+    def network_caching(self, origin, low=MIN_CACHING_MS, high=MAX_CACHING_MS):
+        # None until the origin has been measured. Otherwise a few round trips
+        # of headroom plus one connect, scaled up for origins that fail often,
+        # rounded to 100 ms and clamped to [low, high].
+        entry = self.entries.get(origin)
+        if entry is None or entry[0] == 0:
+            return None
+        samples, connect_ms, rtt_ms, failures = entry[:4]
+        value = low + 4 * rtt_ms + connect_ms
+        value *= 1 + failures / (samples + failures)
+        return int(min(high, max(low, round(value, -2))))
+
+    def reset(self, origin=None):
+        if origin is None:
+            self.entries.clear()
+        elif self.entries.pop(origin, None) is None:
+            return False
+        self.dirty = True
+        return True
+
+    def stats(self):
+        return {"origins": len(self.entries), "max_origins": self.max_origins}
+
+    def dump(self):
+        return {origin: self.get(origin) for origin in self.entries}
+
+    def load(self, path):
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Saved least recently seen first, like the caches.
+        for origin, entry in saved.get("origins", []):
+            self.entries[origin] = entry
+        while len(self.entries) > self.max_origins:
+            self.entries.popitem(last=False)
+        self.dirty = False
+
+    def save(self, path):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"origins": [[origin, entry] for origin, entry in self.entries.items()]},
+                      f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        self.dirty = False
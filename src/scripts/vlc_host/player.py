@@ -0,0 +1,302 @@
+"""Ways of handing a URL to VLC.
+
+``SpawnPlayer`` starts a new VLC process per URL. ``ControlledPlayer`` starts
+one VLC with the RC (remote control) interface on a loopback port and sends
+later URLs to it over that socket, spawning a plain player only when the
+control channel cannot be reached. Both register the processes they start
+with a ``Supervisor`` when given one.
+
+``subprocess`` and ``socket`` are imported on first use: together they are
+most of the host's import time, and messages that never reach a player
+(errors, later status queries) should not pay for them.
+"""
+import os
+import threading
+import time
+
+RC_PROMPT = b"> "
+MAX_COMMAND_LINE = 8000
+
+
+def validate_url(url):
+    # The RC interface is line based, so a newline would inject commands.
+    if any(ord(ch) < 32 for ch in url):
+        raise ValueError("URL contains control characters")
+    return url
+
+
+def validate_options(options):
+    # Item options go after the MRL, e.g. ":network-caching=1000".
+    for option in options:
+        if not option.startswith(":") or " " in option or any(ord(ch) < 32 for ch in option):
+            raise ValueError(f"Invalid VLC option: {option!r}")
+    return list(options)
+
+
+def spawn(args, url, supervisor=None, role="player"):
+    import subprocess
+    if supervisor is not None and role == "player":
+        supervisor.make_room()
+    process = subprocess.Popen(args)
+    if supervisor is not None:
+        supervisor.track(process, url, role)
+    return process
+
+
+class SpawnPlayer:
+    mode = "spawn"
+
+    def __init__(self, vlc_path, supervisor=None):
+        self.vlc_path = vlc_path
+        self.supervisor = supervisor
+        # url -> the process last spawned for it; finished ones are pruned on open.
+        self.processes = {}
+        self.lock = threading.Lock()
+
+    def open(self, url, options=()):
+        args = [self.vlc_path, validate_url(url)] + validate_options(options)
+        process = spawn(args, url, self.supervisor)
+        with self.lock:
+            for known, running in list(self.processes.items()):
+                if running.poll() is not None:
+                    del self.processes[known]
+            self.processes[url] = process
+        return {"player": "spawned", "pid": process.pid}
+
+    def enqueue(self, urls):
+        # Hand the URLs to the running VLC instance's playlist (or start one),
+        # keeping each command line well under Windows' 32K character limit.
+        urls = [validate_url(url) for url in urls]
+        batch, length = [], 0
+        for url in urls + [None]:
+            if batch and (url is None or length + len(url) > MAX_COMMAND_LINE):
+                spawn([self.vlc_path, "--one-instance", "--playlist-enqueue"] + batch, batch[0],
+                      self.supervisor, role="helper")
+                batch, length = [], 0
+            if url is not None:
+                batch.append(url)
+                length += len(url) + 3
+        return {"player": "spawned"}
+
+    def reuse(self, url):
+        # A separate VLC per URL can't be driven, so "reuse" means leaving a
+        # still-running one alone rather than opening a second window.
+        with self.lock:
+            process = self.processes.get(url)
+            if process is None or process.poll() is not None:
+                return None
+            return {"player": "running", "pid": process.pid}
+
+    def position(self):
+        # Separate players have no control channel to ask.
+        return None
+
+    def close(self):
+        pass
+
+
+class RCClient:
+    def __init__(self, host, port, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b""
+
+    def connect(self):
+        import socket
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = b""
+        self._read_until_prompt()
+
+    def command(self, line):
+        return self.commands([line])[0]
+
+    def commands(self, lines):
+        # Pipelined: every line in one write, then one prompt-terminated reply per line.
+        if self.sock is None:
+            self.connect()
+        try:
+            self.sock.sendall("".join(line + "\n" for line in lines).encode("utf-8"))
+            return [self._read_until_prompt() for _ in lines]
+        except OSError:
+            self.close()
+            raise
+
+    def _read_until_prompt(self):
+        while True:
+            # The prompt starts a line; anything before it is the reply.
+            if self.buffer.startswith(RC_PROMPT):
+                index = 0
+            else:
+                index = self.buffer.find(b"\n" + RC_PROMPT)
+                index = index + 1 if index >= 0 else -1
+            if index >= 0:
+                data, self.buffer = self.buffer[:index], self.buffer[index + len(RC_PROMPT):]
+                return data.decode("utf-8", "replace")
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionResetError("VLC closed the control connection")
+            self.buffer += chunk
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+                self.buffer = b""
+
+
+class ControlledPlayer:
+    mode = "rc"
+
+    def __init__(self, vlc_path, port=4222, command="add", startup_timeout=5.0, host="127.0.0.1",
+                 supervisor=None):
+        self.vlc_path = vlc_path
+        self.supervisor = supervisor
+        self.host = host
+        self.port = port
+        self.command = command
+        self.startup_timeout = startup_timeout
+        self.client = RCClient(host, port)
+        self.process = None
+        self.started_at = 0.0
+        # The URL most recently handed to VLC with "add" (which plays it at once).
+        self.current_url = None
+        # The host opens URLs from a thread pool; one RC conversation at a time.
+        self.lock = threading.Lock()
+
+    def launch_args(self, url, options=()):
+        args = [self.vlc_path, "--extraintf=rc", f"--rc-host={self.host}:{self.port}"]
+        if os.name == "nt":
+            args.append("--rc-quiet")
+        return args + [url] + list(options)
+
+    def open(self, url, options=()):
+        validate_url(url)
+        options = validate_options(options)
+        with self.lock:
+            result = self._open(url, options)
+            if result["player"] != "spawned" and self.command == "add":
+                self.current_url = url
+            return result
+
+    def reuse(self, url):
+        # If our VLC is still on this URL, resume it instead of adding a duplicate entry.
+        with self.lock:
+            if url != self.current_url:
+                return None
+            try:
+                if self._send("is_playing")[0].strip() != "1":
+                    self._send("play")
+                    return {"player": "resumed"}
+            except OSError:
+                self.current_url = None
+                return None
+            return {"player": "reused"}
+
+    def position(self):
+        # (url, seconds, length) of what our VLC is playing, or None. "status"
+        # names the current input, which has moved on if the playlist advanced.
+        with self.lock:
+            url = self.current_url
+            if url is None:
+                return None
+            try:
+                status, seconds, length = self._send("status", "get_time", "get_length")
+            except OSError:
+                return None
+            if "new input:" in status and f"new input: {url} " not in status:
+                return None
+            try:
+                return url, int(seconds.strip()), int(length.strip() or 0)
+            except ValueError:
+                return None
+
+    def enqueue(self, urls):
+        lines = [f"enqueue {validate_url(url)}" for url in urls]
+        with self.lock:
+            try:
+                self._send_when_ready(*lines)
+            except OSError:
+                if self.process is not None and self.process.poll() is None:
+                    raise
+                # Nothing to enqueue into yet: the first URL starts (and plays in) VLC.
+                self._start(urls[0], [])
+                if len(lines) > 1:
+                    self._send_when_ready(*lines[1:])
+        return {"player": "controlled"}
+
+    def _open(self, url, options):
+        line = " ".join([self.command, url] + options)
+        try:
+            self._send(line)
+            return {"player": "controlled"}
+        except OSError:
+            pass
+
+        if not self._starting():
+            if self.process is None or self.process.poll() is not None:
+                self._start(url, options)
+                return {"player": "started"}
+        else:
+            try:
+                self._send_when_ready(line)
+                return {"player": "controlled"}
+            except OSError:
+                pass
+
+        # Our VLC is alive but the control channel is dead: don't lose the click.
+        process = spawn([self.vlc_path, url] + options, url, self.supervisor)
+        return {"player": "spawned", "pid": process.pid}
+
+    def _start(self, url, options):
+        self.process = spawn(self.launch_args(url, options), url, self.supervisor)
+        self.started_at = time.monotonic()
+
+    def _send_when_ready(self, *lines):
+        # Like _send, but waits out a VLC that has not opened its RC port yet.
+        try:
+            return self._send(*lines)
+        except OSError:
+            if not self._starting():
+                raise
+        deadline = self.started_at + self.startup_timeout
+        while True:
+            time.sleep(0.05)
+            try:
+                return self._send(*lines)
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+
+    def _starting(self):
+        return (self.process is not None and self.process.poll() is None
+                and time.monotonic() - self.started_at < self.startup_timeout)
+
+    def _send(self, *lines):
+        # Replies to each line, in order.
+        try:
+            return self.client.commands(lines)
+        except OSError:
+            # A stale connection (e.g. VLC restarted) gets one fresh retry.
+            self.client.close()
+            return self.client.commands(lines)
+
+    def close(self):
+        self.client.close()
+
+
+def create_player(config, supervisor=None):
+    vlc_path = config.get("vlc_path", "vlc")
+    if config.get("player_mode", "spawn") == "rc":
+        return ControlledPlayer(
+            vlc_path,
+            port=int(config.get("rc_port", 4222)),
+            command=config.get("rc_command", "add"),
+            startup_timeout=float(config.get("rc_startup_timeout", 5.0)),
+            supervisor=supervisor,
+        )
+    return SpawnPlayer(vlc_path, supervisor)
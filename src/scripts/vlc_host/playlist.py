@@ -0,0 +1,197 @@
+"""Stream M3U, PLS and XSPF playlists into the player entry by entry.
+
+Every stage is a generator: the body is fetched in chunks, split into lines
+(or fed to an incremental XML parser), entries are resolved against the
+playlist's final URL, filtered and deduplicated, then grouped into batches.
+Nothing holds more than a chunk, a batch and the dedupe window, so memory
+stays flat however long the playlist is, and the first entry can be played
+while the rest is still downloading. HLS playlists (``#EXT-X-`` tags) are
+media, not lists of entries: an ``.m3u`` that turns out to be one raises
+``PlaylistError`` before any entry, so the caller hands its URL to VLC.
+"""
+import http.client
+from collections import OrderedDict
+from urllib.parse import quote, urljoin, urlsplit
+
+PLAYLIST_KINDS = ("m3u", "pls", "xspf")
+READ_SIZE = 64 * 1024
+MAX_LINE = 64 * 1024
+MAX_REDIRECTS = 5
+DEDUPE_WINDOW = 10000
+DEFAULT_SCHEMES = ("http", "https", "rtsp", "rtmp", "mms")
+USER_AGENT = "VLC/3.0 LibVLC/3.0"
+# Characters left alone when entries are percent-encoded: URL syntax and existing escapes.
+URL_SAFE = ":/?#[]@!$&'()*+,;=%~"
+
+
+class PlaylistError(Exception):
+    pass
+
+
+class Fetch:
+    """The body of a URL as an iterator of byte chunks; ``url`` is the final URL after redirects."""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __iter__(self):
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(self.url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise PlaylistError(f"cannot fetch {self.url}")
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+            try:
+                target = f"{parts.path or '/'}?{parts.query}" if parts.query else (parts.path or "/")
+                conn.request("GET", target, headers={"User-Agent": USER_AGENT, "Accept": "*/*"})
+                response = conn.getresponse()
+                location = response.getheader("Location")
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    self.url = urljoin(self.url, location)
+                    continue
+                if response.status >= 400:
+                    raise PlaylistError(f"HTTP {response.status} for {self.url}")
+                while True:
+                    chunk = response.read1(READ_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+            except (OSError, http.client.HTTPException) as e:
+                raise PlaylistError(f"could not fetch {self.url}: {e}")
+            finally:
+                conn.close()
+        raise PlaylistError(f"more than {MAX_REDIRECTS} redirects")
+
+
+def iter_lines(chunks):
+    # Decoded, stripped lines; over-long lines are dropped rather than buffered.
+    pending = b""
+    first = True
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > MAX_LINE:
+            pending = b""
+        for line in lines:
+            if first:
+                line = line.lstrip(b"\xef\xbb\xbf")
+                first = False
+            if len(line) <= MAX_LINE:
+                yield _decode(line)
+    if pending:
+        yield _decode(pending)
+
+
+def _decode(line):
+    try:
+        return line.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        # Plain .m3u files are often Latin-1.
+        return line.decode("latin-1").strip()
+
+
+def parse_m3u(lines):
+    entry_seen = False
+    for line in lines:
+        if line.startswith("#EXT-X-") and not entry_seen:
+            # HLS puts its tags ahead of the first segment or variant.
+            raise PlaylistError("an HLS playlist, not a list of entries")
+        if line and not line.startswith("#"):
+            entry_seen = True
+            yield line
+
+
+def parse_pls(lines):
+    # Entries in file order; PLS numbering is not trusted to be sorted.
+    for line in lines:
+        key, sep, value = line.partition("=")
+        if sep and key.strip().lower().startswith("file") and value.strip():
+            yield value.strip()
+
+
+def parse_xspf(chunks):
+    from xml.etree.ElementTree import ParseError, XMLPullParser
+    parser = XMLPullParser(events=("start", "end"))
+    stack = []
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                tag = element.tag.rpartition("}")[2]
+                if event == "start":
+                    stack.append(element)
+                    continue
+                stack.pop()
+                if tag == "location" and element.text and element.text.strip():
+                    yield element.text.strip()
+                elif tag == "track" and stack:
+                    # Done with this track: drop it so the tree never grows.
+                    stack[-1].remove(element)
+        parser.close()
+    except ParseError as e:
+        raise PlaylistError(f"invalid XSPF: {e}")
+
+
+def entries(fetch, kind):
+    if kind == "xspf":
+        return parse_xspf(fetch)
+    if kind == "pls":
+        return parse_pls(iter_lines(fetch))
+    return parse_m3u(iter_lines(fetch))
+
+
+class Expansion:
+    """Counters for one playlist, filled in as its entries stream through."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.entries = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.truncated = False
+
+    def summary(self):
+        return {"kind": self.kind, "entries": self.entries, "duplicates": self.duplicates,
+                "skipped": self.skipped, "truncated": self.truncated}
+
+
+def expand(url, kind, timeout=10.0, schemes=DEFAULT_SCHEMES, max_entries=None,
+           dedupe_window=DEDUPE_WINDOW, expansion=None):
+    # Absolute, allowed, not recently seen entry URLs of the playlist at url.
+    if expansion is None:
+        expansion = Expansion(kind)
+    fetch = Fetch(url, timeout)
+    seen = OrderedDict()
+    for entry in entries(fetch, kind):
+        # Relative entries are relative to where the playlist actually came from.
+        # VLC's RC interface splits on spaces, so they are escaped like any other
+        # character a URL cannot hold.
+        entry = quote(urljoin(fetch.url, entry), safe=URL_SAFE)
+        if urlsplit(entry).scheme.lower() not in schemes or any(ord(ch) < 32 for ch in entry):
+            expansion.skipped += 1
+            continue
+        if entry in seen:
+            expansion.duplicates += 1
+            continue
+        seen[entry] = None
+        if len(seen) > dedupe_window:
+            seen.popitem(last=False)
+        if max_entries is not None and expansion.entries >= max_entries:
+            expansion.truncated = True
+            return
+        expansion.entries += 1
+        yield entry
+
+
+def batched(items, size, first=1):
+    # Lists of up to size items; the first holds only ``first`` so playback
+    # can begin before the next batch has been read.
+    batch, limit = [], first
+    for item in items:
+        batch.append(item)
+        if len(batch) >= limit:
+            yield batch
+            batch, limit = [], size
+    if batch:
+        yield batch
@@ -0,0 +1,161 @@
+"""Sniff a stream's type and pick VLC options that skip demuxer probing.
+
+``probe`` fetches the first few KB with a ranged GET (following redirects)
+and ``classify`` looks at the Content-Type, the leading bytes and the URL
+extension. ``options_for`` maps the result to VLC item options, which are
+passed after the MRL (``vlc URL :demux=mp4``) or with the RC ``add`` command.
+"""
+import http.client
+import os
+import time
+from urllib.parse import urljoin, urlsplit
+
+PROBE_SIZE = 4096
+MAX_REDIRECTS = 5
+
+# Item options per stream kind. The demux hint saves VLC from trying every
+# demuxer; adaptive streams buffer per segment, progressive files need little
+# network cache, and live transport streams want more.
+KIND_OPTIONS = {
+    "hls": [":demux=adaptive", ":adaptive-logic=predictive", ":network-caching=1500"],
+    "dash": [":demux=adaptive", ":adaptive-logic=predictive", ":network-caching=1500"],
+    "mp4": [":demux=mp4", ":network-caching=1000"],
+    "ts": [":demux=ts", ":network-caching=2000"],
+    "mkv": [":demux=mkv", ":network-caching=1000"],
+    "mp3": [":demux=es", ":network-caching=500"],
+    "aac": [":demux=es", ":network-caching=500"],
+    "ogg": [":demux=ogg", ":network-caching=500"],
+    "flac": [":demux=flac", ":network-caching=500"],
+}
+
+CONTENT_TYPES = {
+    "application/vnd.apple.mpegurl": "hls",
+    "application/x-mpegurl": "hls",
+    "audio/mpegurl": "hls",
+    "audio/x-mpegurl": "hls",
+    "application/dash+xml": "dash",
+    "video/mp4": "mp4",
+    "audio/mp4": "mp4",
+    "video/quicktime": "mp4",
+    "video/mp2t": "ts",
+    "video/x-matroska": "mkv",
+    "video/webm": "mkv",
+    "audio/webm": "mkv",
+    "audio/mpeg": "mp3",
+    "audio/aac": "aac",
+    "audio/ogg": "ogg",
+    "video/ogg": "ogg",
+    "audio/flac": "flac",
+    "audio/x-scpls": "pls",
+    "application/xspf+xml": "xspf",
+}
+
+EXTENSIONS = {
+    ".m3u8": "hls", ".mpd": "dash", ".mp4": "mp4", ".m4v": "mp4", ".m4a": "mp4",
+    ".mov": "mp4", ".ts": "ts", ".mkv": "mkv", ".webm": "mkv", ".mp3": "mp3",
+    ".aac": "aac", ".ogg": "ogg", ".oga": "ogg", ".opus": "ogg", ".flac": "flac",
+    ".m3u": "m3u", ".pls": "pls", ".xspf": "xspf",
+}
+
+
+class ProbeError(Exception):
+    pass
+
+
+def sniff(data):
+    # Kind from the leading bytes alone, or None.
+    text = data[:1024].lstrip(b"\xef\xbb\xbf \t\r\n")
+    if text.startswith(b"#EXTM3U"):
+        # HLS playlists use #EXT-X- tags; a plain M3U is a list of entries.
+        return "hls" if b"#EXT-X-" in data else "m3u"
+    if text[:10].lower() == b"[playlist]":
+        return "pls"
+    if text.startswith(b"<?xml") or text.startswith(b"<"):
+        if b"<MPD" in data:
+            return "dash"
+        if b"<playlist" in data and b"xspf" in data:
+            return "xspf"
+        return None
+    if data[4:8] in (b"ftyp", b"styp", b"moov", b"moof"):
+        return "mp4"
+    if len(data) > 376 and data[0] == 0x47 and data[188] == 0x47 and data[376] == 0x47:
+        return "ts"
+    if data.startswith(b"\x1a\x45\xdf\xa3"):
+        return "mkv"
+    if data.startswith(b"OggS"):
+        return "ogg"
+    if data.startswith(b"fLaC"):
+        return "flac"
+    if data.startswith(b"ID3") or (len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0):
+        # ADTS AAC shares the 0xFFF sync word but has layer bits 00.
+        return "aac" if len(data) > 1 and data[1] & 0xF6 == 0xF0 else "mp3"
+    return None
+
+
+def classify(url, content_type=None, data=b""):
+    kind = sniff(data) if data else None
+    if kind is None and content_type:
+        kind = CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    if kind is None:
+        kind = EXTENSIONS.get(os.path.splitext(urlsplit(url).path)[1].lower())
+    return kind or "unknown"
+
+
+def options_for(kind, overrides=None):
+    if overrides and kind in overrides:
+        return list(overrides[kind])
+    return list(KIND_OPTIONS.get(kind, []))
+
+
+class ProbeResult:
+    def __init__(self, kind, content_type, final_url, timings=()):
+        self.kind = kind
+        self.content_type = content_type
+        self.final_url = final_url
+        # (url, connect_ms, rtt_ms) for each request made.
+        self.timings = list(timings)
+
+
+def probe(url, timeout=5.0, size=PROBE_SIZE, user_agent="VLC/3.0 LibVLC/3.0"):
+    current = url
+    timings = []
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(current)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                return ProbeResult(classify(current), None, current, timings)
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.hostname, parts.port, timeout=timeout)
+            try:
+                target = f"{parts.path or '/'}?{parts.query}" if parts.query else (parts.path or "/")
+                started = time.perf_counter()
+                conn.connect()
+                connected = time.perf_counter()
+                conn.request("GET", target, headers={
+                    "User-Agent": user_agent, "Range": f"bytes=0-{size - 1}", "Accept": "*/*"})
+                response = conn.getresponse()
+                timings.append((current, (connected - started) * 1000,
+                                (time.perf_counter() - connected) * 1000))
+                location = response.getheader("Location")
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    current = urljoin(current, location)
+                    continue
+                if response.status >= 400:
+                    raise ProbeError(f"HTTP {response.status}")
+                # A server that ignores Range still only gets read this far.
+                content_type = response.getheader("Content-Type")
+                data = response.read(size)
+                return ProbeResult(classify(current, content_type, data), content_type, current, timings)
+            finally:
+                conn.close()
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise ProbeError(f"could not probe {url}: {e}")
+    raise ProbeError(f"more than {MAX_REDIRECTS} redirects")
+
+
+def cache_key(url, scope="url"):
+    # With scope "origin", one result covers every URL with the same origin and extension.
+    if scope != "origin":
+        return url
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}|{os.path.splitext(parts.path)[1].lower()}"
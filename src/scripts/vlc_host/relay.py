@@ -0,0 +1,394 @@
+"""Loopback HTTP relay that serves streams to VLC with the browser's headers.
+
+``Relay.register`` takes an origin URL and the request headers the extension
+captured (cookies, referrer, user agent) and returns a URL on
+``127.0.0.1`` whose path holds an unguessable stream id; only that id gives
+access. Every request VLC makes there, including each seek's range request,
+is forwarded to the origin over a per-origin pool of keep-alive connections,
+so a seek does not pay for a new TCP and TLS handshake. When a connection has
+to be dropped (VLC hung up part way through a body) a replacement is opened
+in the background. Bodies are copied through one reused buffer per request
+with ``readinto``; per-stream byte counts and throughput are kept for the
+``stats`` action. HLS and DASH streams registered with a prefetcher are
+served from ``vlc_host.segments`` instead.
+"""
+import http.client
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit
+
+# Headers the extension may supply for the origin request.
+FORWARDED_HEADERS = ("Cookie", "Referer", "User-Agent", "Authorization", "Origin", "Accept-Language")
+# Of those, the ones only sent to the origin they were captured for, as
+# browsers do: a redirect or reference to another origin goes without them.
+CREDENTIAL_HEADERS = ("Cookie", "Authorization")
+# Headers VLC may supply, passed through as they are.
+# (Not Accept-Encoding: VLC has to get the body exactly as the origin stores it.)
+CLIENT_HEADERS = ("Range", "If-Range", "Accept")
+RESPONSE_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "Last-Modified",
+                    "ETag", "Cache-Control", "Expires", "Content-Disposition")
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+BUFFER_SIZE = 256 * 1024
+# Unread body left when VLC hangs up: drain up to this much to keep the connection.
+MAX_DRAIN = 128 * 1024
+MAX_IDLE_PER_ORIGIN = 4
+MAX_STREAMS = 256
+
+
+def origin_key(url):
+    parts = urlsplit(url)
+    return parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+
+
+def may_follow(url, target):
+    # Redirects and references stay on http(s), and never go from https down to http.
+    scheme = urlsplit(target).scheme
+    return scheme in ("http", "https") and not (scheme == "http" and urlsplit(url).scheme == "https")
+
+
+def headers_for(url, origin, headers):
+    # headers without the credentials unless url is on origin (an origin_key).
+    if origin_key(url) == origin:
+        return headers
+    return {name: value for name, value in headers.items() if name not in CREDENTIAL_HEADERS}
+
+
+def clean_headers(headers):
+    # Only known header names, and no line breaks that could split the request.
+    cleaned = {}
+    for name in FORWARDED_HEADERS:
+        for key, value in (headers or {}).items():
+            if key.lower() == name.lower() and isinstance(value, str) and value \
+                    and "\r" not in value and "\n" not in value:
+                cleaned[name] = value
+    return cleaned
+
+
+class ConnectionPool:
+    """Idle keep-alive origin connections, per (scheme, host, port). Thread-safe."""
+
+    def __init__(self, timeout=10.0, max_idle=MAX_IDLE_PER_ORIGIN):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.closed = False
+        # Called with (url, connect_ms, rtt_ms) for each request on a new connection.
+        self.on_timing = None
+
+    def key(self, url):
+        return origin_key(url)
+
+    def get(self, key):
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.opened += 1
+        return self._connect(key, connect=False), False
+
+    def _connect(self, key, connect=True):
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = cls(host, port, timeout=self.timeout)
+        if connect:
+            conn.connect()
+        return conn
+
+    def put(self, key, conn):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if not self.closed and len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def replace(self, key, conn):
+        # Drop a connection that can't be reused and warm up a spare in its place.
+        conn.close()
+        threading.Thread(target=self._prewarm, args=(key,), daemon=True).start()
+
+    def _prewarm(self, key):
+        try:
+            conn = self._connect(key)
+        except OSError:
+            return
+        with self.lock:
+            self.opened += 1
+        self.put(key, conn)
+
+    def request(self, url, method, headers):
+        # (key, conn, response) for one request on a pooled connection.
+        key = self.key(url)
+        parts = urlsplit(url)
+        target = f"{parts.path or '/'}?{parts.query}" if parts.query else (parts.path or "/")
+        for attempt in (1, 2):
+            conn, reused = self.get(key)
+            try:
+                connected = None
+                if conn.sock is None:
+                    started = time.perf_counter()
+                    conn.connect()
+                    connected = time.perf_counter()
+                conn.request(method, target, headers=headers)
+                response = conn.getresponse()
+                if connected is not None and self.on_timing is not None:
+                    self.on_timing(url, (connected - started) * 1000, (time.perf_counter() - connected) * 1000)
+                return key, conn, response
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # An idle connection the origin had already closed: retry on a fresh one.
+                conn.close()
+                if attempt == 2 or not reused:
+                    raise
+
+    def finish(self, key, conn, response):
+        # Back into the pool if the response is complete (or nearly so), otherwise replaced.
+        try:
+            if not response.isclosed() and response.length is not None and response.length <= MAX_DRAIN:
+                response.read()
+        except (OSError, http.client.HTTPException):
+            pass
+        if response.isclosed() and not response.will_close:
+            self.put(key, conn)
+        else:
+            self.replace(key, conn)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class Stream:
+    def __init__(self, stream_id, url, headers):
+        self.stream_id = stream_id
+        self.url = url
+        self.name = urlsplit(url).path.rpartition("/")[2]
+        self.headers = headers
+        # The credentials go only here, wherever redirects later pin self.url.
+        self.origin = origin_key(url)
+        # A SegmentSession when the stream's segments are prefetched.
+        self.segments = None
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.last_rate = 0.0
+        self.last_used = time.monotonic()
+
+    def record(self, sent, seconds):
+        with self.lock:
+            self.bytes += sent
+            self.busy_seconds += seconds
+            if seconds > 0:
+                self.last_rate = sent / seconds
+            self.last_used = time.monotonic()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "url": self.url,
+                "requests": self.requests,
+                "active": self.active,
+                "bytes": self.bytes,
+                "mb_per_s": round(self.bytes / self.busy_seconds / 1e6, 2) if self.busy_seconds else 0.0,
+                "last_mb_per_s": round(self.last_rate / 1e6, 2),
+            }
+
+
+class RelayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.relay(head=False)
+
+    def do_HEAD(self):
+        self.relay(head=True)
+
+    def relay(self, head):
+        stream, url = self.server.relay.lookup(self.path)
+        if url is None:
+            self.send_error(404)
+            return
+        with stream.lock:
+            stream.requests += 1
+            stream.active += 1
+        try:
+            if stream.segments is not None and not head and not self.headers.get("Range"):
+                self.serve_segment(stream, url)
+            else:
+                self.forward(stream, url, head)
+        finally:
+            with stream.lock:
+                stream.active -= 1
+
+    def serve_segment(self, stream, url):
+        # Manifests rewritten to point back here, segments from the prefetch cache.
+        from vlc_host.segments import SegmentError
+        started = time.perf_counter()
+        try:
+            content_type, body = stream.segments.get(url)
+        except SegmentError as e:
+            self.send_error(502, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            self.close_connection = True
+        stream.record(len(body), time.perf_counter() - started)
+
+    def forward(self, stream, url, head):
+        pool = self.server.relay.pool
+        client_headers = {name: self.headers[name] for name in CLIENT_HEADERS if self.headers.get(name)}
+        requested = url
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                headers = dict(client_headers, **headers_for(url, stream.origin, stream.headers))
+                key, conn, response = pool.request(url, "HEAD" if head else "GET", headers)
+                location = response.getheader("Location")
+                if response.status not in REDIRECT_CODES or not location:
+                    break
+                pool.finish(key, conn, response)
+                target = urljoin(url, location)
+                if not may_follow(url, target):
+                    self.send_error(502, f"Refusing redirect from {urlsplit(url).scheme} to {urlsplit(target).scheme}")
+                    return
+                url = target
+            else:
+                self.send_error(502, "Too many redirects")
+                return
+        except (OSError, http.client.HTTPException) as e:
+            self.send_error(502, f"Origin unreachable: {e}")
+            return
+        if requested == stream.url:
+            # Later requests for this stream skip the redirects.
+            stream.url = url
+
+        self.send_response(response.status)
+        for name in RESPONSE_HEADERS:
+            value = response.getheader(name)
+            if value is not None:
+                self.send_header(name, value)
+        if response.getheader("Content-Length") is None and not head:
+            # Unknown length: the end of the body is marked by closing the connection.
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        if head:
+            pool.finish(key, conn, response)
+            return
+
+        started = time.perf_counter()
+        sent = 0
+        buffer = bytearray(BUFFER_SIZE)
+        view = memoryview(buffer)
+        try:
+            while True:
+                count = response.readinto(view)
+                if not count:
+                    break
+                self.wfile.write(view[:count])
+                sent += count
+        except (ConnectionError, TimeoutError, http.client.HTTPException, OSError):
+            # VLC hung up (usually to seek) or the origin failed.
+            self.close_connection = True
+        finally:
+            stream.record(sent, time.perf_counter() - started)
+            pool.finish(key, conn, response)
+
+
+class RelayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class Relay:
+    def __init__(self, port=0, timeout=10.0, max_streams=MAX_STREAMS):
+        self.pool = ConnectionPool(timeout)
+        self.max_streams = max_streams
+        self.streams = OrderedDict()
+        self.by_target = {}
+        self.lock = threading.Lock()
+        self.server = RelayServer(("127.0.0.1", port), RelayHandler)
+        self.server.relay = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="vlc_host_relay", daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def register(self, url, headers=None, prefetcher=None):
+        headers = clean_headers(headers)
+        target = (url, tuple(sorted(headers.items())), prefetcher is not None)
+        with self.lock:
+            # The same URL with the same headers keeps its stream (and relay URL).
+            stream = self.streams.get(self.by_target.get(target))
+            if stream is None:
+                stream = Stream(secrets.token_urlsafe(16), url, headers)
+                if prefetcher is not None:
+                    from vlc_host.segments import SegmentSession
+                    stream.segments = SegmentSession(
+                        prefetcher, f"http://127.0.0.1:{self.port}/stream/{stream.stream_id}", url, headers)
+                self.streams[stream.stream_id] = stream
+                self.by_target[target] = stream.stream_id
+                while len(self.streams) > self.max_streams:
+                    _, dropped = self.streams.popitem(last=False)
+                    self.by_target = {key: value for key, value in self.by_target.items()
+                                      if value != dropped.stream_id}
+            self.streams.move_to_end(stream.stream_id)
+        return f"http://127.0.0.1:{self.port}/stream/{stream.stream_id}/{stream.name}"
+
+    def lookup(self, path):
+        # (stream, origin URL) for a relay path; the URL is None if there is none.
+        path, _, query = path.partition("?")
+        parts = path.split("/")
+        if len(parts) < 3 or parts[1] != "stream":
+            return None, None
+        with self.lock:
+            stream = self.streams.get(parts[2])
+        if stream is None:
+            return None, None
+        if stream.segments is not None and len(parts) > 5 and parts[3] in ("r", "b"):
+            # A playlist, segment or base URL from a rewritten manifest.
+            return stream, stream.segments.origin_url(parts[3], parts[4], "/".join(parts[5:]), query)
+        rest = "/".join(parts[3:])
+        if rest and (rest != stream.name or query):
+            # A relative reference from the stream itself, such as a
+            # segment of an HLS playlist: relative to the origin URL. forward
+            # sends the credentials only if it stays on the stream's origin.
+            url = urljoin(stream.url, f"{rest}?{query}" if query else rest)
+            return stream, url if may_follow(stream.url, url) else None
+        return stream, stream.url
+
+    def stats(self):
+        with self.lock:
+            streams = list(self.streams.values())
+        return {
+            "port": self.port,
+            "origin_connections_opened": self.pool.opened,
+            "origin_connections_reused": self.pool.reused,
+            "streams": {stream.stream_id[:8]: stream.stats() for stream in streams if stream.requests},
+        }
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.pool.close()
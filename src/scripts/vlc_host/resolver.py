@@ -0,0 +1,147 @@
+"""Follow HTTP redirects so VLC is handed the final URL.
+
+Each hop is a HEAD request, or a one-byte ranged GET when the server rejects
+HEAD. Response bodies are never downloaded. Connections are reused within a
+chain when consecutive hops stay on the same origin.
+"""
+import http.client
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin, urlsplit
+
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+# The only redirects HTTP lets a cache keep without being told for how long.
+PERMANENT_REDIRECTS = {301, 308}
+HEAD_UNSUPPORTED = {400, 403, 405, 501}
+MAX_DRAIN = 64 * 1024
+USER_AGENT = "VLC/3.0 LibVLC/3.0"
+
+
+class ResolveError(Exception):
+    pass
+
+
+class Resolution:
+    def __init__(self, url, final_url, hops, max_age=None, cacheable=True, timings=()):
+        self.url = url
+        self.final_url = final_url
+        self.hops = hops
+        self.max_age = max_age
+        self.cacheable = cacheable
+        # (url, connect_ms, rtt_ms) for each request made on a new connection.
+        self.timings = list(timings)
+
+
+def cache_lifetime(headers):
+    # (cacheable, lifetime in seconds or None) from a response's Cache-Control
+    # and Expires headers; None when neither says how long.
+    directives = [part.strip().lower() for part in headers.get("Cache-Control", "").split(",")]
+    if "no-store" in directives or "no-cache" in directives or "private" in directives:
+        return False, None
+    for directive in directives:
+        if directive.startswith("max-age="):
+            try:
+                return True, max(0, int(directive[8:]))
+            except ValueError:
+                pass
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return True, max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError, OverflowError):
+            # An Expires that can't be parsed means already expired.
+            return True, 0
+    return True, None
+
+
+class ConnectionPool:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.connections = {}
+
+    def get(self, parts):
+        key = (parts.scheme, parts.hostname, parts.port)
+        conn = self.connections.get(key)
+        if conn is None:
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+            self.connections[key] = conn
+        return key, conn
+
+    def discard(self, key):
+        conn = self.connections.pop(key, None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        for key in list(self.connections):
+            self.discard(key)
+
+
+def _target(parts):
+    path = parts.path or "/"
+    return f"{path}?{parts.query}" if parts.query else path
+
+
+def _request(pool, parts, method, headers, timings):
+    for attempt in (1, 2):
+        key, conn = pool.get(parts)
+        try:
+            connected = None
+            if conn.sock is None:
+                started = time.perf_counter()
+                conn.connect()
+                connected = time.perf_counter()
+            conn.request(method, _target(parts), headers=headers)
+            response = conn.getresponse()
+            if connected is not None:
+                timings.append((parts.geturl(), (connected - started) * 1000,
+                                (time.perf_counter() - connected) * 1000))
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # A kept-alive connection the server already closed; retry on a fresh one.
+            pool.discard(key)
+            if attempt == 2:
+                raise
+    length = response.getheader("Content-Length")
+    if method == "HEAD" or (response.status in REDIRECT_CODES and length is not None and int(length) <= MAX_DRAIN):
+        response.read()
+    else:
+        # Never download a media body just to learn where it lives.
+        pool.discard(key)
+    return response.status, response.headers
+
+
+def resolve(url, max_redirects=10, timeout=5.0, user_agent=USER_AGENT):
+    pool = ConnectionPool(timeout)
+    headers = {"User-Agent": user_agent, "Accept": "*/*"}
+    current = url
+    cacheable, max_age = True, None
+    timings = []
+    try:
+        for hops in range(max_redirects + 1):
+            parts = urlsplit(current)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                break
+            status, response_headers = _request(pool, parts, "HEAD", headers, timings)
+            if status in HEAD_UNSUPPORTED:
+                status, response_headers = _request(pool, parts, "GET", dict(headers, Range="bytes=0-0"), timings)
+            hop_cacheable, hop_max_age = cache_lifetime(response_headers)
+            cacheable = cacheable and hop_cacheable
+            if hop_max_age is not None:
+                max_age = hop_max_age if max_age is None else min(max_age, hop_max_age)
+            location = response_headers.get("Location")
+            if status not in REDIRECT_CODES or not location:
+                return Resolution(url, current, hops, max_age, cacheable, timings)
+            if status not in PERMANENT_REDIRECTS and hop_max_age is None:
+                # A 302, 303 or 307 may send somewhere else next time (a signed,
+                # expiring URL): only kept if it says for how long.
+                cacheable = False
+            current = urljoin(current, location)
+        else:
+            raise ResolveError(f"more than {max_redirects} redirects")
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise ResolveError(f"could not resolve {url}: {e}")
+    finally:
+        pool.close()
+    return Resolution(url, current, hops, max_age, cacheable, timings)
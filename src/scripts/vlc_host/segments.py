@@ -0,0 +1,618 @@
+"""Prefetching segment cache for HLS and DASH streams played through the relay.
+
+When a stream is registered with a ``Prefetcher``, the relay rewrites its
+manifests so every playlist and segment VLC asks for comes back through the
+relay: HLS URIs are replaced one by one, DASH manifests get relay
+``BaseURL``s. A segment request schedules the next ``ahead`` segments of the
+same track on a small worker pool, and reloads of a live manifest prefetch
+the newly published segments of the tracks being played. Segments are kept
+in a ``SegmentCache``, an in-memory LRU under a byte budget that spills to a
+size-capped directory on disk; it counts hits per tier and the prefetched
+bytes that were evicted without ever being played.
+"""
+import hashlib
+import http.client
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from vlc_host.relay import headers_for, may_follow, origin_key
+
+SEGMENT_KINDS = ("hls", "dash")
+DEFAULT_AHEAD = 3
+DEFAULT_WORKERS = 2
+MEMORY_BYTES = 64 * 1024 * 1024
+DISK_BYTES = 256 * 1024 * 1024
+MAX_SEGMENT_BYTES = 32 * 1024 * 1024
+MAX_MANIFEST_BYTES = 4 * 1024 * 1024
+MAX_TEMPLATE_SEGMENTS = 100000
+MAX_RESOURCES = 10000
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+URI_ATTRIBUTE = re.compile(r'URI="([^"]*)"')
+BASE_URL_ELEMENT = re.compile(r"(<(?:[\w.-]+:)?BaseURL\b[^>]*>)(.*?)(</(?:[\w.-]+:)?BaseURL>)", re.S)
+MPD_START = re.compile(r"<((?:[\w.-]+:)?)MPD\b[^>]*>")
+TEMPLATE_FIELD = re.compile(r"\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$|\$\$")
+ISO_DURATION = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$")
+
+
+class SegmentError(Exception):
+    pass
+
+
+def fetch(pool, url, headers, limit, origin):
+    # (final URL, Content-Type, body) of a GET on a pooled connection. The
+    # credentials in headers only go to URLs on origin (an origin_key).
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            key, conn, response = pool.request(url, "GET", headers_for(url, origin, headers))
+        except (OSError, http.client.HTTPException) as e:
+            raise SegmentError(f"could not fetch {url}: {e}")
+        try:
+            location = response.getheader("Location")
+            if response.status in REDIRECT_CODES and location:
+                target = urljoin(url, location)
+                if not may_follow(url, target):
+                    raise SegmentError(f"refusing redirect from {url} to {target}")
+                url = target
+                continue
+            if response.status >= 400:
+                raise SegmentError(f"HTTP {response.status} for {url}")
+            if response.length is not None and response.length > limit:
+                raise SegmentError(f"{url} is larger than {limit} bytes")
+            data = response.read(limit + 1)
+            if len(data) > limit:
+                raise SegmentError(f"{url} is larger than {limit} bytes")
+            return url, response.getheader("Content-Type") or "application/octet-stream", data
+        except (OSError, http.client.HTTPException) as e:
+            raise SegmentError(f"could not fetch {url}: {e}")
+        finally:
+            pool.finish(key, conn, response)
+    raise SegmentError(f"more than {MAX_REDIRECTS} redirects")
+
+
+class SegmentCache:
+    """Segment bodies by URL in memory, spilling to disk, each tier under a byte budget. Thread-safe.
+
+    Both tiers evict least recently used first, except that a segment that
+    has been played counts as older than any that has not.
+    """
+
+    def __init__(self, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES, parent_dir=None):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.parent_dir = parent_dir
+        self.directory = None
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.memory_used = 0
+        self.disk_used = 0
+        # Prefetched segments not played yet, with their sizes.
+        self.unread = {}
+        self.lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.spilled = 0
+        self.evicted = 0
+        self.prefetched = 0
+        self.prefetched_bytes = 0
+        self.prefetch_used = 0
+        self.prefetch_wasted = 0
+        self.wasted_bytes = 0
+
+    def __contains__(self, url):
+        with self.lock:
+            return url in self.memory or url in self.disk
+
+    def get(self, url, count=True):
+        # (content_type, data) or None; one on disk comes back into memory.
+        with self.lock:
+            entry = self.memory.get(url)
+            if entry is not None:
+                self.hits_memory += count
+                self._mark_read(url)
+                return entry
+            spilled = self.disk.pop(url, None)
+            if spilled is not None:
+                content_type, path, size = spilled
+                self.disk_used -= size
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    os.remove(path)
+                except OSError:
+                    self._drop(url)
+                else:
+                    self.hits_disk += count
+                    self._store(url, (content_type, data))
+                    self._mark_read(url)
+                    return content_type, data
+            self.misses += count
+            return None
+
+    def put(self, url, content_type, data, prefetched=False):
+        with self.lock:
+            if url in self.memory or url in self.disk:
+                return
+            if prefetched:
+                self.prefetched += 1
+                self.prefetched_bytes += len(data)
+                self.unread[url] = len(data)
+            self._store(url, (content_type, data))
+            if not prefetched:
+                self._mark_read(url)
+
+    def mark_read(self, url):
+        with self.lock:
+            self._mark_read(url)
+
+    def _mark_read(self, url):
+        # Played: first in line for eviction, players rarely go back.
+        if self.unread.pop(url, None) is not None:
+            self.prefetch_used += 1
+        if url in self.memory:
+            self.memory.move_to_end(url, last=False)
+
+    def _store(self, url, entry):
+        self.memory[url] = entry
+        self.memory_used += len(entry[1])
+        while self.memory_used > self.memory_bytes and self.memory:
+            old_url, old_entry = self.memory.popitem(last=False)
+            self.memory_used -= len(old_entry[1])
+            self._spill(old_url, old_entry)
+
+    def _spill(self, url, entry):
+        content_type, data = entry
+        if len(data) > self.disk_bytes:
+            self._drop(url)
+            return
+        while self.disk_used + len(data) > self.disk_bytes and self.disk:
+            old_url, (_, path, size) = self.disk.popitem(last=False)
+            self.disk_used -= size
+            self._remove(path)
+            self._drop(old_url)
+        try:
+            if self.directory is None:
+                if self.parent_dir:
+                    os.makedirs(self.parent_dir, exist_ok=True)
+                self.directory = tempfile.mkdtemp(prefix="vlc_host_segments_", dir=self.parent_dir)
+            path = os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError:
+            self._drop(url)
+            return
+        self.disk[url] = (content_type, path, len(data))
+        self.disk_used += len(data)
+        self.spilled += 1
+
+    def _drop(self, url):
+        self.evicted += 1
+        size = self.unread.pop(url, None)
+        if size is not None:
+            self.prefetch_wasted += 1
+            self.wasted_bytes += size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            hits = self.hits_memory + self.hits_disk
+            return {
+                "memory_bytes": self.memory_used,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.disk_used,
+                "disk_entries": len(self.disk),
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round(hits / (hits + self.misses), 3) if hits + self.misses else 0.0,
+                "spilled": self.spilled,
+                "evicted": self.evicted,
+                "prefetched": self.prefetched,
+                "prefetched_bytes": self.prefetched_bytes,
+                "prefetch_used": self.prefetch_used,
+                "prefetch_unread": len(self.unread),
+                "prefetch_wasted": self.prefetch_wasted,
+                "wasted_bytes": self.wasted_bytes,
+                "waste_rate": round(self.wasted_bytes / self.prefetched_bytes, 3) if self.prefetched_bytes else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            self.memory.clear()
+            self.disk.clear()
+            self.memory_used = self.disk_used = 0
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+
+def rewrite_hls(text, url, local):
+    # The playlist with every URI replaced by local(absolute URI), and its
+    # (segments, variant playlists, live). Byte-range segments are not listed.
+    lines, segments, variants = [], [], []
+    variant_next = byterange = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            if stripped.startswith("#EXT-X-STREAM-INF"):
+                variant_next = True
+            elif stripped.startswith("#EXT-X-BYTERANGE"):
+                byterange = True
+
+            def replace(match, tag=stripped):
+                target = urljoin(url, match.group(1))
+                if tag.startswith(("#EXT-X-MEDIA:", "#EXT-X-I-FRAME-STREAM-INF")):
+                    variants.append(target)
+                elif tag.startswith("#EXT-X-MAP") and "BYTERANGE" not in tag:
+                    segments.append(target)
+                return f'URI="{local(target)}"'
+            line = URI_ATTRIBUTE.sub(replace, line)
+        elif stripped:
+            target = urljoin(url, stripped)
+            if variant_next:
+                variants.append(target)
+            elif not byterange:
+                segments.append(target)
+            variant_next = byterange = False
+            line = local(target)
+        lines.append(line)
+    live = bool(segments) and "#EXT-X-ENDLIST" not in text
+    return "\n".join(lines) + "\n", segments, variants, live
+
+
+def parse_duration(value):
+    # Seconds in an ISO 8601 duration such as PT1H2M3.5S, or None.
+    match = ISO_DURATION.match(value or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60
+            + float(seconds or 0))
+
+
+def fill_template(template, values):
+    def replace(match):
+        if match.group(0) == "$$":
+            return "$"
+        value = values.get(match.group(1))
+        if value is None:
+            return match.group(0)
+        return str(value).zfill(int(match.group(2))) if match.group(2) else str(value)
+    return TEMPLATE_FIELD.sub(replace, template)
+
+
+def _base(element, ns, parent):
+    child = element.find(ns + "BaseURL")
+    if child is None or not (child.text or "").strip():
+        return parent
+    return urljoin(parent, child.text.strip())
+
+
+def _template_numbers(attributes, timeline, ns, seconds):
+    # (number, time) of every segment of a SegmentTemplate.
+    start = int(attributes.get("startNumber", 1))
+    timescale = int(attributes.get("timescale", 1))
+    if timeline is not None:
+        number, time = start, 0
+        elements = timeline.findall(ns + "S")
+        for index, element in enumerate(elements):
+            time = int(element.get("t", time))
+            duration = int(element.get("d", 0))
+            repeat = int(element.get("r", 0))
+            if repeat < 0:
+                # Repeats until the next S, or the end of the period.
+                end = int(elements[index + 1].get("t", 0)) if index + 1 < len(elements) else \
+                    (seconds * timescale if seconds else time + duration)
+                repeat = max(0, math.ceil((end - time) / duration) - 1) if duration else 0
+            for _ in range(repeat + 1):
+                yield number, time
+                number += 1
+                time += duration
+        return
+    duration = int(attributes.get("duration", 0))
+    if not duration or not seconds:
+        return
+    for index in range(math.ceil(seconds * timescale / duration)):
+        yield start + index, index * duration
+
+
+def dash_tracks(root, ns, url):
+    # {representation key: [absolute segment URLs]} of a parsed MPD.
+    tracks = {}
+    seconds = parse_duration(root.get("mediaPresentationDuration"))
+    mpd_base = _base(root, ns, url)
+    for period_index, period in enumerate(root.findall(ns + "Period")):
+        period_base = _base(period, ns, mpd_base)
+        period_seconds = parse_duration(period.get("duration")) or seconds
+        for set_index, adaptation in enumerate(period.findall(ns + "AdaptationSet")):
+            set_base = _base(adaptation, ns, period_base)
+            for representation in adaptation.findall(ns + "Representation"):
+                base = _base(representation, ns, set_base)
+                values = {"RepresentationID": representation.get("id"),
+                          "Bandwidth": representation.get("bandwidth")}
+                key = f"{period_index}/{set_index}/{values['RepresentationID']}"
+                segments = []
+                templates = [element.find(ns + "SegmentTemplate") for element in (period, adaptation, representation)]
+                templates = [template for template in templates if template is not None]
+                segment_list = representation.find(ns + "SegmentList")
+                if segment_list is None:
+                    segment_list = adaptation.find(ns + "SegmentList")
+                if templates:
+                    attributes, timeline = {}, None
+                    for template in templates:
+                        attributes.update(template.attrib)
+                        if template.find(ns + "SegmentTimeline") is not None:
+                            timeline = template.find(ns + "SegmentTimeline")
+                    if attributes.get("initialization"):
+                        segments.append(urljoin(base, fill_template(attributes["initialization"], values)))
+                    if attributes.get("media"):
+                        for number, time in _template_numbers(attributes, timeline, ns, period_seconds):
+                            if len(segments) > MAX_TEMPLATE_SEGMENTS:
+                                break
+                            segments.append(urljoin(base, fill_template(
+                                attributes["media"], dict(values, Number=number, Time=time))))
+                elif segment_list is not None:
+                    initialization = segment_list.find(ns + "Initialization")
+                    if initialization is not None and initialization.get("sourceURL"):
+                        segments.append(urljoin(base, initialization.get("sourceURL")))
+                    for segment in segment_list.findall(ns + "SegmentURL"):
+                        if segment.get("media") and not segment.get("mediaRange"):
+                            segments.append(urljoin(base, segment.get("media")))
+                if segments:
+                    tracks[key] = segments
+    return tracks
+
+
+def rewrite_dash(text, url, local_base):
+    # The MPD with every BaseURL replaced by local_base(absolute base URL)
+    # (and one added if it has none), its tracks and whether it is live.
+    from xml.etree.ElementTree import ParseError, fromstring
+    try:
+        root = fromstring(text)
+    except ParseError as e:
+        raise SegmentError(f"invalid MPD: {e}")
+    ns = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    resolved = {}
+
+    def walk(element, parent_base):
+        # An element's BaseURLs are relative to its parent's base.
+        for child in element.findall(ns + "BaseURL"):
+            resolved[child] = urljoin(parent_base, (child.text or "").strip())
+        base = _base(element, ns, parent_base)
+        for child in element:
+            if child.tag != ns + "BaseURL":
+                walk(child, base)
+    walk(root, url)
+    bases = [resolved[element] for element in root.iter(ns + "BaseURL")]
+    if len(BASE_URL_ELEMENT.findall(text)) != len(bases):
+        raise SegmentError("cannot rewrite the MPD's BaseURLs")
+    replacements = iter(bases)
+    text = BASE_URL_ELEMENT.sub(
+        lambda match: match.group(1) + local_base(next(replacements)) + match.group(3), text)
+    if root.find(ns + "BaseURL") is None:
+        start = MPD_START.search(text)
+        if start is None:
+            raise SegmentError("no MPD element")
+        prefix = start.group(1)
+        text = f"{text[:start.end()]}<{prefix}BaseURL>{local_base(url)}</{prefix}BaseURL>{text[start.end():]}"
+    return text, dash_tracks(root, ns, url), root.get("type") == "dynamic"
+
+
+class SegmentSession:
+    """One relayed stream's manifests: local URLs for what they reference and the order of each track."""
+
+    def __init__(self, prefetcher, prefix, url, headers):
+        self.prefetcher = prefetcher
+        self.prefix = prefix
+        self.url = url
+        self.headers = headers
+        # Where the manifest lives: the only origin its credentials are sent to.
+        self.origin = origin_key(url)
+        self.lock = threading.Lock()
+        # HLS URIs and DASH BaseURLs by index, and the index of each.
+        self.resources = OrderedDict()
+        self.by_index = {}
+        self.bases = {}
+        self.bases_by_index = {}
+        self.next_index = 0
+        self.manifests = {url}
+        self.tracks = {}
+        self.positions = {}
+        self.active = set()
+
+    def local(self, url):
+        if urlsplit(url).scheme not in ("http", "https"):
+            return url
+        with self.lock:
+            index = self.resources.get(url)
+            if index is None:
+                index = self.resources[url] = self.next_index
+                self.by_index[index] = url
+                self.next_index += 1
+                while len(self.resources) > MAX_RESOURCES:
+                    _, dropped = self.resources.popitem(last=False)
+                    del self.by_index[dropped]
+            else:
+                self.resources.move_to_end(url)
+        return f"{self.prefix}/r/{index}/{urlsplit(url).path.rpartition('/')[2]}"
+
+    def local_base(self, url):
+        if urlsplit(url).scheme not in ("http", "https"):
+            return url
+        with self.lock:
+            index = self.bases.get(url)
+            if index is None:
+                index = self.bases[url] = self.next_index
+                self.bases_by_index[index] = url
+                self.next_index += 1
+        return f"{self.prefix}/b/{index}/{urlsplit(url).path.rpartition('/')[2]}"
+
+    def origin_url(self, kind, index, rest, query):
+        # The origin URL behind a relay path, or None.
+        try:
+            index = int(index)
+        except ValueError:
+            return None
+        with self.lock:
+            if kind == "r":
+                return self.by_index.get(index)
+            base = self.bases_by_index.get(index)
+        if base is None:
+            return None
+        target = urljoin(base, rest)
+        return f"{target}?{query}" if query else target
+
+    def is_manifest(self, url):
+        if url in self.manifests:
+            return True
+        return os.path.splitext(urlsplit(url).path)[1].lower() in (".m3u8", ".mpd")
+
+    def get(self, url):
+        # (content_type, body) for a relay request: manifests rewritten, segments from the cache.
+        if self.is_manifest(url):
+            return self.manifest(url)
+        return self.prefetcher.segment(self, url)
+
+    def manifest(self, url):
+        from vlc_host.probe import sniff
+        final_url, content_type, data = fetch(self.prefetcher.pool, url, self.headers, MAX_MANIFEST_BYTES,
+                                                 self.origin)
+        kind = sniff(data)
+        text = data.decode("utf-8", "replace")
+        if kind == "hls":
+            text, segments, variants, live = rewrite_hls(text, final_url, self.local)
+            with self.lock:
+                self.manifests.update(variants)
+            if segments:
+                self.update_track(url, segments, live, start=True)
+        elif kind == "dash":
+            text, tracks, live = rewrite_dash(text, final_url, self.local_base)
+            for key, segments in tracks.items():
+                self.update_track((url, key), segments, live)
+        else:
+            return content_type, data
+        return content_type, text.encode("utf-8")
+
+    def update_track(self, key, segments, live, start=False):
+        with self.lock:
+            old = self.tracks.get(key) or []
+            for segment in old:
+                if self.positions.get(segment, (None,))[0] == key:
+                    del self.positions[segment]
+            self.tracks[key] = segments
+            for index, segment in enumerate(segments):
+                self.positions[segment] = (key, index)
+            if start:
+                self.active.add(key)
+            active = key in self.active
+        ahead = self.prefetcher.ahead
+        if live and active:
+            # Follow the live edge: the newest segments this reload published.
+            seen = set(old)
+            self.prefetcher.schedule(self, [segment for segment in segments if segment not in seen][-ahead:])
+        elif not old and start:
+            self.prefetcher.schedule(self, segments[:ahead])
+
+    def requested(self, url):
+        # Schedules the segments after url in its track.
+        with self.lock:
+            position = self.positions.get(url)
+            if position is None:
+                return
+            key, index = position
+            self.active.add(key)
+            following = self.tracks[key][index + 1:index + 1 + self.prefetcher.ahead]
+        self.prefetcher.schedule(self, following)
+
+
+class Prefetcher:
+    """Fetches segments ahead of the player on a small worker pool, into a shared ``SegmentCache``."""
+
+    def __init__(self, pool, cache, ahead=DEFAULT_AHEAD, workers=DEFAULT_WORKERS,
+                 max_segment_bytes=MAX_SEGMENT_BYTES):
+        self.pool = pool
+        self.cache = cache
+        self.ahead = ahead
+        self.max_segment_bytes = max_segment_bytes
+        self.executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix="vlc_host_prefetch")
+        self.workers = max(1, workers)
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.late = 0
+        self.failed = 0
+
+    def schedule(self, session, urls):
+        for url in urls:
+            with self.lock:
+                if self.closed or url in self.inflight or url in self.cache:
+                    continue
+                self.inflight[url] = self.executor.submit(self._prefetch, session, url)
+
+    def _prefetch(self, session, url):
+        try:
+            _, content_type, data = fetch(self.pool, url, session.headers, self.max_segment_bytes, session.origin)
+        except SegmentError:
+            with self.lock:
+                self.failed += 1
+            return None
+        else:
+            self.cache.put(url, content_type, data, prefetched=True)
+            return content_type, data
+        finally:
+            with self.lock:
+                self.inflight.pop(url, None)
+
+    def segment(self, session, url):
+        session.requested(url)
+        entry = self.cache.get(url)
+        if entry is not None:
+            return entry
+        with self.lock:
+            future = self.inflight.get(url)
+        if future is not None:
+            # Already on its way: wait for the rest of it rather than start over.
+            with self.lock:
+                self.late += 1
+            try:
+                entry = future.result()
+            except CancelledError:
+                # close() dropped it before it started: fetch it here instead.
+                entry = None
+            if entry is not None:
+                self.cache.mark_read(url)
+                return entry
+        else:
+            # The prefetch may have finished between the two lookups.
+            entry = self.cache.get(url, count=False)
+            if entry is not None:
+                return entry
+        _, content_type, data = fetch(self.pool, url, session.headers, self.max_segment_bytes, session.origin)
+        self.cache.put(url, content_type, data)
+        return content_type, data
+
+    def stats(self):
+        with self.lock:
+            extra = {"ahead": self.ahead, "workers": self.workers, "inflight": len(self.inflight),
+                     "late": self.late, "failed": self.failed}
+        return dict(self.cache.stats(), **extra)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
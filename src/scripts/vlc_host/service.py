@@ -0,0 +1,520 @@
+"""Request handling shared by every connection to the host.
+
+``HostService.handle`` takes one decoded message and returns its reply. Up to
+``max_concurrency`` requests are handled at once; blocking work (spawning a
+player, talking to its control socket) runs on a thread pool of the same size
+so a slow request never holds up the ones queued behind it. Replies echo the
+caller's ``id`` so they can be matched when they complete out of order.
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from vlc_host import tracing
+
+DEFAULT_MAX_CONCURRENCY = 8
+# Player URLs remembered for reporting positions against the URL that was opened.
+MAX_HISTORY_URLS = 256
+# Persisted caches are written at most this often, and when the host exits.
+CACHE_SAVE_INTERVAL = 10.0
+
+
+class HostService:
+    def __init__(self, config, state_dir=None):
+        # Must be created inside the running event loop (asyncio primitives
+        # bind to the loop on Python 3.9).
+        self.config = config
+        self.state_dir = state_dir
+        self.max_concurrency = max(1, int(config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+        self.loop = asyncio.get_running_loop()
+        self.limit = asyncio.Semaphore(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="vlc_host")
+        self.player = None
+        self.supervisor = None
+        # Set by BrokerDaemon when this service is shared by many clients.
+        self.broker = None
+        self.started_at = time.monotonic()
+        self.caches = {}
+        self.caches_saved_at = time.monotonic()
+        self.resolve_cache = None
+        if config.get("resolve_urls"):
+            from vlc_host.cache import TTLCache
+            self.resolve_cache = self.load_cache("resolve_cache", TTLCache(
+                max_entries=int(config.get("resolve_cache_size", 1024)),
+                ttl=float(config.get("resolve_ttl", 300))))
+        self.probe_cache = None
+        if config.get("probe_media"):
+            from vlc_host.cache import TTLCache
+            self.probe_cache = self.load_cache("probe_cache", TTLCache(
+                max_entries=int(config.get("probe_cache_size", 1024)),
+                ttl=float(config.get("probe_ttl", 3600))))
+        self.origin_stats = None
+        if config.get("adaptive_caching"):
+            from vlc_host.origins import OriginStats
+            self.origin_stats = self.load_cache("origin_stats", OriginStats(
+                max_origins=int(config.get("origin_stats_size", 256))))
+        self.coalescer = None
+        if float(config.get("dedupe_window", 2.0)) > 0:
+            from vlc_host.coalesce import Coalescer
+            self.coalescer = Coalescer(float(config.get("dedupe_window", 2.0)))
+        self.history = None
+        self.history_loading = None
+        if config.get("history"):
+            from vlc_host.history import DEFAULT_MAX_ENTRIES, History
+            self.history = History(max_entries=int(config.get("history_max_entries", DEFAULT_MAX_ENTRIES)),
+                                   max_age=float(config.get("history_max_age_days", 0)) * 86400)
+            if state_dir:
+                # A large history takes a while to read: requests that don't need it go first.
+                self.history_loading = asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.history.load, os.path.join(state_dir, "history.jsonl"))
+        # URL handed to the player -> URL opened, where resolving or the relay changed it.
+        self.history_urls = {}
+        # None: reuse in rc mode only, where VLC can be told to resume. In
+        # spawn mode a re-click would otherwise seem to do nothing.
+        self.reuse_players = config.get("reuse_players")
+        self.players_reused = 0
+        self.relay = None
+        self.prefetcher = None
+        self.tracer = None
+        if config.get("tracing", True):
+            self.tracer = self.create_tracer()
+        self.handlers = {
+            "open": self.handle_open,
+            "ping": self.handle_ping,
+            "stats": self.handle_stats,
+            "enqueue": self.handle_enqueue,
+            "dump": self.handle_dump,
+            "status": self.handle_status,
+            "history": self.handle_history,
+        }
+
+    def load_cache(self, name, cache):
+        if self.state_dir:
+            cache.load(os.path.join(self.state_dir, f"{name}.json"))
+        self.caches[name] = cache
+        return cache
+
+    def create_tracer(self):
+        log_path = None
+        # The histograms cost a few microseconds; the log on disk is opt-in.
+        if self.state_dir and self.config.get("trace_log", False):
+            log_path = os.path.join(self.state_dir, "trace.log")
+        tracer = tracing.Tracer(log_path,
+                                log_bytes=int(self.config.get("trace_log_bytes", tracing.DEFAULT_LOG_BYTES)),
+                                log_backups=int(self.config.get("trace_log_backups", tracing.DEFAULT_LOG_BACKUPS)),
+                                metrics_path=self.config.get("metrics_file"),
+                                interval=float(self.config.get("trace_interval", tracing.DEFAULT_INTERVAL)))
+        if self.config.get("metrics_port"):
+            try:
+                tracer.serve_metrics(int(self.config["metrics_port"]))
+            except OSError:
+                # Another host (one per Chrome profile) already serves the port.
+                pass
+        return tracer
+
+    def save_caches(self, force=False):
+        if not self.state_dir or (not force and time.monotonic() - self.caches_saved_at < CACHE_SAVE_INTERVAL):
+            return
+        self.caches_saved_at = time.monotonic()
+        for name, cache in self.caches.items():
+            try:
+                cache.save(os.path.join(self.state_dir, f"{name}.json"))
+            except OSError:
+                pass
+        # Not a history that is still loading, or failed to: saving it could compact the log to a part of it.
+        loading = self.history_loading
+        if self.history is not None and (loading is None or loading.done() and loading.exception() is None):
+            try:
+                self.history.save()
+            except OSError:
+                pass
+
+    def get_relay(self):
+        if self.relay is None:
+            from vlc_host.relay import Relay
+            self.relay = Relay(port=int(self.config.get("relay_port", 0)),
+                               timeout=float(self.config.get("relay_timeout", 10.0)))
+            if self.origin_stats is not None:
+                self.relay.pool.on_timing = self.relay_timing
+        return self.relay
+
+    def get_prefetcher(self):
+        if self.prefetcher is None:
+            from vlc_host.segments import Prefetcher, SegmentCache
+            megabyte = 1024 * 1024
+            cache = SegmentCache(memory_bytes=int(float(self.config.get("segment_memory_mb", 64)) * megabyte),
+                                 disk_bytes=int(float(self.config.get("segment_disk_mb", 256)) * megabyte),
+                                 parent_dir=self.state_dir)
+            self.prefetcher = Prefetcher(self.get_relay().pool, cache,
+                                         ahead=int(self.config.get("prefetch_ahead", 3)),
+                                         workers=int(self.config.get("prefetch_workers", 2)))
+        return self.prefetcher
+
+    def get_supervisor(self):
+        if self.supervisor is None:
+            from vlc_host.supervisor import DEFAULT_IDLE_CPU, DEFAULT_INTERVAL, Supervisor
+            self.supervisor = Supervisor(
+                max_players=int(self.config.get("max_players", 0)),
+                interval=float(self.config.get("player_sample_interval", DEFAULT_INTERVAL)),
+                idle_cpu=float(self.config.get("player_idle_cpu", DEFAULT_IDLE_CPU)))
+            if self.history is not None:
+                self.supervisor.on_exit = self.player_exited
+                self.supervisor.on_sample = self.poll_position
+        return self.supervisor
+
+    def get_player(self):
+        if self.player is None:
+            from vlc_host.player import create_player
+            self.player = create_player(self.config, self.get_supervisor())
+        return self.player
+
+    async def run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle(self, message):
+        if not isinstance(message, dict):
+            return {"success": False, "error": "Message must be a JSON object"}
+        async with self.limit:
+            tracing.lap("queue")
+            reply = await self.dispatch(message)
+        if "id" in message:
+            reply["id"] = message["id"]
+        return reply
+
+    async def dispatch(self, message):
+        action = message.get("action", "open")
+        handler = self.handlers.get(action)
+        trace = tracing.current.get()
+        if trace is not None:
+            trace.action = action if handler is not None else "unknown"
+            trace.lap("validate")
+        if handler is None:
+            return {"success": False, "error": f"Unknown action: {action}"}
+        try:
+            return await handler(message)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    async def handle_open(self, message):
+        url = message.get("url")
+        if not url:
+            return {"success": False, "error": "No URL provided"}
+        from vlc_host.player import validate_url
+        validate_url(url)
+        tracing.lap("validate")
+        if self.coalescer is None or not message.get("dedupe", True):
+            return await self.open_url(url, message)
+        from vlc_host.coalesce import normalize_url
+        reply, coalesced = await self.coalescer.run(normalize_url(url), lambda: self.open_url(url, message))
+        if coalesced:
+            reply["coalesced"] = True
+        return reply
+
+    async def open_url(self, url, message):
+        reply = {"success": True}
+        history_url = url
+        start_time = None
+        if self.history is not None and await self.wait_for_history():
+            start_time = self.remember_open(url, message)
+        if self.resolve_cache is not None and message.get("resolve", True):
+            started = tracing.now()
+            resolved = await self.resolve_url(url)
+            tracing.add("resolve", started)
+            if resolved != url:
+                reply["resolved_url"] = resolved
+            url = resolved
+        options = []
+        if self.probe_cache is not None and message.get("probe", True):
+            started = tracing.now()
+            kind = await self.probe_url(url)
+            tracing.add("probe", started)
+            reply["media"] = kind
+            from vlc_host.probe import options_for
+            options = options_for(kind, self.config.get("probe_options"))
+        if self.origin_stats is not None:
+            options = self.adapt_caching(url, options)
+        player = self.get_player()
+        if self.config.get("expand_playlists") and player.mode == "rc" and message.get("expand", True):
+            from vlc_host.playlist import PLAYLIST_KINDS
+            from vlc_host.probe import classify
+            kind = reply.get("media") or classify(url)
+            if kind in PLAYLIST_KINDS:
+                started = tracing.now()
+                reply.update(await self.run_blocking(self.play_playlist, player, url, kind))
+                tracing.add("spawn", started)
+                return reply
+        relay = message.get("relay", bool(self.config.get("relay")))
+        prefetch = message.get("prefetch", bool(self.config.get("prefetch_segments")))
+        if prefetch:
+            from vlc_host.probe import classify
+            from vlc_host.segments import SEGMENT_KINDS
+            prefetch = (reply.get("media") or classify(url)) in SEGMENT_KINDS
+        if (relay or prefetch) and url.startswith(("http://", "https://")):
+            # VLC fetches through the loopback relay, with the browser's headers.
+            started = tracing.now()
+            url = self.get_relay().register(url, message.get("headers"),
+                                            self.get_prefetcher() if prefetch else None)
+            tracing.add("relay", started)
+            reply["relay_url"] = url
+        started = tracing.now()
+        result = None
+        reuse = player.mode == "rc" if self.reuse_players is None else bool(self.reuse_players)
+        if reuse and message.get("dedupe", True):
+            # The same URL is still open in a player we started: bring it back instead.
+            result = await self.run_blocking(player.reuse, url)
+            if result is not None:
+                self.players_reused += 1
+        if result is None:
+            if self.history is not None:
+                if player.mode == "rc":
+                    # "add" replaces what VLC is playing: keep its position first.
+                    await self.run_blocking(self.poll_position)
+                if url != history_url:
+                    self.remember_url(url, history_url)
+                if start_time:
+                    options = options + [f":start-time={start_time}"]
+                    reply["start_time"] = start_time
+            result = await self.run_blocking(player.open, url, options)
+        tracing.add("spawn", started)
+        reply.update(result)
+        return reply
+
+    async def wait_for_history(self):
+        # False if the history could not be loaded: it is turned off rather
+        # than let every open fail on it.
+        if self.history_loading is not None:
+            try:
+                await self.history_loading
+            except Exception as e:
+                print(f"vlc_host: history off, could not load it: {e!r}", file=sys.stderr)
+                self.history = None
+            self.history_loading = None
+        return self.history is not None
+
+    def remember_open(self, url, message):
+        # Counts the open and returns where to start it, if it was left part way through.
+        start_time = self.history.resume_position(url) if message.get("resume", True) else None
+        self.history.record_open(url)
+        self.save_caches()
+        return start_time
+
+    def remember_url(self, player_url, url):
+        self.history_urls[player_url] = url
+        while len(self.history_urls) > MAX_HISTORY_URLS:
+            del self.history_urls[next(iter(self.history_urls))]
+
+    def poll_position(self):
+        # Runs on a worker or the supervisor thread: asks our VLC where it is.
+        history = self.history
+        if self.player is None or history is None:
+            return
+        current = self.player.position()
+        if current is not None:
+            player_url, seconds, length = current
+            history.record_position(self.history_urls.get(player_url, player_url), seconds, length)
+
+    def player_exited(self, record):
+        # Runs on the supervisor thread. VLC saves the time it stopped each
+        # of its recent items at when it exits.
+        history = self.history
+        if record.role != "player" or history is None:
+            return
+        from vlc_host.coalesce import normalize_url
+        from vlc_host.history import read_vlc_recents
+        player_urls = {record.url}
+        if getattr(self.player, "process", None) is record.process and self.player.current_url:
+            player_urls.add(self.player.current_url)
+        recents = read_vlc_recents(self.config.get("vlc_recents_file"))
+        for player_url in player_urls:
+            position = recents.get(normalize_url(player_url))
+            if position is not None:
+                history.record_position(self.history_urls.get(player_url, player_url), position)
+
+    def play_playlist(self, player, url, kind):
+        # Runs on a worker thread and streams the playlist from the socket
+        # into the player: the first entry is played as soon as it is read,
+        # the rest are enqueued in batches as they arrive.
+        from vlc_host.playlist import DEFAULT_SCHEMES, Expansion, PlaylistError, batched, expand
+        expansion = Expansion(kind)
+        max_entries = self.config.get("playlist_max_entries")
+        entries = expand(url, kind, timeout=float(self.config.get("playlist_timeout", 10.0)),
+                         schemes=tuple(self.config.get("playlist_schemes", DEFAULT_SCHEMES)),
+                         max_entries=int(max_entries) if max_entries else None, expansion=expansion)
+        result = None
+        try:
+            for batch in batched(entries, int(self.config.get("playlist_batch_size", 256))):
+                if result is None:
+                    result = player.open(batch[0])
+                else:
+                    player.enqueue(batch)
+        except PlaylistError as e:
+            if result is None:
+                # Nothing read, or HLS behind an .m3u URL: leave it to VLC, as without expansion.
+                return player.open(url)
+            result["playlist_error"] = str(e)
+        if result is None:
+            return dict(player.open(url), playlist=expansion.summary())
+        return dict(result, playlist=expansion.summary())
+
+    async def probe_url(self, url):
+        from vlc_host.probe import ProbeError, cache_key, classify, probe
+        key = cache_key(url, self.config.get("probe_cache_scope", "url"))
+        kind = self.probe_cache.get(key)
+        if kind is not None:
+            return kind
+        try:
+            result = await self.run_blocking(probe, url, float(self.config.get("probe_timeout", 3.0)))
+        except ProbeError:
+            self.record_failure(url)
+            # Unreachable now; guess from the URL and let VLC probe as usual.
+            return classify(url)
+        self.record_timings(result.timings)
+        self.probe_cache.set(key, result.kind)
+        self.save_caches()
+        return result.kind
+
+    async def resolve_url(self, url):
+        from vlc_host.resolver import ResolveError, resolve
+        resolved = self.resolve_cache.get(url)
+        if resolved is not None:
+            return resolved
+        try:
+            resolution = await self.run_blocking(
+                resolve, url, int(self.config.get("resolve_max_redirects", 10)),
+                float(self.config.get("resolve_timeout", 5.0)))
+        except ResolveError:
+            self.record_failure(url)
+            # Resolution is an optimisation; VLC can still follow the redirects itself.
+            return url
+        self.record_timings(resolution.timings)
+        if resolution.cacheable:
+            self.resolve_cache.set(url, resolution.final_url, ttl=resolution.max_age)
+        self.save_caches()
+        return resolution.final_url
+
+    def record_timings(self, timings):
+        # (url, connect_ms, rtt_ms) samples from probes, resolutions and the relay.
+        if self.origin_stats is not None:
+            from vlc_host.origins import origin_of
+            for url, connect_ms, rtt_ms in timings:
+                origin = origin_of(url)
+                if origin is not None:
+                    self.origin_stats.record(origin, connect_ms, rtt_ms)
+
+    def relay_timing(self, url, connect_ms, rtt_ms):
+        # Runs on a relay thread; the origin history is only touched from the event loop.
+        try:
+            self.loop.call_soon_threadsafe(self.record_relay_timing, url, connect_ms, rtt_ms)
+        except RuntimeError:
+            # The loop has closed: the host is exiting.
+            pass
+
+    def record_relay_timing(self, url, connect_ms, rtt_ms):
+        self.record_timings([(url, connect_ms, rtt_ms)])
+        self.save_caches()
+
+    def record_failure(self, url):
+        if self.origin_stats is not None:
+            from vlc_host.origins import origin_of
+            origin = origin_of(url)
+            if origin is not None:
+                self.origin_stats.record_failure(origin)
+                self.save_caches()
+
+    def adapt_caching(self, url, options):
+        # Replace the per-kind network cache with one sized from the origin's history.
+        from vlc_host.origins import MAX_CACHING_MS, MIN_CACHING_MS, origin_of
+        origin = origin_of(url)
+        caching = origin and self.origin_stats.network_caching(
+            origin, int(self.config.get("min_network_caching", MIN_CACHING_MS)),
+            int(self.config.get("max_network_caching", MAX_CACHING_MS)))
+        if not caching:
+            return options
+        return [option for option in options if not option.startswith(":network-caching=")] + \
+            [f":network-caching={caching}"]
+
+    async def handle_enqueue(self, message):
+        # Adds a list of URLs to the player's playlist, batch by batch as chunks arrive.
+        from vlc_host.chunked import iter_batches
+        player = self.get_player()
+        reply = {"success": True, "enqueued": 0}
+        async for batch in iter_batches(message.get("items")):
+            urls = [url for url in batch if isinstance(url, str) and url]
+            if urls:
+                reply.update(await self.run_blocking(player.enqueue, urls))
+                reply["enqueued"] += len(urls)
+        return reply
+
+    async def handle_dump(self, message):
+        # Every entry of the host's caches as [cache, key, value, expires_at], sent in chunks.
+        from vlc_host.chunked import ItemStream
+        names = [message["cache"]] if message.get("cache") else list(self.caches)
+        unknown = [name for name in names if name not in self.caches]
+        if unknown:
+            return {"success": False, "error": f"Unknown cache: {unknown[0]}"}
+
+        def entries():
+            for name in names:
+                for key, value in list(self.caches[name].entries.items()):
+                    yield [name, key] + list(value) if isinstance(value, tuple) else [name, key, value]
+        return {"success": True, "items": ItemStream(entries())}
+
+    async def handle_history(self, message):
+        # One URL's entry, the entries under a URL prefix, or the most recently opened.
+        if self.history is None or not await self.wait_for_history():
+            return {"success": False, "error": "History is off"}
+        limit = max(0, int(message.get("limit", 50)))
+        if message.get("url"):
+            item = self.history.get(message["url"])
+            items = [item] if item is not None else []
+        elif message.get("prefix"):
+            items = self.history.prefix(message["prefix"], limit)
+        else:
+            items = self.history.recent(limit)
+        return {"success": True, "items": items}
+
+    async def handle_ping(self, message):
+        reply = {"success": True, "pid": os.getpid(),
+                 "uptime": round(time.monotonic() - self.started_at, 3)}
+        if self.broker is not None:
+            reply["broker"] = self.broker.status()
+        return reply
+
+    async def handle_status(self, message):
+        # The players this host started: PID, URL, age, memory and CPU.
+        supervisor = self.get_supervisor()
+        if message.get("sample"):
+            await self.run_blocking(supervisor.sample_all)
+        return dict(supervisor.status(), success=True)
+
+    async def handle_stats(self, message):
+        reply = {"success": True, "caches": {name: cache.stats() for name, cache in self.caches.items()}}
+        dedupe = self.coalescer.stats() if self.coalescer is not None else {}
+        reply["dedupe"] = dict(dedupe, players_reused=self.players_reused)
+        if self.relay is not None:
+            reply["relay"] = self.relay.stats()
+        if self.prefetcher is not None:
+            reply["segments"] = self.prefetcher.stats()
+        if self.history is not None:
+            reply["history"] = self.history.stats()
+        if self.tracer is not None:
+            reply["tracing"] = self.tracer.stats()
+        return reply
+
+    def close(self):
+        if self.history is not None:
+            self.poll_position()
+        self.save_caches(force=True)
+        if self.player is not None:
+            self.player.close()
+        if self.supervisor is not None:
+            self.supervisor.close()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        if self.relay is not None:
+            self.relay.close()
+        if self.tracer is not None:
+            self.tracer.close()
+        self.executor.shutdown(wait=False)
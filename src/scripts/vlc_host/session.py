@@ -0,0 +1,233 @@
+"""One client connection to the host: framed requests in, replies out.
+
+``StdioSession`` serves Chrome over stdin/stdout; ``StreamSession`` serves a
+forwarding host over a broker socket. Both run every request as its own task
+against a shared ``HostService``. Acknowledgements and follow-up frames of
+chunked messages (see ``vlc_host.chunked``) are routed here, so handlers see
+an async iterator of item batches instead. With tracing on, each request's
+trace (see ``vlc_host.tracing``) is started when its frame header arrives and
+finished once the reply is written.
+"""
+import asyncio
+import sys
+import threading
+
+from vlc_host import tracing
+from vlc_host.chunked import IncomingChunks, ItemStream, OutgoingChunks
+from vlc_host.framing import HEADER, MAX_INCOMING_SIZE, FrameError, FrameReader, FrameWriter, decode_payload, encode_frame
+
+
+class Session:
+    def __init__(self, service):
+        self.service = service
+        self.tasks = set()
+        # Chunked requests being received and chunked replies being sent, by id.
+        self.incoming = {}
+        self.outgoing = {}
+
+    async def next_message(self):
+        # Returns (message, trace): the message is a ValueError for an
+        # undecodable one, or None at EOF; the trace is None without tracing.
+        raise NotImplementedError
+
+    async def send(self, reply):
+        raise NotImplementedError
+
+    async def run(self):
+        while True:
+            message, trace = await self.next_message()
+            if message is None:
+                break
+            if isinstance(message, dict) and not self.route_chunk(message):
+                continue
+            self.spawn(self.respond(message, trace))
+        for stream in list(self.incoming.values()) + list(self.outgoing.values()):
+            stream.close()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def route_chunk(self, message):
+        # Handles acknowledgements and follow-up chunks in place; returns True
+        # if the message still needs a task of its own.
+        message_id = message.get("id")
+        if "ack" in message:
+            stream = self.outgoing.get(message_id)
+            if stream is not None:
+                stream.ack(message["ack"])
+            return False
+        if "chunk" not in message:
+            return True
+        if message["chunk"] == 0:
+            if message_id is None or message_id in self.incoming:
+                message["chunk_error"] = "a chunked request needs an id of its own"
+                return True
+            stream = self.incoming[message_id] = IncomingChunks(message_id, self.send)
+            # The handler gets the first batch, like the rest, from the stream.
+            stream.feed(dict(message))
+            message["items"] = stream.batches()
+            return True
+        stream = self.incoming.get(message_id)
+        # Chunks of a request that was already answered are dropped.
+        if stream is not None:
+            try:
+                stream.feed(message)
+            except ValueError as e:
+                self.spawn(self.send({"success": False, "error": str(e), "id": message_id}))
+        return False
+
+    async def respond(self, message, trace=None):
+        # Runs as a task of its own, so the trace is only current for this request.
+        tracing.current.set(trace)
+        if isinstance(message, ValueError):
+            reply = {"success": False, "error": f"Invalid message: {message}"}
+        elif "chunk_error" in message:
+            reply = {"success": False, "error": message["chunk_error"], "id": message.get("id")}
+        else:
+            try:
+                reply = await self.service.handle(message)
+            finally:
+                if "chunk" in message:
+                    self.incoming.pop(message.get("id"), None)
+        started = tracing.now()
+        try:
+            await self.send_reply(reply)
+        except FrameError as e:
+            error = {"success": False, "error": str(e)}
+            if "id" in reply:
+                error["id"] = reply["id"]
+            await self.send(error)
+        if trace is not None:
+            trace.add("reply", started)
+            trace.request_id = reply.get("id")
+            trace.success = bool(reply.get("success"))
+            self.service.tracer.finish(trace)
+
+    async def send_reply(self, reply):
+        items = reply.get("items")
+        streamed = isinstance(items, ItemStream)
+        if streamed:
+            items = items.iterable
+        if "id" not in reply:
+            # Chunks can only be acknowledged by id, so this has to fit one frame.
+            return await self.send(dict(reply, items=list(items)) if streamed else reply)
+        if not streamed:
+            try:
+                return await self.send(reply)
+            except FrameError:
+                if not isinstance(items, list):
+                    raise
+                # Too big for one frame: send the items in chunks instead.
+        stream = self.outgoing[reply["id"]] = OutgoingChunks()
+        try:
+            head = {key: value for key, value in reply.items() if key != "items"}
+            await stream.send_reply(self.send, head, items)
+        finally:
+            del self.outgoing[reply["id"]]
+
+
+class StdioSession(Session):
+    def __init__(self, service, stdin=None, stdout=None):
+        super().__init__(service)
+        self.stdin = stdin or sys.stdin.buffer
+        self.writer = FrameWriter(stdout or sys.stdout.buffer)
+        self.queue = asyncio.Queue()
+
+    def _read_stdin(self, loop):
+        # Blocking reads on a thread: Windows event loops cannot wait on the
+        # anonymous pipes Chrome gives the host.
+        reader = FrameReader(self.stdin)
+        tracer = self.service.tracer
+        while True:
+            trace = None
+            try:
+                payload = reader.read_payload()
+                if payload is None:
+                    message = None
+                else:
+                    if tracer is not None:
+                        trace = tracer.start(reader.header_at)
+                        trace.lap("read")
+                    message = decode_payload(payload)
+                    if trace is not None:
+                        trace.lap("decode")
+            except FrameError:
+                message = None
+            except ValueError as e:
+                message = e
+            loop.call_soon_threadsafe(self.queue.put_nowait, (message, trace))
+            if message is None:
+                return
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._read_stdin, args=(loop,), daemon=True).start()
+        await super().run()
+
+    async def next_message(self):
+        return await self.queue.get()
+
+    async def send(self, reply):
+        self.writer.write_message(reply)
+
+
+async def read_header(reader, max_size=MAX_INCOMING_SIZE):
+    # The payload length of the next frame, or None at EOF.
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise FrameError("stream ended inside a frame header")
+        return None
+    length = HEADER.unpack(header)[0]
+    if length > max_size:
+        raise FrameError(f"frame of {length} bytes exceeds the {max_size} byte limit")
+    return length
+
+
+async def read_payload(reader, length):
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FrameError("stream ended inside a frame payload")
+
+
+async def read_frame(reader, max_size=MAX_INCOMING_SIZE):
+    length = await read_header(reader, max_size)
+    if length is None:
+        return None
+    return await read_payload(reader, length)
+
+
+class StreamSession(Session):
+    def __init__(self, service, reader, writer):
+        super().__init__(service)
+        self.reader = reader
+        self.writer = writer
+
+    async def next_message(self):
+        try:
+            length = await read_header(self.reader)
+            if length is None:
+                return None, None
+            trace = self.service.tracer.start() if self.service.tracer is not None else None
+            payload = await read_payload(self.reader, length)
+        except (FrameError, ConnectionError):
+            return None, None
+        if trace is not None:
+            trace.lap("read")
+        try:
+            message = decode_payload(payload)
+        except ValueError as e:
+            message = e
+        if trace is not None:
+            trace.lap("decode")
+        return message, trace
+
+    async def send(self, reply):
+        self.writer.write(encode_frame(reply))
+        await self.writer.drain()
@@ -0,0 +1,240 @@
+"""Supervision of the player processes the host starts.
+
+Every process a player spawns is registered with ``Supervisor.track``, which
+records its PID, start time and URL. A background thread reaps processes
+once they exit, so none are left as zombies in a long-lived host, and
+samples each one's resident memory and CPU use every ``interval`` seconds.
+With ``max_players`` set, starting one more player first closes players
+until it fits: idle ones (CPU below ``idle_cpu`` percent at the last
+sample) before busy ones, oldest first. Samples come from psutil when it is
+installed, otherwise from /proc on Linux or the Win32 API on Windows;
+elsewhere only PIDs, URLs and ages are reported.
+
+``on_exit`` is called with each player record once it has been reaped, and
+``on_sample`` after every round of samples, both from whichever thread did
+the work; the host uses them to keep playback positions.
+"""
+import os
+import threading
+import time
+
+DEFAULT_INTERVAL = 5.0
+DEFAULT_IDLE_CPU = 1.0
+# Seconds a closed player gets to exit before it is killed.
+CLOSE_TIMEOUT = 2.0
+
+_psutil = None
+
+
+def sample(pid):
+    # (rss_kb, cpu_seconds) of a running process, or None.
+    global _psutil
+    if _psutil is None:
+        try:
+            import psutil as _psutil
+        except ImportError:
+            _psutil = False
+    if _psutil:
+        try:
+            process = _psutil.Process(pid)
+            times = process.cpu_times()
+            return process.memory_info().rss // 1024, times.user + times.system
+        except _psutil.Error:
+            return None
+    if os.name == "nt":
+        return _sample_windows(pid)
+    return _sample_proc(pid)
+
+
+def _sample_proc(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    # utime and stime are the 14th and 15th fields of stat; the first two end at ")".
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+    return rss_pages * os.sysconf("SC_PAGE_SIZE") // 1024, cpu_seconds
+
+
+def _sample_windows(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    class MemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+            [(name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return None
+    try:
+        counters = MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb) or \
+                not kernel32.GetProcessTimes(handle, *[ctypes.byref(value) for value in times]):
+            return None
+    finally:
+        kernel32.CloseHandle(handle)
+    # FILETIME counts 100 ns units; kernel and user time are the last two.
+    cpu = sum((value.dwHighDateTime << 32 | value.dwLowDateTime) for value in times[2:]) / 1e7
+    return counters.WorkingSetSize // 1024, cpu
+
+
+class PlayerRecord:
+    def __init__(self, process, url, role):
+        self.process = process
+        self.pid = process.pid
+        self.url = url
+        self.role = role
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.rss_kb = None
+        self.peak_rss_kb = None
+        self.cpu_seconds = None
+        self.cpu_percent = None
+        self.sampled = None
+        self.closing = False
+
+    def status(self):
+        return {
+            "pid": self.pid,
+            "url": self.url,
+            "role": self.role,
+            "started_at": round(self.started_at, 3),
+            "age": round(time.monotonic() - self.started, 1),
+            "rss_kb": self.rss_kb,
+            "peak_rss_kb": self.peak_rss_kb,
+            "cpu_percent": self.cpu_percent,
+            "closing": self.closing,
+        }
+
+
+class Supervisor:
+    def __init__(self, max_players=0, interval=DEFAULT_INTERVAL, idle_cpu=DEFAULT_IDLE_CPU, sampler=sample):
+        self.max_players = max_players
+        self.interval = interval
+        self.idle_cpu = idle_cpu
+        self.sampler = sampler
+        self.records = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started = 0
+        self.reaped = 0
+        self.closed = 0
+        self.on_exit = None
+        self.on_sample = None
+
+    def track(self, process, url, role="player"):
+        # Records a process just started; "helper" processes (hand-offs to
+        # a running VLC) are reaped but don't count towards the cap.
+        record = PlayerRecord(process, url, role)
+        with self.lock:
+            self.records[record.pid] = record
+            self.started += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="vlc_host_supervisor", daemon=True)
+                self.thread.start()
+        return record
+
+    def make_room(self):
+        # Called before a player starts: closes players until one more fits under the cap.
+        if not self.max_players:
+            return []
+        self.reap()
+        with self.lock:
+            live = [record for record in self.records.values() if record.role == "player" and not record.closing]
+            excess = len(live) + 1 - self.max_players
+            if excess <= 0:
+                return []
+            victims = sorted(live, key=lambda record: (not self.is_idle(record), record.started))[:excess]
+            for record in victims:
+                record.closing = True
+            self.closed += len(victims)
+        for record in victims:
+            self.close_player(record)
+        return victims
+
+    def is_idle(self, record):
+        return record.cpu_percent is not None and record.cpu_percent < self.idle_cpu
+
+    def close_player(self, record):
+        try:
+            record.process.terminate()
+        except OSError:
+            return
+        threading.Thread(target=self._wait_or_kill, args=(record,), daemon=True).start()
+
+    def _wait_or_kill(self, record):
+        import subprocess
+        try:
+            record.process.wait(CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            record.process.kill()
+            record.process.wait()
+        self.reap()
+
+    def reap(self):
+        # Collects the exit status of finished processes (poll() reaps them) and forgets them.
+        with self.lock:
+            records = list(self.records.values())
+        finished = [record for record in records if record.process.poll() is not None]
+        if finished:
+            with self.lock:
+                finished = [record for record in finished if self.records.pop(record.pid, None) is not None]
+                self.reaped += len(finished)
+            if self.on_exit is not None:
+                for record in finished:
+                    self.on_exit(record)
+        return finished
+
+    def sample_all(self):
+        with self.lock:
+            records = list(self.records.values())
+        for record in records:
+            result = self.sampler(record.pid)
+            if result is None:
+                continue
+            now = time.monotonic()
+            rss_kb, cpu_seconds = result
+            if record.cpu_seconds is not None and now > record.sampled:
+                record.cpu_percent = round(100 * (cpu_seconds - record.cpu_seconds) / (now - record.sampled), 1)
+            record.rss_kb = rss_kb
+            record.peak_rss_kb = max(rss_kb, record.peak_rss_kb or 0)
+            record.cpu_seconds = cpu_seconds
+            record.sampled = now
+
+    def _run(self):
+        while True:
+            self.reap()
+            self.sample_all()
+            if self.on_sample is not None:
+                self.on_sample()
+            if self.stopped.wait(self.interval):
+                return
+
+    def status(self):
+        self.reap()
+        with self.lock:
+            records = sorted(self.records.values(), key=lambda record: record.started)
+            return {
+                "players": [record.status() for record in records],
+                "live": sum(1 for record in records if record.role == "player"),
+                "max_players": self.max_players,
+                "rss_kb": sum(record.rss_kb or 0 for record in records),
+                "started": self.started,
+                "reaped": self.reaped,
+                "closed": self.closed,
+            }
+
+    def close(self):
+        # Stops sampling; players keep running after the host exits.
+        self.stopped.set()
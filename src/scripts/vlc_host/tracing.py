@@ -0,0 +1,309 @@
+"""Per-request stage timings, a rotating trace log and latency histograms.
+
+A request gets a ``Trace`` as soon as its frame header has been read; the
+code it passes through adds the time spent in each stage (read, decode,
+queue, validate, resolve, probe, relay, spawn, reply) from
+``time.perf_counter_ns``. The session hands the finished trace to the
+``Tracer``, which only appends it to a deque, so a request pays for a few
+clock reads and nothing else. A background thread drains the deque every
+``interval`` seconds: it updates one histogram per stage, appends a JSON line
+per request to a size-rotated log and rewrites the Prometheus metrics file.
+``stats`` and the metrics endpoint drain first, so they are always current.
+"""
+import bisect
+import collections
+import contextvars
+import json
+import os
+import threading
+import time
+
+now = time.perf_counter_ns
+
+# Upper bounds of the histogram buckets, in microseconds.
+BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000,
+              100000, 250000, 500000, 1000000, 2500000, 5000000, 10000000)
+DEFAULT_LOG_BYTES = 1024 * 1024
+DEFAULT_LOG_BACKUPS = 3
+DEFAULT_INTERVAL = 1.0
+
+_encode_json = json.JSONEncoder(separators=(",", ":")).encode
+
+# The trace of the request the current task is handling, if any.
+current = contextvars.ContextVar("vlc_host_trace", default=None)
+
+
+class Trace:
+    # Kept to a list append and a clock read per stage; everything else
+    # happens when the tracer drains it.
+    __slots__ = ("started", "last", "stages", "action", "request_id", "success")
+
+    def __init__(self, started=None):
+        self.started = self.last = started or now()
+        # (stage, ns) in the order they ended; a stage can occur more than once.
+        self.stages = []
+        self.action = None
+        self.request_id = None
+        self.success = None
+
+    def add(self, stage, started):
+        # Records the time since started.
+        self.last = end = now()
+        self.stages.append((stage, end - started))
+
+    def lap(self, stage):
+        # Records the time since the previous stage ended.
+        end = now()
+        self.stages.append((stage, end - self.last))
+        self.last = end
+
+    def stage_totals(self):
+        totals = {}
+        for stage, ns in self.stages:
+            totals[stage] = totals.get(stage, 0) + ns
+        return totals
+
+    def record(self, totals, wall):
+        return {
+            "t": round(wall, 3),
+            "id": self.request_id,
+            "action": self.action,
+            "success": self.success,
+            "total_us": (self.last - self.started) // 1000,
+            "stages_us": {stage: ns // 1000 for stage, ns in totals.items()},
+        }
+
+
+# The same as Trace.add and Trace.lap on the current trace, if any; inlined
+# since the host calls them on every request.
+def add(stage, started):
+    trace = current.get()
+    if trace is not None:
+        trace.last = end = now()
+        trace.stages.append((stage, end - started))
+
+
+def lap(stage):
+    trace = current.get()
+    if trace is not None:
+        end = now()
+        trace.stages.append((stage, end - trace.last))
+        trace.last = end
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        # One count per bucket, plus one for values above the last bound.
+        self.counts = [0] * (len(BUCKETS_US) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, us):
+        self.counts[bisect.bisect_left(BUCKETS_US, us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, fraction):
+        # The upper bound of the bucket the percentile falls in.
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(BUCKETS_US[index], self.max) if index < len(BUCKETS_US) else self.max
+        return 0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count, 1) if self.count else 0,
+            "p50_us": self.percentile(0.5),
+            "p95_us": self.percentile(0.95),
+            "p99_us": self.percentile(0.99),
+            "max_us": self.max,
+        }
+
+
+class RotatingLog:
+    """Appends lines to a file, renaming it to ``path.1`` (and so on) past ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=DEFAULT_LOG_BYTES, backups=DEFAULT_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        try:
+            self.size = os.path.getsize(path)
+        except OSError:
+            self.size = 0
+
+    def write(self, lines):
+        # A batch that does not fit is split across files at line boundaries.
+        chunk, chunk_size = [], 0
+        for line in lines:
+            data = line.encode("utf-8")
+            if self.size + chunk_size + len(data) > self.max_bytes and (self.size or chunk_size):
+                self._append(chunk, chunk_size)
+                self.rotate()
+                chunk, chunk_size = [], 0
+            chunk.append(data)
+            chunk_size += len(data)
+        self._append(chunk, chunk_size)
+
+    def _append(self, chunk, size):
+        if not chunk:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(b"".join(chunk))
+        self.size += size
+
+    def rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.size = 0
+
+
+class Tracer:
+    def __init__(self, log_path=None, log_bytes=DEFAULT_LOG_BYTES, log_backups=DEFAULT_LOG_BACKUPS,
+                 metrics_path=None, interval=DEFAULT_INTERVAL):
+        self.log = RotatingLog(log_path, log_bytes, log_backups) if log_path else None
+        self.metrics_path = metrics_path
+        self.interval = interval
+        self.pending = collections.deque()
+        self.histograms = {}
+        # (action, "success" or "error") -> requests.
+        self.requests = collections.Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.server = None
+        self.log_errors = 0
+
+    def start(self, started=None):
+        return Trace(started)
+
+    def finish(self, trace):
+        self.pending.append(trace)
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="vlc_host_tracer", daemon=True)
+                    self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        # Folds finished traces into the histograms, the log and the metrics file.
+        with self.lock:
+            if not self.pending:
+                return
+            lines = []
+            # Wall-clock start times are worked out here rather than read per request.
+            wall_offset = time.time() - now() / 1e9
+            while self.pending:
+                trace = self.pending.popleft()
+                totals = trace.stage_totals()
+                self.observe("total", (trace.last - trace.started) // 1000)
+                for stage, ns in totals.items():
+                    self.observe(stage, ns // 1000)
+                self.requests[(trace.action or "invalid", "success" if trace.success else "error")] += 1
+                if self.log is not None:
+                    lines.append(_encode_json(trace.record(totals, wall_offset + trace.started / 1e9)) + "\n")
+            try:
+                if lines:
+                    self.log.write(lines)
+                if self.metrics_path:
+                    self.write_metrics(self.metrics_path)
+            except OSError:
+                self.log_errors += 1
+
+    def observe(self, stage, us):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        histogram.observe(us)
+
+    def stats(self):
+        self.drain()
+        with self.lock:
+            return {
+                "requests": {f"{action}/{result}": count for (action, result), count in sorted(self.requests.items())},
+                "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+                "log_errors": self.log_errors,
+            }
+
+    def prometheus(self):
+        # The request counters and stage histograms in the Prometheus text format.
+        lines = [
+            "# HELP vlc_host_requests_total Requests handled, by action and result.",
+            "# TYPE vlc_host_requests_total counter",
+        ]
+        for (action, result), count in sorted(self.requests.items()):
+            lines.append(f'vlc_host_requests_total{{action="{action}",result="{result}"}} {count}')
+        lines += [
+            "# HELP vlc_host_request_stage_seconds Time requests spent in each stage.",
+            "# TYPE vlc_host_request_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            seen = 0
+            for bound, count in zip(BUCKETS_US + ("+Inf",), histogram.counts):
+                seen += count
+                le = bound if bound == "+Inf" else repr(bound / 1e6)
+                lines.append(f'vlc_host_request_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {seen}')
+            lines.append(f'vlc_host_request_stage_seconds_sum{{stage="{stage}"}} {histogram.total / 1e6!r}')
+            lines.append(f'vlc_host_request_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        # Written whole and renamed into place, so a scraper never reads half a file.
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temporary, path)
+
+    def serve_metrics(self, port):
+        # GET http://127.0.0.1:<port>/metrics, on a thread of its own.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.partition("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                tracer.drain()
+                with tracer.lock:
+                    body = tracer.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="vlc_host_metrics", daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        self.stopped.set()
+        self.drain()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
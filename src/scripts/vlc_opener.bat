@@ -1,2 +1 @@
-@echo off
-"{sys.executable}" "{os.path.join(SCRIPTS_DIR, 'vlc_opener.py')}"
\ No newline at end of file
+@"{sys.executable}" -I -S "{os.path.join(SCRIPTS_DIR, 'vlc_opener.py')}" %*
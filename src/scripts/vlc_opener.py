@@ -1,38 +1,95 @@
 import sys
 import json
-import struct
-import subprocess
 import os
 
-VLC_PATH = r"{vlc_path}"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# The launcher runs Python with -I, which leaves the script directory off sys.path.
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
 
-def get_message():
-    raw_length = sys.stdin.buffer.read(4)
-    if len(raw_length) == 0:
-        sys.exit(0)
-    message_length = struct.unpack('=I', raw_length)[0]
-    message = sys.stdin.buffer.read(message_length).decode('utf-8')
-    return json.loads(message)
+CONFIG_PATH = os.environ.get("VLC_OPENER_CONFIG", os.path.join(SCRIPT_DIR, "vlc_opener.json"))
 
-def send_message(message):
-    encoded_content = json.dumps(message).encode('utf-8')
-    encoded_length = struct.pack('=I', len(encoded_content))
-    sys.stdout.buffer.write(encoded_length)
-    sys.stdout.buffer.write(encoded_content)
-    sys.stdout.buffer.flush()
+def load_config():
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def main():
-    message = get_message()
-    url = message.get("url")
-    
-    if url:
-        try:
-            subprocess.Popen([VLC_PATH, url])
-            send_message({{"success": True}})
-        except Exception as e:
-            send_message({{"success": False, "error": str(e)}})
+CONFIG = load_config()
+# Caches, history and the broker token live next to the scripts directory.
+STATE_DIR = CONFIG.get("state_dir") or os.path.join(os.path.dirname(SCRIPT_DIR), "state")
+
+async def serve_stdio():
+    from vlc_host.service import HostService
+    from vlc_host.session import StdioSession
+    service = HostService(CONFIG, STATE_DIR)
+    try:
+        await StdioSession(service).run()
+    finally:
+        service.close()
+
+async def serve_broker():
+    from vlc_host.broker import DEFAULT_IDLE_TIMEOUT, BrokerDaemon
+    from vlc_host.service import HostService
+    service = HostService(CONFIG, STATE_DIR)
+    daemon = BrokerDaemon(service, STATE_DIR,
+                          port=int(CONFIG.get("broker_port", 0)),
+                          idle_timeout=float(CONFIG.get("broker_idle_timeout", DEFAULT_IDLE_TIMEOUT)))
+    try:
+        await daemon.serve()
+    finally:
+        service.close()
+
+def forward_to_broker():
+    # Returns False when no broker can be reached, so this process serves Chrome itself.
+    from vlc_host import broker
+    try:
+        sock = broker.ensure_broker(STATE_DIR, int(CONFIG.get("broker_port", 0)) or broker.default_port(),
+                                    os.path.abspath(__file__))
+    except broker.BrokerUnavailable:
+        return False
+    broker.forward(sock)
+    return True
+
+def origins_command(args):
+    # vlc_opener.py --origins [dump | reset [ORIGIN]]
+    from vlc_host.origins import OriginStats
+    path = os.path.join(STATE_DIR, "origin_stats.json")
+    stats = OriginStats(max_origins=int(CONFIG.get("origin_stats_size", 256)))
+    stats.load(path)
+    command = args[0] if args else "dump"
+    if command == "dump":
+        report = {origin: dict(entry, network_caching=stats.network_caching(origin))
+                  for origin, entry in stats.dump().items()}
+        print(json.dumps(report, indent=2))
+    elif command == "reset":
+        if not stats.reset(args[1] if len(args) > 1 else None):
+            print(f"No statistics for {args[1]}", file=sys.stderr)
+            return 1
+        stats.save(path)
     else:
-        send_message({{"success": False, "error": "No URL provided"}})
+        print("usage: vlc_opener.py --origins [dump | reset [ORIGIN]]", file=sys.stderr)
+        return 2
+    return 0
+
+def main():
+    # Chrome passes the caller's origin (and --parent-window on Windows);
+    # only our own flags matter here.
+    if sys.argv[1:2] == ["--origins"]:
+        sys.exit(origins_command(sys.argv[2:]))
+    if "--broker-daemon" in sys.argv[1:]:
+        import asyncio
+        asyncio.run(serve_broker())
+        return
+    if CONFIG.get("broker") and forward_to_broker():
+        return
+    import asyncio
+    try:
+        asyncio.run(serve_stdio())
+    except BrokenPipeError:
+        # Chrome went away before reading a reply.
+        pass
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
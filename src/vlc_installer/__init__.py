@@ -0,0 +1 @@
+"""Components of the VLC Streamer installer (``vlc_streamer_installer.py``)."""
@@ -0,0 +1,5 @@
+import sys
+
+from vlc_installer.cli import main
+
+sys.exit(main())
@@ -0,0 +1,127 @@
+"""Installing without the window, for scripts and fleet deployment.
+
+    python -m vlc_installer --vlc-path "C:\\Program Files\\VideoLAN\\VLC\\vlc.exe" \\
+        --extension-id abcdefghijklmnopabcdefghijklmnop
+    vlc_streamer_installer.exe --config install.json --output result.json
+
+Options can also come from a JSON config file whose keys are the long
+option names with underscores (``vlc_path``, ``extension_id``, ``target``,
+...); options on the command line win. Nothing is ever asked: without a VLC
+path the backend looks for VLC, and anything still missing is an error. No
+elevation is needed, as everything goes to the user's own directories.
+
+The result is a single JSON object on stdout, and in ``--output`` if given
+(a windowed installer has no stdout): ``ok``, the backend, the paths used,
+where the host was registered, each step's timing and the files written,
+left alone and removed. The exit status is 0 on success, 1 when the install
+failed and was rolled back, 2 for bad arguments.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from vlc_installer import effects, install, steps
+
+# Chrome extension IDs are 32 letters from a to p.
+EXTENSION_ID_PATTERN = re.compile(r"^[a-p]{32}$")
+CONFIG_KEYS = ("vlc_path", "extension_id", "target", "python_path", "resources", "backend", "force", "workers")
+# Any of these on the command line asks for a headless install rather than the window.
+HEADLESS_OPTIONS = {"--" + key.replace("_", "-") for key in CONFIG_KEYS} | {"--config", "--output", "--help", "-h"}
+
+
+class UsageError(Exception):
+    pass
+
+
+class Parser(argparse.ArgumentParser):
+    def error(self, message):
+        raise UsageError(message)
+
+
+def parse_args(argv):
+    parser = Parser(prog="vlc_installer", description=__doc__.splitlines()[0])
+    parser.add_argument("--config", help="JSON file with any of the options below")
+    parser.add_argument("--vlc-path", help="VLC executable; looked for if not given")
+    parser.add_argument("--extension-id", help="ID of the loaded extension, allowed to talk to the host")
+    parser.add_argument("--target", help="install directory (default: the backend's)")
+    parser.add_argument("--python-path", help="Python that runs the host (default: this one)")
+    parser.add_argument("--resources", help="directory with extension/ and scripts/ (default: bundled)")
+    parser.add_argument("--backend", choices=sorted(effects.BACKENDS), help="default: this platform's")
+    parser.add_argument("--force", action="store_true", default=None, help="rewrite every file")
+    parser.add_argument("--workers", type=int, help=f"steps run at once (default {steps.DEFAULT_WORKERS})")
+    parser.add_argument("--output", help="also write the JSON result here")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        try:
+            with open(args.config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            raise UsageError(f"Cannot read config {args.config}: {e}")
+        if not isinstance(config, dict):
+            raise UsageError(f"Config {args.config} must be a JSON object")
+        unknown = sorted(set(config) - set(CONFIG_KEYS))
+        if unknown:
+            raise UsageError(f"Unknown config keys: {', '.join(unknown)}")
+        for key, value in config.items():
+            if getattr(args, key) is None:
+                setattr(args, key, value)
+    return args
+
+
+def is_headless(argv):
+    # Other arguments (e.g. what a relaunch might add) still get the window.
+    return any(arg.partition("=")[0] in HEADLESS_OPTIONS for arg in argv)
+
+
+def default_resources():
+    # PyInstaller unpacks --add-data files to _MEIPASS; from a checkout they sit next to the package.
+    return getattr(sys, "_MEIPASS", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(args):
+    backend = effects.default_effects(args.backend)
+    target = os.path.abspath(args.target or backend.default_app_dir())
+    resources = args.resources or default_resources()
+    if not os.path.isfile(os.path.join(resources, "extension", "background.js")):
+        raise UsageError(f"No extension/ and scripts/ under {resources}; pass --resources")
+    vlc_path = args.vlc_path or backend.find_vlc()
+    if not vlc_path:
+        raise UsageError("VLC not found; pass --vlc-path")
+    if args.extension_id and not EXTENSION_ID_PATTERN.match(args.extension_id):
+        raise UsageError(f"Not a Chrome extension ID: {args.extension_id!r}")
+    python_path = args.python_path or (backend.find_python() if getattr(sys, "frozen", False) else sys.executable)
+    if not python_path:
+        raise UsageError("Python 3.9+ not found; pass --python-path")
+
+    result = {"backend": backend.name, "target": target, "vlc_path": vlc_path, "python_path": python_path,
+              "extension_id": args.extension_id}
+    try:
+        report = install.install(backend, target, resources, vlc_path, python_path, force=bool(args.force),
+                                 extension_id=args.extension_id, workers=args.workers or steps.DEFAULT_WORKERS)
+    except steps.StepError as e:
+        return 1, dict(result, ok=False, error=str(e), step=e.step, **e.report)
+    summary = report.pop("files")
+    result.update(ok=True, registered=backend.registered_paths(), **report)
+    result["files"] = {"written": len(summary["written"]), "unchanged": summary["unchanged"],
+                       "removed": len(summary["removed"])}
+    return 0, result
+
+
+def main(argv=None):
+    output = None
+    try:
+        args = parse_args(sys.argv[1:] if argv is None else argv)
+        output = args.output
+        status, result = run(args)
+    except (UsageError, ValueError) as e:
+        status, result = 2, {"ok": False, "error": str(e)}
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if sys.stdout is not None:
+        print(text)
+    return status
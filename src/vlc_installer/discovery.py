@@ -0,0 +1,335 @@
+"""Finding VLC, Chrome and Python on the machine.
+
+``Discovery.run`` runs every probe for every product at once on a thread
+pool: registry App Paths, uninstall keys, the Python launcher's PythonCore
+keys, both Program Files roots (and the per-user programs directory), and
+PATH. Uninstall entries are read once per run, in parallel, and shared by
+all three products. Each executable found is reported to ``on_found`` as
+soon as its version is known, from a worker thread. Candidates are ranked
+by version, then by how reliable the probe that found them is. Versions
+are cached with each file's modification time in a JSON file, so a
+relaunch still probes everywhere (a program installed since is found) but
+reads no version resource of a file that has not changed.
+
+Probes reach the machine only through ``Discovery.system``:
+``WindowsSystem`` is the real one (``winreg`` and the version resource API,
+imported when first used), and anything with the same methods, such as a
+fake filesystem and registry, can stand in for it.
+"""
+import json
+import ntpath
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 8
+APP_PATHS = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths"
+UNINSTALL_KEYS = (
+    ("HKLM", r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"),
+    ("HKLM", r"SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall"),
+    ("HKCU", r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall"),
+)
+PYTHON_CORE_KEYS = (
+    ("HKCU", r"SOFTWARE\Python\PythonCore"),
+    ("HKLM", r"SOFTWARE\Python\PythonCore"),
+    ("HKLM", r"SOFTWARE\WOW6432Node\Python\PythonCore"),
+)
+# Directories searched under each Program Files root, by environment variable.
+PROGRAM_ROOTS = ("ProgramFiles", "ProgramFiles(x86)", "ProgramW6432", "LOCALAPPDATA")
+# Earlier sources win between candidates of the same version.
+SOURCES = ("app_paths", "python_core", "uninstall", "program_files", "path")
+
+
+def parse_version(text):
+    # "3.11.4" -> (3, 11, 4); None if there is no leading number.
+    parts = []
+    for part in str(text or "").strip().split("."):
+        digits = ""
+        for char in part:
+            if not char.isdigit():
+                break
+            digits += char
+        if not digits:
+            break
+        parts.append(int(digits))
+        if len(digits) < len(part):
+            break
+    return tuple(parts) or None
+
+
+class Product:
+    def __init__(self, name, exe, display_name, relative_paths):
+        self.name = name
+        self.exe = exe
+        # Uninstall entries whose DisplayName starts with this.
+        self.display_name = display_name
+        # Paths of the executable below the PROGRAM_ROOTS; "*" matches one directory.
+        self.relative_paths = relative_paths
+
+
+PRODUCTS = {
+    "vlc": Product("vlc", "vlc.exe", "VLC media player", (r"VideoLAN\VLC\vlc.exe",)),
+    "chrome": Product("chrome", "chrome.exe", "Google Chrome", (r"Google\Chrome\Application\chrome.exe",)),
+    "python": Product("python", "python.exe", "Python 3", (r"Python3*\python.exe", r"Programs\Python\Python3*\python.exe")),
+}
+
+
+class Candidate:
+    __slots__ = ("product", "path", "version", "source")
+
+    def __init__(self, product, path, version, source):
+        self.product = product
+        self.path = path
+        self.version = version
+        self.source = source
+
+    def rank(self):
+        return (self.version or (), -SOURCES.index(self.source))
+
+    def to_dict(self):
+        return {"product": self.product, "path": self.path,
+                "version": ".".join(map(str, self.version)) if self.version else None, "source": self.source}
+
+
+class WindowsSystem:
+    """The registry, filesystem and environment of this Windows machine."""
+
+    def environ(self, name):
+        return os.environ.get(name)
+
+    def mtime(self, path):
+        # Modification time in ns, or None if path is not a file.
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns if not os.path.isdir(path) else None
+
+    def listdir(self, path):
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+    def _open_key(self, hive, key):
+        import winreg
+        root = winreg.HKEY_LOCAL_MACHINE if hive == "HKLM" else winreg.HKEY_CURRENT_USER
+        # The 64-bit view, even from a 32-bit installer; WOW6432Node paths are explicit.
+        return winreg.OpenKey(root, key, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY)
+
+    def registry_value(self, hive, key, name=""):
+        import winreg
+        try:
+            with self._open_key(hive, key) as handle:
+                return winreg.QueryValueEx(handle, name)[0]
+        except OSError:
+            return None
+
+    def registry_subkeys(self, hive, key):
+        import winreg
+        try:
+            with self._open_key(hive, key) as handle:
+                return [winreg.EnumKey(handle, index) for index in range(winreg.QueryInfoKey(handle)[0])]
+        except OSError:
+            return []
+
+    def file_version(self, path):
+        # The FILEVERSION of an executable's version resource, as a tuple.
+        import ctypes
+        from ctypes import wintypes
+        version = ctypes.windll.version
+        size = version.GetFileVersionInfoSizeW(path, None)
+        if not size:
+            return None
+        data = ctypes.create_string_buffer(size)
+        if not version.GetFileVersionInfoW(path, 0, size, data):
+            return None
+        pointer, length = ctypes.c_void_p(), wintypes.UINT()
+        if not version.VerQueryValueW(data, "\\", ctypes.byref(pointer), ctypes.byref(length)) or not length.value:
+            return None
+        # VS_FIXEDFILEINFO: signature, struct version, then FileVersionMS and FileVersionLS.
+        fields = ctypes.cast(pointer, ctypes.POINTER(wintypes.DWORD * 4)).contents
+        return (fields[2] >> 16, fields[2] & 0xFFFF, fields[3] >> 16, fields[3] & 0xFFFF)
+
+
+def probe_app_paths(finder, product):
+    for hive in ("HKCU", "HKLM"):
+        path = finder.system.registry_value(hive, f"{APP_PATHS}\\{product.exe}")
+        if path:
+            yield path.strip('"'), None
+
+
+def probe_uninstall(finder, product):
+    system = finder.system
+    for hive, key, name in finder.uninstall_entries():
+        if not isinstance(name, str) or not name.startswith(product.display_name):
+            continue
+        version = parse_version(system.registry_value(hive, key, "DisplayVersion"))
+        location = system.registry_value(hive, key, "InstallLocation")
+        if location:
+            yield ntpath.join(location.strip('"'), product.exe), version
+        icon = system.registry_value(hive, key, "DisplayIcon")
+        if icon:
+            # "C:\...\vlc.exe,0" or a quoted path.
+            icon = icon.rsplit(",", 1)[0] if icon.rsplit(",", 1)[-1].strip().lstrip("-").isdigit() else icon
+            icon = icon.strip().strip('"')
+            if ntpath.basename(icon).lower() == product.exe:
+                yield icon, version
+
+
+def probe_python_core(finder, product):
+    if product.name != "python":
+        return
+    system = finder.system
+    for hive, root in PYTHON_CORE_KEYS:
+        for tag in system.registry_subkeys(hive, root):
+            key = f"{root}\\{tag}\\InstallPath"
+            path = system.registry_value(hive, key, "ExecutablePath")
+            if not path:
+                directory = system.registry_value(hive, key)
+                path = directory and ntpath.join(directory, product.exe)
+            if path:
+                yield path, parse_version(tag)
+
+
+def probe_program_files(finder, product):
+    roots = []
+    for variable in PROGRAM_ROOTS:
+        root = finder.system.environ(variable)
+        if root and root.lower() not in roots:
+            roots.append(root.lower())
+            for relative in product.relative_paths:
+                yield from expand(finder.system, root, relative.split("\\"))
+
+
+def expand(system, directory, parts):
+    # Paths below directory matching parts, where "Name*" matches by prefix.
+    if not parts:
+        yield directory, None
+        return
+    head, rest = parts[0], parts[1:]
+    if head.endswith("*"):
+        for name in system.listdir(directory):
+            if name.lower().startswith(head[:-1].lower()):
+                yield from expand(system, ntpath.join(directory, name), rest)
+    else:
+        yield from expand(system, ntpath.join(directory, head), rest)
+
+
+def probe_path(finder, product):
+    for directory in (finder.system.environ("PATH") or "").split(";"):
+        directory = directory.strip().strip('"')
+        if directory:
+            yield ntpath.join(directory, product.exe), None
+
+
+PROBES = (
+    ("app_paths", probe_app_paths),
+    ("python_core", probe_python_core),
+    ("uninstall", probe_uninstall),
+    ("program_files", probe_program_files),
+    ("path", probe_path),
+)
+
+
+class Discovery:
+    def __init__(self, system=None, cache_path=None, workers=DEFAULT_WORKERS):
+        self.system = system or WindowsSystem()
+        self.cache_path = cache_path
+        self.workers = workers
+        self.lock = threading.Lock()
+        # Normalized path -> [mtime_ns, version list or None], from earlier runs.
+        self.versions = {}
+        if cache_path:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    self.versions = dict(json.load(f).get("versions", {}))
+            except (OSError, ValueError, AttributeError):
+                pass
+        self.found = {}
+        self.seen = set()
+        self.uninstall = None
+        self.uninstall_lock = threading.Lock()
+
+    def run(self, products=tuple(PRODUCTS), on_found=None, refresh=False):
+        # Returns {product: [Candidate, best first]}. refresh reads every version again.
+        self.found = {name: [] for name in products}
+        self.seen = set()
+        self.uninstall = None
+        if refresh:
+            self.versions = {}
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="discovery") as pool:
+            for name in products:
+                for source, probe in PROBES:
+                    pool.submit(self.run_probe, PRODUCTS[name], source, probe, on_found)
+        for candidates in self.found.values():
+            candidates.sort(key=Candidate.rank, reverse=True)
+        self.save()
+        return self.found
+
+    def uninstall_entries(self):
+        # (hive, key, DisplayName) of every uninstall entry, read once per run and shared by all products.
+        with self.uninstall_lock:
+            if self.uninstall is None:
+                keys = [(hive, f"{root}\\{subkey}") for hive, root in UNINSTALL_KEYS
+                        for subkey in self.system.registry_subkeys(hive, root)]
+                # A pool of its own: the probe asking may hold the run's last free worker.
+                with ThreadPoolExecutor(self.workers, thread_name_prefix="discovery-uninstall") as pool:
+                    names = list(pool.map(lambda entry: self.system.registry_value(*entry, "DisplayName"), keys))
+                self.uninstall = [(hive, key, name) for (hive, key), name in zip(keys, names)]
+            return self.uninstall
+
+    def run_probe(self, product, source, probe, on_found):
+        try:
+            for path, version in probe(self, product):
+                self.consider(product, path, version, source, on_found)
+        except Exception:
+            # One broken probe (a malformed key, an unreadable directory) must not stop the rest.
+            pass
+
+    def consider(self, product, path, version, source, on_found):
+        path = ntpath.normpath(path)
+        key = path.lower()
+        with self.lock:
+            if (product.name, key) in self.seen:
+                return
+            self.seen.add((product.name, key))
+        mtime = self.system.mtime(path)
+        if mtime is None:
+            return
+        cached = self.versions.get(key)
+        if cached and cached[0] == mtime and cached[1]:
+            version = tuple(cached[1])
+        else:
+            # Registry versions can be partial or stale after an in-place update; the file says what it is.
+            try:
+                version = self.system.file_version(path) or version
+            except Exception:
+                pass
+        with self.lock:
+            self.versions[key] = [mtime, list(version) if version else None]
+        self.add(Candidate(product.name, path, version, source), on_found)
+
+    def add(self, candidate, on_found):
+        with self.lock:
+            self.found[candidate.product].append(candidate)
+        if on_found is not None:
+            on_found(candidate)
+
+    def best(self, product, min_version=None):
+        for candidate in sorted(self.found.get(product, ()), key=Candidate.rank, reverse=True):
+            if min_version is None or (candidate.version or ()) >= tuple(min_version):
+                return candidate
+        return None
+
+    def save(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            temporary = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump({"versions": self.versions}, f)
+            os.replace(temporary, self.cache_path)
+        except OSError:
+            pass
@@ -0,0 +1,286 @@
+"""Resumable, checksum-verified downloads with a shared cache.
+
+``Downloader.fetch`` streams a URL in chunks into a partial file in the cache
+directory. When the connection drops it carries on from the last byte written
+with an HTTP range request, giving up after ``retries`` failures in a row
+without progress; a later run resumes the same partial file as long as the
+server still reports the same length and ETag (or Last-Modified). When the
+server accepts ranges and the file is at least ``MIN_PARALLEL_BYTES``,
+``parallel`` connections fetch separate ranges of it at once. The finished
+file is checked against the expected SHA-256 and stored under its digest
+(``<cache>/sha256/<digest><ext>``); ``index.json`` maps URLs to digests, so a
+later install, or another one sharing the cache directory, finds it without
+touching the network. A cached file is hashed again on every hit, and one
+that no longer matches its digest is deleted and downloaded again. ``progress(done, total)`` is called from the
+downloading threads as bytes arrive.
+"""
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+CHUNK_SIZE = 256 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_TIMEOUT = 30.0
+MIN_PARALLEL_BYTES = 4 * 1024 * 1024
+# Partial-download state is saved at most this often while bytes arrive.
+SAVE_INTERVAL = 1.0
+
+
+class DownloadError(Exception):
+    pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_json(path, value):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(temporary, path)
+
+
+class Transfer:
+    """One download in progress: the partial file and the ranges still to fetch."""
+
+    def __init__(self, url, part_path, state_path, total, validator, ranges):
+        self.url = url
+        self.part_path = part_path
+        self.state_path = state_path
+        self.total = total
+        self.validator = validator
+        # [start, next byte to write, end (exclusive)] per range.
+        self.ranges = ranges
+        self.lock = threading.Lock()
+        self.saved_at = time.monotonic()
+
+    @property
+    def done(self):
+        return sum(position - start for start, position, _ in self.ranges)
+
+    def save(self):
+        with self.lock:
+            state = {"url": self.url, "total": self.total, "validator": self.validator,
+                     "ranges": [list(entry) for entry in self.ranges]}
+            self.saved_at = time.monotonic()
+        write_json(self.state_path, state)
+
+
+class Downloader:
+    def __init__(self, cache_dir, parallel=1, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+                 chunk_size=CHUNK_SIZE):
+        self.cache_dir = cache_dir
+        self.parallel = max(1, parallel)
+        self.retries = retries
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.resumed_bytes = 0
+        self.cache_hits = 0
+        self.cache_rejects = 0
+
+    def blob_path(self, digest, url):
+        suffix = os.path.splitext(urlsplit(url).path)[1]
+        return os.path.join(self.cache_dir, "sha256", digest + suffix)
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return index if isinstance(index, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def cached(self, url, sha256=None):
+        # The cached file for url (with that digest, if given), or None. The
+        # directory may be shared, so the file itself has to match the digest.
+        digest = (sha256 or (self.load_index().get(url) or {}).get("sha256") or "").lower()
+        if not digest:
+            return None
+        path = self.blob_path(digest, url)
+        try:
+            if sha256_file(path) == digest:
+                return path
+            os.remove(path)
+        except OSError:
+            return None
+        self.cache_rejects += 1
+        return None
+
+    def fetch(self, url, sha256=None, progress=None):
+        # Returns the path of the verified file in the cache.
+        path = self.cached(url, sha256)
+        if path is not None:
+            self.cache_hits += 1
+            if progress is not None:
+                size = os.path.getsize(path)
+                progress(size, size)
+            return path
+        partial_dir = os.path.join(self.cache_dir, "partial")
+        os.makedirs(partial_dir, exist_ok=True)
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+        transfer = self.prepare(url, os.path.join(partial_dir, key), os.path.join(partial_dir, f"{key}.json"))
+        try:
+            self.run(transfer, progress)
+        except BaseException:
+            # Keep what arrived for the next attempt.
+            if transfer.total is not None:
+                transfer.save()
+            raise
+        return self.store(transfer, url, sha256)
+
+    def open(self, url, headers=None):
+        with self.lock:
+            self.requests += 1
+        request = urllib.request.Request(url, headers=headers or {})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def prepare(self, url, part_path, state_path):
+        # Asks for the first byte to learn the length and whether ranges work.
+        attempt = 0
+        while True:
+            try:
+                with self.open(url, {"Range": "bytes=0-0"}) as response:
+                    final_url = response.url
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    if response.status == 206:
+                        total = int(response.headers["Content-Range"].rpartition("/")[2])
+                        ranged = True
+                    else:
+                        length = response.headers.get("Content-Length")
+                        total, ranged = (int(length) if length else None), False
+                break
+            except (urllib.error.HTTPError, ValueError, KeyError) as e:
+                raise DownloadError(f"Cannot download {url}: {e}")
+            except (OSError, http.client.HTTPException) as e:
+                attempt += 1
+                self.failures += 1
+                if attempt > self.retries:
+                    raise DownloadError(f"Cannot download {url}: {e}")
+                time.sleep(min(0.25 * 2 ** attempt, 5.0))
+
+        if ranged:
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state["total"] == total and state["validator"] == validator and validator \
+                        and os.path.getsize(part_path) == total:
+                    transfer = Transfer(final_url, part_path, state_path, total, validator, state["ranges"])
+                    self.resumed_bytes += transfer.done
+                    return transfer
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        count = self.parallel if ranged and total >= MIN_PARALLEL_BYTES else 1
+        if total is None:
+            ranges = [[0, 0, None]]
+        else:
+            step = -(-total // count)
+            ranges = [[start, start, min(start + step, total)] for start in range(0, total, step)] or [[0, 0, 0]]
+        with open(part_path, "wb") as f:
+            if total:
+                f.truncate(total)
+        return Transfer(final_url, part_path, state_path, total if ranged else None, validator, ranges)
+
+    def run(self, transfer, progress):
+        pending = [entry for entry in transfer.ranges if entry[2] is None or entry[1] < entry[2]]
+        if len(pending) == 1:
+            return self.fetch_range(transfer, pending[0], progress)
+        with ThreadPoolExecutor(len(pending), thread_name_prefix="download") as pool:
+            futures = [pool.submit(self.fetch_range, transfer, entry, progress) for entry in pending]
+        for future in futures:
+            future.result()
+
+    def fetch_range(self, transfer, entry, progress):
+        end = entry[2]
+        failures = 0
+        with open(transfer.part_path, "r+b") as f:
+            while end is None or entry[1] < end:
+                headers = {}
+                if transfer.total is not None:
+                    headers["Range"] = f"bytes={entry[1]}-{end - 1}"
+                    if transfer.validator:
+                        # A changed file is sent whole (200) instead of the range.
+                        headers["If-Range"] = transfer.validator
+                elif entry[1]:
+                    # No range support: start over.
+                    entry[1] = 0
+                received = 0
+                try:
+                    with self.open(transfer.url, headers) as response:
+                        if transfer.total is not None and response.status != 206:
+                            raise DownloadError(f"{transfer.url} changed while it was downloaded")
+                        length = response.headers.get("Content-Length")
+                        f.seek(entry[1])
+                        while True:
+                            block = response.read(self.chunk_size)
+                            if not block:
+                                break
+                            f.write(block)
+                            received += len(block)
+                            with transfer.lock:
+                                entry[1] += len(block)
+                            if progress is not None:
+                                progress(transfer.done, transfer.total)
+                            if transfer.total is not None and time.monotonic() - transfer.saved_at > SAVE_INTERVAL:
+                                f.flush()
+                                transfer.save()
+                    # http.client ends a body early, without an error, when the connection drops.
+                    if length is not None and received < int(length):
+                        raise ConnectionError(f"connection dropped after {received} of {length} bytes")
+                    if end is None:
+                        f.truncate(entry[1])
+                        return
+                except urllib.error.HTTPError as e:
+                    raise DownloadError(f"Cannot download {transfer.url}: {e}")
+                except (OSError, http.client.HTTPException) as e:
+                    # Only failures in a row without any progress count towards the limit.
+                    failures = failures + 1 if not received else 1
+                    with self.lock:
+                        self.failures += 1
+                    if failures > self.retries:
+                        f.flush()
+                        raise DownloadError(f"Download of {transfer.url} keeps failing: {e}")
+                    if not received:
+                        time.sleep(min(0.1 * 2 ** failures, 5.0))
+
+    def store(self, transfer, url, sha256):
+        digest = sha256_file(transfer.part_path)
+        if sha256 and digest != sha256.lower():
+            os.remove(transfer.part_path)
+            self.remove_state(transfer)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+        path = self.blob_path(digest, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(transfer.part_path, path)
+        self.remove_state(transfer)
+        with self.lock:
+            index = self.load_index()
+            index[url] = {"sha256": digest, "size": os.path.getsize(path)}
+            write_json(self.index_path, index)
+        return path
+
+    def remove_state(self, transfer):
+        try:
+            os.remove(transfer.state_path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures,
+                "resumed_bytes": self.resumed_bytes, "cache_hits": self.cache_hits,
+                "cache_rejects": self.cache_rejects}
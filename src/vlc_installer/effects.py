@@ -0,0 +1,224 @@
+"""What an install does to the machine outside its own directory.
+
+The install steps reach the operating system only through an effects
+object, the backend: where the install goes by default, the launcher
+Chrome runs and the helper scripts next to it, how the native messaging
+host is registered (and unregistered on rollback), the desktop for the
+uninstall shortcut, and where VLC and Python usually are. That lets the steps run,
+and roll back, against a fake one.
+
+``WindowsEffects`` registers the host under ``HKEY_CURRENT_USER``;
+``winreg``, ``winshell`` and ``win32com`` are imported when first used, so
+this module imports anywhere. ``LinuxEffects`` copies the host manifest into
+the ``NativeMessagingHosts`` directory of each Chrome or Chromium profile
+root and has no desktop shortcut. ``default_effects`` picks the one for
+this machine.
+"""
+import os
+import shutil
+import sys
+
+from vlc_installer.files import HOST_NAME, read_file, restore_file
+
+NATIVE_HOST_KEY = r"Software\Google\Chrome\NativeMessagingHosts\com.vlc.opener"
+# Browser configuration directories below XDG_CONFIG_HOME that get the host manifest.
+LINUX_BROWSERS = ("google-chrome", "google-chrome-beta", "chromium")
+
+SETUP_EXTENSION_BAT = """
+@echo off
+echo VLC Streamer Extension Setup
+echo ============================
+echo.
+echo Please enter your Chrome Extension ID
+echo (Found on chrome://extensions after enabling Developer Mode)
+echo.
+set /p extid="Extension ID: "
+echo.
+echo Updating configuration with ID: %extid%
+
+powershell -Command "(Get-Content '{quoted_manifest}') -replace 'EXTENSION_ID', '%extid%' | Set-Content '{quoted_manifest}'"
+
+REG ADD "HKCU\\Software\\Google\\Chrome\\NativeMessagingHosts\\com.vlc.opener" /ve /t REG_SZ /d "{manifest}" /f
+
+echo.
+echo Configuration complete!
+echo You can now use the "Open in VLC" context menu item in Chrome.
+echo.
+pause
+    """
+
+UNINSTALL_BAT = """
+@echo off
+echo Uninstalling VLC Streamer Chrome Extension...
+REG DELETE "HKCU\\Software\\Google\\Chrome\\NativeMessagingHosts\\com.vlc.opener" /f
+rmdir /s /q "{app_dir}"
+echo Uninstallation complete. Please remove the extension from Chrome manually.
+pause
+    """
+
+
+class WindowsEffects:
+    name = "windows"
+
+    def default_app_dir(self):
+        return os.path.join(os.environ["LOCALAPPDATA"], "VLCOpener")
+
+    def launcher(self, python_path, script_path):
+        # (relative path, text, mode) of what the host manifest points Chrome at.
+        # Chrome cannot pass arguments from the manifest, so cmd.exe still runs
+        # this shim, but as a single line: Python in isolated (-I) no-site (-S)
+        # mode, forwarding Chrome's origin arguments.
+        return "scripts/vlc_opener.bat", f'@"{python_path}" -I -S "{script_path}" %*\n', None
+
+    def helper_scripts(self, app_dir):
+        # Relative path -> (text, mode) of the scripts installed next to the host.
+        # cmd expands %...% even inside quotes, so a literal % in the path is
+        # doubled; PowerShell's single-quoted strings double a quote.
+        app_dir = os.path.abspath(app_dir).replace("%", "%%")
+        manifest = os.path.join(app_dir, "native_host", f"{HOST_NAME}.json")
+        setup = SETUP_EXTENSION_BAT.format(manifest=manifest, quoted_manifest=manifest.replace("'", "''"))
+        return {"setup_extension.bat": (setup, None),
+                "uninstall.bat": (UNINSTALL_BAT.format(app_dir=app_dir), None)}
+
+    def register_host(self, manifest_path):
+        # Returns what unregister_host needs to put the previous registration back.
+        previous = self.registry_get(NATIVE_HOST_KEY)
+        self.registry_set(NATIVE_HOST_KEY, manifest_path)
+        return previous
+
+    def unregister_host(self, previous):
+        if previous is None:
+            self.registry_delete(NATIVE_HOST_KEY)
+        else:
+            self.registry_set(NATIVE_HOST_KEY, previous)
+
+    def registered_paths(self):
+        return [f"HKEY_CURRENT_USER\\{NATIVE_HOST_KEY}"]
+
+    def registry_get(self, key):
+        # The default value of key under HKEY_CURRENT_USER, or None if there is no such key.
+        import winreg
+        try:
+            return winreg.QueryValue(winreg.HKEY_CURRENT_USER, key)
+        except OSError:
+            return None
+
+    def registry_set(self, key, value):
+        import winreg
+        with winreg.CreateKey(winreg.HKEY_CURRENT_USER, key) as handle:
+            winreg.SetValue(handle, "", winreg.REG_SZ, value)
+
+    def registry_delete(self, key):
+        import winreg
+        try:
+            winreg.DeleteKey(winreg.HKEY_CURRENT_USER, key)
+        except FileNotFoundError:
+            pass
+
+    def desktop_dir(self):
+        import winshell
+        return winshell.desktop()
+
+    def shortcut_exists(self, path):
+        return os.path.exists(path)
+
+    def create_shortcut(self, path, target, working_dir, icon):
+        import pythoncom
+        from win32com.client import Dispatch
+        pythoncom.CoInitialize()
+        try:
+            shortcut = Dispatch("WScript.Shell").CreateShortCut(path)
+            shortcut.Targetpath = target
+            shortcut.WorkingDirectory = working_dir
+            shortcut.IconLocation = icon
+            shortcut.save()
+        finally:
+            pythoncom.CoUninitialize()
+
+    def remove_shortcut(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def find_vlc(self):
+        return self.discover("vlc")
+
+    def find_python(self):
+        return self.discover("python", (3, 9))
+
+    def discover(self, product, min_version=None):
+        from vlc_installer import discovery
+        finder = discovery.Discovery()
+        finder.run((product,))
+        candidate = finder.best(product, min_version)
+        return candidate.path if candidate else None
+
+
+class LinuxEffects:
+    name = "linux"
+
+    def __init__(self, config_home=None, browsers=LINUX_BROWSERS):
+        self.config_home = config_home or os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+        self.browsers = browsers
+
+    def default_app_dir(self):
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        return os.path.join(data_home, "vlc-opener")
+
+    def launcher(self, python_path, script_path):
+        # Chrome runs the manifest's path directly, so it must be executable.
+        return "scripts/vlc_opener.sh", f'#!/bin/sh\nexec "{python_path}" -I -S "{script_path}" "$@"\n', 0o755
+
+    def helper_scripts(self, app_dir):
+        manifests = " ".join(f'"{path}"' for path in self.manifest_paths())
+        return {"uninstall.sh": (f'#!/bin/sh\nrm -f {manifests}\nrm -rf "{app_dir}"\n', 0o755)}
+
+    def manifest_dirs(self):
+        # Every installed browser's; Chrome's alone if none is installed yet.
+        roots = [os.path.join(self.config_home, browser) for browser in self.browsers]
+        installed = [root for root in roots if os.path.isdir(root)] or roots[:1]
+        return [os.path.join(root, "NativeMessagingHosts") for root in installed]
+
+    def manifest_paths(self):
+        return [os.path.join(directory, f"{HOST_NAME}.json") for directory in self.manifest_dirs()]
+
+    def register_host(self, manifest_path):
+        with open(manifest_path, "rb") as f:
+            data = f.read()
+        previous = {}
+        for path in self.manifest_paths():
+            previous[path] = read_file(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            restore_file(path, data)
+        return previous
+
+    def unregister_host(self, previous):
+        for path, data in previous.items():
+            restore_file(path, data)
+
+    def registered_paths(self):
+        return self.manifest_paths()
+
+    def desktop_dir(self):
+        # No uninstall shortcut, so the shortcut step does nothing (install.shortcut).
+        return None
+
+    def find_vlc(self):
+        return shutil.which("vlc")
+
+    def find_python(self):
+        return shutil.which("python3")
+
+
+BACKENDS = {"windows": WindowsEffects, "linux": LinuxEffects}
+
+
+def default_effects(name=None):
+    # The backend called name, or the one for this platform.
+    if name is None:
+        name = "windows" if sys.platform == "win32" else "linux"
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(BACKENDS)}")
@@ -0,0 +1,141 @@
+"""Handing work from the installer's threads to the GUI thread.
+
+Worker threads never touch Tk. They post to an ``EventQueue``:
+``set(key, value)`` for a value shown in the window, such as the status
+text or the progress bar, and ``call(fn, *args)`` for anything else that
+has to run on the GUI thread, such as a dialog. ``Pump`` drains the queue
+on the GUI thread every ``interval_ms`` through ``after``-style scheduling
+and hands each event to the sink.
+
+Only the latest value of each key matters, so a ``set`` replaces the one
+still waiting for the same key: however often a download reports
+progress, each key changes at most once per pump tick. A ``call`` is never
+merged and is a barrier: values set before it are applied before it runs,
+values set after it are applied after, so a dialog always sees the window
+as the worker left it.
+
+``Progress`` turns the bytes or steps each phase has completed into one
+percentage, weighting the phases by their expected share of the work.
+"""
+import threading
+
+DEFAULT_INTERVAL_MS = 50
+# Progress changes smaller than this (in percent) are not posted.
+PROGRESS_RESOLUTION = 0.1
+
+
+class EventQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # ("set", key, value) and ("call", fn, args), in order.
+        self.pending = []
+        # Key -> index in pending of its set since the last call.
+        self.latest = {}
+        self.posted = 0
+        self.coalesced = 0
+
+    def set(self, key, value):
+        with self.lock:
+            self.posted += 1
+            index = self.latest.get(key)
+            if index is not None:
+                self.pending[index] = ("set", key, value)
+                self.coalesced += 1
+                return
+            self.latest[key] = len(self.pending)
+            self.pending.append(("set", key, value))
+
+    def call(self, fn, *args):
+        with self.lock:
+            self.posted += 1
+            self.pending.append(("call", fn, args))
+            self.latest.clear()
+
+    def drain(self):
+        with self.lock:
+            events, self.pending = self.pending, []
+            self.latest.clear()
+        return events
+
+    def stats(self):
+        with self.lock:
+            return {"posted": self.posted, "coalesced": self.coalesced, "pending": len(self.pending)}
+
+
+class Pump:
+    """Applies queued events on the thread that calls ``schedule``, e.g. ``root.after``."""
+
+    def __init__(self, events, sink, schedule, interval_ms=DEFAULT_INTERVAL_MS):
+        # sink(key, value) applies a set; schedule(ms, fn) runs fn later on the GUI thread.
+        self.events = events
+        self.sink = sink
+        self.schedule = schedule
+        self.interval_ms = interval_ms
+        self.running = False
+        self.ticks = 0
+        self.applied = 0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.schedule(self.interval_ms, self.tick)
+
+    def stop(self):
+        self.running = False
+
+    def tick(self):
+        if not self.running:
+            return
+        self.ticks += 1
+        try:
+            self.flush()
+        finally:
+            if self.running:
+                self.schedule(self.interval_ms, self.tick)
+
+    def flush(self):
+        for kind, target, value in self.events.drain():
+            self.applied += 1
+            try:
+                if kind == "set":
+                    self.sink(target, value)
+                else:
+                    target(*value)
+            except Exception as e:
+                # One bad event must not stop the pump and freeze the window.
+                print(f"Error handling installer event: {e}")
+
+
+class Progress:
+    """Overall percentage across weighted phases, posted as one key."""
+
+    def __init__(self, events, weights, key="progress"):
+        # weights: phase -> share of the work, in any unit.
+        self.events = events
+        self.key = key
+        self.weights = dict(weights)
+        self.scale = 100.0 / (sum(self.weights.values()) or 1)
+        self.fractions = dict.fromkeys(self.weights, 0.0)
+        self.lock = threading.Lock()
+        self.shown = None
+
+    def update(self, phase, done, total=None):
+        # total None: the phase's size is unknown, so it counts only once finished.
+        fraction = min(1.0, done / total) if total else 0.0
+        with self.lock:
+            self.fractions[phase] = fraction
+            value = round(sum(self.weights[name] * share for name, share in self.fractions.items()) * self.scale, 1)
+            if self.shown is not None and abs(value - self.shown) < PROGRESS_RESOLUTION and value < 100:
+                return
+            self.shown = value
+            # Posted under the lock so two threads cannot post out of order.
+            self.events.set(self.key, value)
+
+    def finish(self, phase):
+        self.update(phase, 1, 1)
+
+    def reset(self):
+        with self.lock:
+            self.fractions = dict.fromkeys(self.weights, 0.0)
+            self.shown = None
+            self.events.set(self.key, 0.0)
@@ -0,0 +1,263 @@
+"""The installed tree, written incrementally.
+
+``InstallTree`` writes a file under the install directory only when its
+content differs from what is already there. ``install_manifest.json`` at the
+root records the SHA-256, size and modification time of every file it wrote;
+a file whose size and mtime still match its entry is taken as unchanged
+without being read, anything else is hashed and compared. Files are written
+under a temporary name and renamed into place, so an interrupted install
+never leaves half a file behind, and files the previous install wrote that
+this one no longer does are removed. Given a journal (see ``steps``), every
+file written or removed and every directory created is recorded with a way
+to put it back. The ``write_*`` functions lay out the extension, the host
+scripts and the backend's launcher and helper scripts (see ``effects``) from
+the installer's bundled resources, as steps of ``install``; nothing is
+downloaded.
+"""
+import compileall
+import hashlib
+import json
+import locale
+import os
+import threading
+
+MANIFEST_NAME = "install_manifest.json"
+HOST_NAME = "com.vlc.opener"
+EXTENSION_ID_PLACEHOLDER = "EXTENSION_ID"
+ICONS = ("icon16.png", "icon48.png", "icon128.png")
+
+
+def read_file(path):
+    # The bytes at path, or None if there is no file.
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def restore_file(path, data):
+    # Puts back what a journaled write or removal found at path: data, or no file.
+    if data is None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def remove_empty_dir(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class InstallTree:
+    def __init__(self, root, force=False, journal=None):
+        # force rewrites every file, as a repair install would.
+        self.root = root
+        self.force = force
+        self.journal = journal
+        # Several install steps can write to one tree at once.
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        # Relative path (with "/") -> [sha256, size, mtime_ns], from the last install.
+        self.previous = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            if isinstance(previous, dict) and isinstance(previous.get("files"), dict):
+                self.previous = previous["files"]
+        except (OSError, ValueError):
+            pass
+        self.files = {}
+        self.written = []
+        self.unchanged = 0
+        self.removed = []
+
+    def path(self, relpath):
+        return os.path.join(self.root, *relpath.split("/"))
+
+    def remember(self, path):
+        # Records how to put back what is at path now.
+        if self.journal is not None:
+            self.journal.record(f"restore {path}", restore_file, path, read_file(path))
+
+    def make_dirs(self, directory):
+        missing = []
+        while directory and not os.path.isdir(directory):
+            missing.append(directory)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        if not missing:
+            return
+        os.makedirs(missing[0], exist_ok=True)
+        if self.journal is not None:
+            # Outermost first, so the rollback removes the innermost first.
+            for created in reversed(missing):
+                self.journal.record(f"remove {created}", remove_empty_dir, created)
+
+    def is_current(self, relpath, digest):
+        # True if the installed file already has this content.
+        path = self.path(relpath)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        entry = self.previous.get(relpath)
+        if entry and entry[0] == digest and entry[1:] == [stat.st_size, stat.st_mtime_ns]:
+            self.files[relpath] = entry
+            return True
+        # Not written by the last install, or touched since: compare the content.
+        if sha256_file(path) != digest:
+            return False
+        self.files[relpath] = [digest, stat.st_size, stat.st_mtime_ns]
+        return True
+
+    def write(self, relpath, data, mode=None):
+        # Writes bytes to relpath unless the file already holds them; returns True if written.
+        # mode sets the file's permission bits, e.g. 0o755 for a script.
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.force and self.is_current(relpath, digest):
+            with self.lock:
+                self.unchanged += 1
+            return False
+        path = self.path(relpath)
+        self.make_dirs(os.path.dirname(path))
+        self.remember(path)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(temporary, mode)
+        os.replace(temporary, path)
+        stat = os.stat(path)
+        self.files[relpath] = [digest, stat.st_size, stat.st_mtime_ns]
+        self.written.append(relpath)
+        return True
+
+    def write_text(self, relpath, text, mode=None):
+        # Same bytes as a text-mode write: platform line endings and encoding.
+        return self.write(relpath, text.replace("\n", os.linesep).encode(locale.getpreferredencoding(False)), mode)
+
+    def write_json(self, relpath, value):
+        return self.write_text(relpath, json.dumps(value, indent=2))
+
+    def copy(self, relpath, source):
+        with open(source, "rb") as f:
+            return self.write(relpath, f.read())
+
+    def copy_tree(self, reldir, source, skip=("__pycache__",)):
+        # Returns True if any file under reldir was written.
+        changed = False
+        for directory, dirnames, filenames in os.walk(source):
+            dirnames[:] = sorted(name for name in dirnames if name not in skip)
+            relative = os.path.relpath(directory, source).replace(os.sep, "/")
+            prefix = reldir if relative == "." else f"{reldir}/{relative}"
+            for name in sorted(filenames):
+                if not name.endswith((".pyc", ".pyo")):
+                    changed = self.copy(f"{prefix}/{name}", os.path.join(directory, name)) or changed
+        return changed
+
+    def read_json(self, relpath):
+        # The installed JSON file at relpath, or None.
+        try:
+            with open(self.path(relpath), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def prune(self):
+        # Removes files the previous install wrote and this one did not.
+        for relpath in sorted(set(self.previous) - set(self.files)):
+            try:
+                self.remember(self.path(relpath))
+                os.remove(self.path(relpath))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still in use; it stays listed so the next install retries.
+                self.files[relpath] = self.previous[relpath]
+                continue
+            self.removed.append(relpath)
+
+    def save(self):
+        if self.files == self.previous and not self.force:
+            return
+        self.make_dirs(self.root)
+        self.remember(self.manifest_path)
+        temporary = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.manifest_path)
+
+    def summary(self):
+        return {"written": list(self.written), "unchanged": self.unchanged, "removed": list(self.removed)}
+
+
+def write_extension(tree, resource_dir):
+    tree.copy("extension/manifest.json", os.path.join(resource_dir, "extension", "manifest.json"))
+    tree.copy("extension/background.js", os.path.join(resource_dir, "extension", "background.js"))
+    for icon in ICONS:
+        tree.copy(f"extension/icons/{icon}", os.path.join(resource_dir, "extension", "icons", icon))
+
+
+def write_host_manifest(tree, launcher_relpath, extension_id=None):
+    # Keep the extension ID a previous setup filled in, unless one is given.
+    installed = tree.read_json(f"native_host/{HOST_NAME}.json") or {}
+    origins = installed.get("allowed_origins")
+    if extension_id:
+        origins = [f"chrome-extension://{extension_id}/"]
+    elif not isinstance(origins, list) or not origins or EXTENSION_ID_PLACEHOLDER in "".join(map(str, origins)):
+        origins = [f"chrome-extension://{EXTENSION_ID_PLACEHOLDER}/"]
+    tree.write_json(f"native_host/{HOST_NAME}.json", {
+        "name": HOST_NAME,
+        "description": "Open media in VLC",
+        "path": tree.path(launcher_relpath).replace("\\", "\\\\"),
+        "type": "stdio",
+        "allowed_origins": origins
+    })
+
+
+def write_host(tree, resource_dir):
+    # Returns True if any host module changed.
+    tree.copy("scripts/vlc_opener.py", os.path.join(resource_dir, "scripts", "vlc_opener.py"))
+    return tree.copy_tree("scripts/vlc_host", os.path.join(resource_dir, "scripts", "vlc_host"))
+
+
+def compile_host(tree, host_changed):
+    host_dir = tree.path("scripts/vlc_host")
+    if host_changed or tree.force or not os.path.isdir(os.path.join(host_dir, "__pycache__")):
+        # Precompile the host package so the first launch does not compile it.
+        compileall.compile_dir(host_dir, quiet=1, force=tree.force)
+
+
+def write_config(tree, vlc_path, launcher):
+    # Settings added to the host config by hand survive an upgrade.
+    config = tree.read_json("scripts/vlc_opener.json")
+    config = config if isinstance(config, dict) else {}
+    config["vlc_path"] = vlc_path
+    tree.write_json("scripts/vlc_opener.json", config)
+    relpath, text, mode = launcher
+    tree.write_text(relpath, text, mode)
+
+
+def write_helpers(tree, scripts):
+    for relpath, (text, mode) in scripts.items():
+        tree.write_text(relpath, text, mode)
+
@@ -0,0 +1,88 @@
+"""The install, as steps.
+
+``install`` lays out the install directory, registers the native messaging
+host and creates the uninstall shortcut as a graph of ``steps.Step``:
+the extension, the host, its manifest, the config and the helper scripts
+are written at once; the host is compiled, the host registered and the
+shortcut created as soon as what each needs is in place. ``effects`` (the
+backend) does whatever is specific to the platform.
+Every file, registration and shortcut is journaled, so a failure puts
+the machine back as it was, including files an upgrade replaced. The
+shortcut is optional, as it always was, and skipped by backends without a
+desktop.
+"""
+import os
+import shutil
+
+from vlc_installer import files, steps
+
+SHORTCUT_NAME = "Uninstall VLC Streamer.lnk"
+SHORTCUT_ICON = "shell32.dll,131"
+# Share of the work per step, for progress.
+STEP_WEIGHTS = {
+    "extension": 2, "host": 3, "compile": 3, "host_manifest": 1, "config": 1,
+    "helpers": 1, "file_manifest": 1, "register": 1, "shortcut": 1,
+}
+
+
+def install_steps(tree, effects, resource_dir, vlc_path, python_path, extension_id=None):
+    state = {}
+    launcher = effects.launcher(python_path, tree.path("scripts/vlc_opener.py"))
+
+    def host(journal):
+        state["host_changed"] = files.write_host(tree, resource_dir)
+
+    def compile_host(journal):
+        cache = tree.path("scripts/vlc_host/__pycache__")
+        if not os.path.isdir(cache):
+            journal.record(f"remove {cache}", shutil.rmtree, cache, True)
+        files.compile_host(tree, state["host_changed"])
+
+    def file_manifest(journal):
+        tree.prune()
+        tree.save()
+
+    def register(journal):
+        previous = effects.register_host(tree.path(f"native_host/{files.HOST_NAME}.json"))
+        journal.record("unregister the native messaging host", effects.unregister_host, previous)
+
+    def shortcut(journal):
+        desktop = effects.desktop_dir()
+        if desktop is None:
+            return
+        path = os.path.join(desktop, SHORTCUT_NAME)
+        existed = effects.shortcut_exists(path)
+        effects.create_shortcut(path, tree.path("uninstall.bat"), tree.root, SHORTCUT_ICON)
+        if not existed:
+            journal.record(f"remove {path}", effects.remove_shortcut, path)
+
+    plan = [
+        steps.Step("extension", lambda journal: files.write_extension(tree, resource_dir),
+                   title="Writing the extension"),
+        steps.Step("host", host, title="Copying the native host"),
+        steps.Step("compile", compile_host, ("host",), title="Compiling the native host"),
+        steps.Step("host_manifest", lambda journal: files.write_host_manifest(tree, launcher[0], extension_id),
+                   title="Writing the native host manifest"),
+        steps.Step("config", lambda journal: files.write_config(tree, vlc_path, launcher),
+                   title="Writing the host configuration"),
+        steps.Step("helpers", lambda journal: files.write_helpers(tree, effects.helper_scripts(tree.root)),
+                   title="Writing helper scripts"),
+        steps.Step("file_manifest", file_manifest, ("extension", "host", "host_manifest", "config", "helpers"),
+                   title="Recording installed files"),
+        steps.Step("register", register, ("host_manifest",), title="Registering native messaging host"),
+        steps.Step("shortcut", shortcut, ("helpers",), title="Creating shortcuts", optional=True),
+    ]
+    for step in plan:
+        step.weight = STEP_WEIGHTS[step.name]
+    return plan
+
+
+def install(effects, app_dir, resource_dir, vlc_path, python_path, force=False, extension_id=None,
+            workers=steps.DEFAULT_WORKERS, on_start=None, on_finish=None):
+    # Returns the scheduler's report with the files summary; raises steps.StepError after a rollback.
+    journal = steps.Journal()
+    tree = files.InstallTree(app_dir, force, journal)
+    plan = install_steps(tree, effects, resource_dir, vlc_path, python_path, extension_id)
+    report = steps.Scheduler(plan, workers, journal).run(on_start, on_finish)
+    report["files"] = tree.summary()
+    return report
@@ -0,0 +1,155 @@
+"""Running install steps by their dependencies, with rollback.
+
+A ``Step`` names the steps it needs. ``Scheduler.run`` starts every step
+whose dependencies have finished on a thread pool, so independent steps
+run at once, and records when each started and how long it took. Steps
+record how to undo each effect they have in a shared ``Journal`` as they
+go. When a step fails, nothing new is started, the steps already running
+are waited for, and the journal is played back in reverse, leaving the
+machine as it was; ``StepError`` then carries the failed step, the cause
+and the timings. A step marked ``optional`` may fail without any of that.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 4
+
+
+class StepError(Exception):
+    def __init__(self, step, cause, report):
+        super().__init__(f"{step} failed: {cause}")
+        self.step = step
+        self.cause = cause
+        self.report = report
+
+
+class Step:
+    def __init__(self, name, run, requires=(), title=None, weight=1, optional=False):
+        # run(journal) does the work.
+        self.name = name
+        self.run = run
+        self.requires = tuple(requires)
+        self.title = title or name
+        # Share of the work, for progress.
+        self.weight = weight
+        self.optional = optional
+
+
+class Journal:
+    """Undo actions, in the order their effects happened."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+
+    def record(self, description, undo, *args):
+        with self.lock:
+            self.entries.append((description, undo, args))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rollback(self):
+        # Undoes everything, newest first; returns the undo actions that failed.
+        with self.lock:
+            entries, self.entries = self.entries, []
+        failures = []
+        for description, undo, args in reversed(entries):
+            try:
+                undo(*args)
+            except Exception as e:
+                failures.append(f"{description}: {e}")
+        return failures
+
+
+def order(steps):
+    # The steps in an order that satisfies their dependencies; ValueError on unknown or circular ones.
+    by_name = {step.name: step for step in steps}
+    ordered, state = [], {}
+
+    def visit(step, path):
+        if state.get(step.name) == "done":
+            return
+        if state.get(step.name) == "visiting":
+            raise ValueError(f"Steps depend on each other: {' -> '.join(path + [step.name])}")
+        state[step.name] = "visiting"
+        for name in step.requires:
+            if name not in by_name:
+                raise ValueError(f"Step {step.name} requires unknown step {name}")
+            visit(by_name[name], path + [step.name])
+        state[step.name] = "done"
+        ordered.append(step)
+
+    for step in steps:
+        visit(step, [])
+    return ordered
+
+
+class Scheduler:
+    def __init__(self, steps, workers=DEFAULT_WORKERS, journal=None):
+        self.steps = order(steps)
+        self.workers = workers
+        self.journal = journal if journal is not None else Journal()
+
+    def run(self, on_start=None, on_finish=None):
+        # on_start(step) and on_finish(step, error) are called from the worker threads.
+        # Returns the report; raises StepError after rolling back.
+        started_at = time.perf_counter()
+        timings = {}
+        remaining = {step.name: set(step.requires) for step in self.steps}
+        by_name = {step.name: step for step in self.steps}
+        failure = None
+
+        def execute(step):
+            began = time.perf_counter()
+            if on_start is not None:
+                on_start(step)
+            error = None
+            try:
+                step.run(self.journal)
+            except Exception as e:
+                error = e
+            timings[step.name] = {
+                "start_ms": round((began - started_at) * 1000, 3),
+                "ms": round((time.perf_counter() - began) * 1000, 3),
+                "status": "ok" if error is None else "failed" if not step.optional else "skipped",
+            }
+            if error is not None and step.optional:
+                timings[step.name]["error"] = str(error)
+            if on_finish is not None:
+                on_finish(step, error)
+            if error is not None and not step.optional:
+                raise error
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="install-step") as pool:
+            running = {}
+            while remaining or running:
+                if failure is None:
+                    for name in [name for name, needs in remaining.items() if not needs]:
+                        del remaining[name]
+                        running[pool.submit(execute, by_name[name])] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        failure = failure or (name, error)
+                        continue
+                    for needs in remaining.values():
+                        needs.discard(name)
+
+        report = {
+            "steps": {step.name: timings[step.name] for step in self.steps if step.name in timings},
+            "total_ms": round((time.perf_counter() - started_at) * 1000, 3),
+            "rolled_back": False,
+        }
+        if failure is not None:
+            report["not_run"] = [step.name for step in self.steps if step.name not in timings]
+            report["undone"] = len(self.journal)
+            report["rollback_failures"] = self.journal.rollback()
+            report["rolled_back"] = True
+            raise StepError(failure[0], failure[1], report)
+        return report
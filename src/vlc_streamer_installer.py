@@ -2,28 +2,39 @@ import os
 import sys
 import ctypes
 import subprocess
-import winreg
-import shutil
-import urllib.request
 import json
 import tempfile
 import webbrowser
 from pathlib import Path
-import winshell
-from win32com.client import Dispatch
-import tkinter as tk
-from tkinter import messagebox, filedialog, ttk
 import threading
+try:
+    import tkinter as tk
+    from tkinter import messagebox, filedialog, ttk
+except ImportError:
+    # Python builds without Tk can still run the headless install (vlc_installer/cli.py).
+    tk = None
+
+from vlc_installer import discovery, download, effects, events, install, steps
 
 APP_NAME = "VLC Streamer Chrome Extension"
-APP_DIR = os.path.join(os.environ["LOCALAPPDATA"], "VLCOpener")
+APP_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "VLCOpener")
 EXTENSION_DIR = os.path.join(APP_DIR, "extension")
 NATIVE_HOST_DIR = os.path.join(APP_DIR, "native_host")
 SCRIPTS_DIR = os.path.join(APP_DIR, "scripts")
 TEMP_DIR = tempfile.gettempdir()
 PYTHON_MIN_VERSION = (3, 9)
+PYTHON_URL = "https://www.python.org/ftp/python/3.11.0/python-3.11.0-amd64.exe"
+# SHA-256 of the installer at PYTHON_URL; the download is rejected if it differs.
+PYTHON_SHA256 = os.environ.get("VLC_OPENER_PYTHON_SHA256")
+# Downloads are cached by content; point several machines at a share to fetch once.
+DOWNLOAD_CACHE_DIR = os.environ.get("VLC_OPENER_DOWNLOAD_CACHE") or os.path.join(APP_DIR, "downloads")
+# Versions and modification times of the executables found by the last system check.
+DISCOVERY_CACHE = os.path.join(APP_DIR, "discovery.json")
+# Expected share of the work per phase, for the progress bar.
+PYTHON_INSTALL_WEIGHTS = {"download": 3, "install": 2}
 
-ICONS_DIR = os.path.join(APP_DIR, "icons")
+# Bundled extension and host sources; PyInstaller unpacks --add-data files to _MEIPASS.
+RESOURCE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
 
 def is_admin():
     try:
@@ -33,46 +44,22 @@ def is_admin():
 
 def restart_as_admin():
     if not is_admin():
-        ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
+        # A frozen installer is its own sys.executable; from source, Python runs the script again.
+        args = sys.argv[1:] if getattr(sys, "frozen", False) else [os.path.abspath(sys.argv[0])] + sys.argv[1:]
+        ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, subprocess.list2cmdline(args), None, 1)
         sys.exit(0)
 
-def check_vlc():
-    vlc_paths = [
-        r"C:\Program Files\VideoLAN\VLC\vlc.exe",
-        r"C:\Program Files (x86)\VideoLAN\VLC\vlc.exe"
-    ]
-    
-    for path in vlc_paths:
-        if os.path.exists(path):
-            return path
-    
-    return None
-
-def check_chrome():
-    chrome_paths = [
-        r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-        r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-        os.path.join(os.environ["LOCALAPPDATA"], r"Google\Chrome\Application\chrome.exe")
-    ]
-    
-    for path in chrome_paths:
-        if os.path.exists(path):
-            return path
-    
-    return None
-
-def check_python():
-    if sys.version_info >= PYTHON_MIN_VERSION:
-        return sys.executable
-    
-    return None
+def discover(products=tuple(discovery.PRODUCTS), on_found=None, refresh=False):
+    # Probes concurrently; versions of files unchanged since the last run come from the cache.
+    finder = discovery.Discovery(cache_path=DISCOVERY_CACHE)
+    finder.run(products, on_found, refresh)
+    return finder
 
-def install_python():
-    python_url = "https://www.python.org/ftp/python/3.11.0/python-3.11.0-amd64.exe"
-    python_installer = os.path.join(TEMP_DIR, "python_installer.exe")
-    
+def install_python(progress=None):
+    # progress(done, total) is called with the bytes downloaded so far.
     try:
-        urllib.request.urlretrieve(python_url, python_installer)
+        downloader = download.Downloader(DOWNLOAD_CACHE_DIR, parallel=4)
+        python_installer = downloader.fetch(PYTHON_URL, PYTHON_SHA256, progress)
         
         subprocess.run([python_installer, "/quiet", "InstallAllUsers=0", "PrependPath=1"], 
                       check=True, capture_output=True)
@@ -82,199 +69,6 @@ def install_python():
         print(f"Error installing Python: {e}")
         return False
 
-def create_files(vlc_path):
-    os.makedirs(EXTENSION_DIR, exist_ok=True)
-    os.makedirs(os.path.join(EXTENSION_DIR, "icons"), exist_ok=True)
-    os.makedirs(NATIVE_HOST_DIR, exist_ok=True)
-    os.makedirs(SCRIPTS_DIR, exist_ok=True)
-    os.makedirs(ICONS_DIR, exist_ok=True)
-    
-    manifest = {
-        "name": "VLC Streamer",
-        "version": "1.0",
-        "description": "Open media links in VLC Media Player",
-        "background": {
-            "service_worker": "background.js"
-        },
-        "icons": {
-            "16": "icons/icon16.png",
-            "48": "icons/icon48.png",
-            "128": "icons/icon128.png"
-        },
-        "permissions": ["contextMenus", "nativeMessaging"],
-        "manifest_version": 3
-    }
-    
-    with open(os.path.join(EXTENSION_DIR, "manifest.json"), "w") as f:
-        json.dump(manifest, f, indent=2)
-    
-    # Create background.js
-    background_js = """
-    chrome.contextMenus.create({
-    id: "openInVLC",
-    title: "Open in VLC",
-    contexts: ["link", "video", "audio"]
-    });
-
-    chrome.contextMenus.onClicked.addListener((info, tab) => {
-    if (info.menuItemId === "openInVLC") {
-        chrome.runtime.sendNativeMessage("com.vlc.opener", {
-        url: info.linkUrl || info.srcUrl
-        }, (response) => {
-        console.log("Response:", response);
-        });
-    }
-    });
-    """
-    
-    with open(os.path.join(EXTENSION_DIR, "background.js"), "w") as f:
-        f.write(background_js)
-    
-    icon_urls = {
-        "icon16.png": "https://raw.githubusercontent.com/videolan/vlc/master/share/icons/16x16/vlc.png",
-        "icon48.png": "https://raw.githubusercontent.com/videolan/vlc/master/share/icons/48x48/vlc.png",
-        "icon128.png": "https://raw.githubusercontent.com/videolan/vlc/master/share/icons/128x128/vlc.png"
-    }
-
-    for icon_name, url in icon_urls.items():
-        try:
-            urllib.request.urlretrieve(url, os.path.join(ICONS_DIR, icon_name))
-        except Exception as e:
-            print(f"Failed to download icon {icon_name}: {e}")
-            with open(os.path.join(ICONS_DIR, icon_name), "wb") as f:
-                f.write(b'')
-    
-    os.makedirs(os.path.join(EXTENSION_DIR, "icons"), exist_ok=True)
-    for icon_name in icon_urls.keys():
-        src_path = os.path.join(ICONS_DIR, icon_name)
-        dst_path = os.path.join(EXTENSION_DIR, "icons", icon_name)
-        if os.path.exists(src_path):
-            shutil.copy(src_path, dst_path)
-    
-    native_host_manifest = {
-        "name": "com.vlc.opener",
-        "description": "Open media in VLC",
-        "path": os.path.join(SCRIPTS_DIR, "vlc_opener.bat").replace("\\", "\\\\"),
-        "type": "stdio",
-        "allowed_origins": ["chrome-extension://EXTENSION_ID/"]
-    }
-    
-    with open(os.path.join(NATIVE_HOST_DIR, "com.vlc.opener.json"), "w") as f:
-        json.dump(native_host_manifest, f, indent=2)
-    
-    vlc_opener_py = f"""
-import sys
-import json
-import struct
-import subprocess
-import os
-
-VLC_PATH = r"{vlc_path}"
-
-def get_message():
-    raw_length = sys.stdin.buffer.read(4)
-    if len(raw_length) == 0:
-        sys.exit(0)
-    message_length = struct.unpack('=I', raw_length)[0]
-    message = sys.stdin.buffer.read(message_length).decode('utf-8')
-    return json.loads(message)
-
-def send_message(message):
-    encoded_content = json.dumps(message).encode('utf-8')
-    encoded_length = struct.pack('=I', len(encoded_content))
-    sys.stdout.buffer.write(encoded_length)
-    sys.stdout.buffer.write(encoded_content)
-    sys.stdout.buffer.flush()
-
-def main():
-    message = get_message()
-    url = message.get("url")
-    
-    if url:
-        try:
-            subprocess.Popen([VLC_PATH, url])
-            send_message({{"success": True}})
-        except Exception as e:
-            send_message({{"success": False, "error": str(e)}})
-    else:
-        send_message({{"success": False, "error": "No URL provided"}})
-
-if __name__ == "__main__":
-    main()
-    """
-    
-    with open(os.path.join(SCRIPTS_DIR, "vlc_opener.py"), "w") as f:
-        f.write(vlc_opener_py)
-    
-    vlc_opener_bat = f"""
-@echo off
-"{sys.executable}" "{os.path.join(SCRIPTS_DIR, 'vlc_opener.py')}"
-    """
-    
-    with open(os.path.join(SCRIPTS_DIR, "vlc_opener.bat"), "w") as f:
-        f.write(vlc_opener_bat)
-    
-    setup_extension_bat = """
-@echo off
-echo VLC Streamer Extension Setup
-echo ============================
-echo.
-echo Please enter your Chrome Extension ID
-echo (Found on chrome://extensions after enabling Developer Mode)
-echo.
-set /p extid="Extension ID: "
-echo.
-echo Updating configuration with ID: %extid%
-
-powershell -Command "(Get-Content '%LOCALAPPDATA%\\VLCOpener\\native_host\\com.vlc.opener.json') -replace 'EXTENSION_ID', '%extid%' | Set-Content '%LOCALAPPDATA%\\VLCOpener\\native_host\\com.vlc.opener.json'"
-
-REG ADD "HKCU\\Software\\Google\\Chrome\\NativeMessagingHosts\\com.vlc.opener" /ve /t REG_SZ /d "%LOCALAPPDATA%\\VLCOpener\\native_host\\com.vlc.opener.json" /f
-
-echo.
-echo Configuration complete!
-echo You can now use the "Open in VLC" context menu item in Chrome.
-echo.
-pause
-    """
-    
-    with open(os.path.join(APP_DIR, "setup_extension.bat"), "w") as f:
-        f.write(setup_extension_bat)
-    
-    uninstall_bat = """
-@echo off
-echo Uninstalling VLC Streamer Chrome Extension...
-REG DELETE "HKCU\\Software\\Google\\Chrome\\NativeMessagingHosts\\com.vlc.opener" /f
-rmdir /s /q "%LOCALAPPDATA%\\VLCOpener"
-echo Uninstallation complete. Please remove the extension from Chrome manually.
-pause
-    """
-    
-    with open(os.path.join(APP_DIR, "uninstall.bat"), "w") as f:
-        f.write(uninstall_bat)
-
-def create_uninstall_shortcut():
-    try:
-        import pythoncom
-        pythoncom.CoInitialize()
-        
-        desktop = winshell.desktop()
-        path = os.path.join(desktop, "Uninstall VLC Streamer.lnk")
-        target = os.path.join(APP_DIR, "uninstall.bat")
-        
-        shell = Dispatch('WScript.Shell')
-        shortcut = shell.CreateShortCut(path)
-        shortcut.Targetpath = target
-        shortcut.WorkingDirectory = APP_DIR
-        shortcut.IconLocation = "shell32.dll,131"
-        shortcut.save()
-        
-        pythoncom.CoUninitialize()
-        
-        return True
-    except Exception as e:
-        print(f"Error creating shortcut: {e}")
-        return False
-
 class InstallerGUI:
     def __init__(self, root):
         self.root = root
@@ -335,6 +129,11 @@ class InstallerGUI:
         self.cancel_button = ttk.Button(self.button_frame, text="Cancel", command=self.root.destroy)
         self.cancel_button.pack(side=tk.RIGHT)
         
+        # Worker threads post here; the pump applies their updates on the Tk thread.
+        self.events = events.EventQueue()
+        self.pump = events.Pump(self.events, self.apply_event, self.root.after)
+        self.pump.start()
+        
         self.check_system()
     
     def center_window(self):
@@ -344,33 +143,64 @@ class InstallerGUI:
         y = (height - 450) // 2
         self.root.geometry(f"600x450+{x}+{y}")
     
+    def apply_event(self, key, value):
+        # key names one of the window's Tk variables, e.g. "status_text".
+        getattr(self, key).set(value)
+    
     def check_system(self):
-        vlc_path = check_vlc()
-        if vlc_path:
-            self.vlc_var.set(f"Found: {vlc_path}")
+        # Discovery runs on its own thread; findings reach the labels as events.
+        self.vlc_status = self.chrome_status = self.python_status = False
+        self.vlc_path = self.chrome_path = self.python_path = None
+        self.update_install_button()
+        
+        def run():
+            try:
+                discover(on_found=lambda candidate: self.events.call(self.show_candidate, candidate))
+            except Exception as e:
+                print(f"Error checking system: {e}")
+            self.events.call(self.finish_check_system)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def show_candidate(self, candidate):
+        # Keeps the best version seen so far for each product.
+        version = ".".join(map(str, candidate.version[:3])) if candidate.version else None
+        best = getattr(self, f"{candidate.product}_candidate", None)
+        if best is not None and best.rank() >= candidate.rank():
+            return
+        if candidate.product == "vlc":
+            self.vlc_var.set(f"Found: {candidate.path}")
             self.vlc_status = True
-            self.vlc_path = vlc_path
+            self.vlc_path = candidate.path
+        elif candidate.product == "chrome":
+            self.chrome_var.set(f"Found: {candidate.path}")
+            self.chrome_status = True
+            self.chrome_path = candidate.path
+        elif candidate.product == "python":
+            if (candidate.version or ()) < PYTHON_MIN_VERSION:
+                return
+            self.python_var.set(f"Found: Python {version}")
+            self.python_status = True
+            self.python_path = candidate.path
         else:
+            return
+        setattr(self, f"{candidate.product}_candidate", candidate)
+        self.update_install_button()
+    
+    def finish_check_system(self):
+        if not self.vlc_status:
             self.vlc_var.set("Not found")
-            self.vlc_status = False
             self.vlc_button.grid(row=0, column=2, padx=10)
         
-        chrome_path = check_chrome()
-        if chrome_path:
-            self.chrome_var.set(f"Found: {chrome_path}")
-            self.chrome_status = True
-            self.chrome_path = chrome_path
-        else:
+        if not self.chrome_status:
             self.chrome_var.set("Not found - Please install Chrome")
-            self.chrome_status = False
         
-        python_path = check_python()
-        if python_path:
+        if not self.python_status and not getattr(sys, "frozen", False) and sys.version_info >= PYTHON_MIN_VERSION:
             self.python_var.set(f"Found: Python {sys.version_info.major}.{sys.version_info.minor}")
             self.python_status = True
-        else:
+            self.python_path = sys.executable
+        if not self.python_status:
             self.python_var.set("Python 3.9+ not found")
-            self.python_status = False
             self.python_button.grid(row=2, column=2, padx=10)
         
         self.update_install_button()
@@ -392,26 +222,44 @@ class InstallerGUI:
             messagebox.showerror("Invalid Selection", "Please select the VLC executable (vlc.exe)")
     
     def install_python(self):
-        self.status_text.set("Installing Python 3.11...")
-        self.progress_var.set(10)
-        self.root.update()
+        self.python_button["state"] = "disabled"
+        self.status_text.set("Downloading Python 3.11...")
+        progress = events.Progress(self.events, PYTHON_INSTALL_WEIGHTS, "progress_var")
+        progress.reset()
+        
+        def report(done, total):
+            progress.update("download", done, total)
+            if total and done >= total:
+                self.events.set("status_text", "Installing Python 3.11...")
+            elif total:
+                self.events.set("status_text", f"Downloading Python 3.11... {done / 1e6:.1f} of {total / 1e6:.1f} MB")
         
         def do_install():
-            success = install_python()
+            success = install_python(report)
+            python_path = None
             if success:
-                self.python_var.set("Python 3.11 installed")
-                self.python_status = True
-                self.python_button.grid_forget()
-            else:
-                self.python_var.set("Failed to install Python")
-                messagebox.showerror("Installation Error", 
-                                    "Failed to install Python. Please install Python 3.9 or higher manually.")
-            
-            self.status_text.set("Ready to install")
-            self.progress_var.set(0)
-            self.update_install_button()
+                progress.finish("install")
+                candidate = discover(("python",), refresh=True).best("python", PYTHON_MIN_VERSION)
+                python_path = candidate.path if candidate else None
+            self.events.call(self.python_install_finished, success, python_path)
+        
+        threading.Thread(target=do_install, daemon=True).start()
+    
+    def python_install_finished(self, success, python_path):
+        if success:
+            self.python_var.set("Python 3.11 installed")
+            self.python_status = True
+            self.python_path = python_path
+            self.python_button.grid_forget()
+        else:
+            self.python_var.set("Failed to install Python")
+            self.python_button["state"] = "normal"
+            messagebox.showerror("Installation Error", 
+                                "Failed to install Python. Please install Python 3.9 or higher manually.")
         
-        threading.Thread(target=do_install).start()
+        self.status_text.set("Ready to install")
+        self.progress_var.set(0)
+        self.update_install_button()
     
     def update_install_button(self):
         if not self.vlc_status or not self.chrome_status:
@@ -429,45 +277,39 @@ class InstallerGUI:
         if hasattr(self, 'python_button') and self.python_button.winfo_ismapped():
             self.python_button["state"] = "disabled"
         
-        threading.Thread(target=self.perform_installation).start()
+        threading.Thread(target=self.perform_installation, daemon=True).start()
     
     def perform_installation(self):
+        # Runs on a worker thread: everything shown goes through self.events.
+        progress = events.Progress(self.events, install.STEP_WEIGHTS, "progress_var")
+        progress.reset()
+        
+        def started(step):
+            self.events.set("status_text", f"{step.title}...")
+        
+        def finished(step, error):
+            if error is None or step.optional:
+                progress.finish(step.name)
+        
         try:
-            self.status_text.set("Creating directories...")
-            self.progress_var.set(15)
-            self.root.update()
+            install.install(effects.WindowsEffects(), APP_DIR, RESOURCE_DIR, self.vlc_path,
+                            self.python_path or sys.executable, on_start=started, on_finish=finished)
             
-            # Create all necessary files
-            create_files(self.vlc_path)
-            
-            self.status_text.set("Registering native messaging host...")
-            self.progress_var.set(50)
-            self.root.update()
-            
-            # Register in Windows registry
-            key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, 
-                                 r"Software\Google\Chrome\NativeMessagingHosts\com.vlc.opener")
-            winreg.SetValue(key, "", winreg.REG_SZ, 
-                          os.path.join(NATIVE_HOST_DIR, "com.vlc.opener.json"))
-            winreg.CloseKey(key)
-            
-            self.status_text.set("Creating shortcuts...")
-            self.progress_var.set(75)
-            self.root.update()
-            
-            create_uninstall_shortcut()
-            
-            self.status_text.set("Installation complete!")
-            self.progress_var.set(100)
-            
-            self.root.after(500, self.show_completion_dialog)
+            self.events.set("status_text", "Installation complete!")
+            self.events.call(self.root.after, 500, self.show_completion_dialog)
             
+        except steps.StepError as e:
+            self.events.set("status_text", f"Error: {e} (changes undone)")
+            self.events.call(self.installation_failed, str(e.cause))
         except Exception as e:
-            self.status_text.set(f"Error: {str(e)}")
-            messagebox.showerror("Installation Error", f"An error occurred during installation:\n{str(e)}")
-            
-            self.install_button["state"] = "normal"
-            self.cancel_button["state"] = "normal"
+            self.events.set("status_text", f"Error: {str(e)}")
+            self.events.call(self.installation_failed, str(e))
+    
+    def installation_failed(self, error):
+        messagebox.showerror("Installation Error", f"An error occurred during installation:\n{error}")
+        
+        self.install_button["state"] = "normal"
+        self.cancel_button["state"] = "normal"
     
     def show_completion_dialog(self):
         result = messagebox.askyesno("Installation Complete", 
@@ -538,11 +380,7 @@ class InstallerGUI:
                 with open(manifest_path, 'w') as f:
                     json.dump(manifest, f, indent=2)
                 
-                key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, 
-                                     r"Software\Google\Chrome\NativeMessagingHosts\com.vlc.opener")
-                winreg.SetValue(key, "", winreg.REG_SZ, 
-                              os.path.join(NATIVE_HOST_DIR, "com.vlc.opener.json"))
-                winreg.CloseKey(key)
+                effects.WindowsEffects().register_host(os.path.join(NATIVE_HOST_DIR, "com.vlc.opener.json"))
                 
                 messagebox.showinfo("Setup Complete", 
                                   "The VLC Streamer extension is now fully configured!\n\n"
@@ -559,6 +397,11 @@ class InstallerGUI:
         ttk.Button(button_frame, text="Cancel", command=lambda: [id_dialog.destroy(), self.root.destroy()]).pack(side=tk.RIGHT)
 
 def main():
+    from vlc_installer import cli
+    if cli.is_headless(sys.argv[1:]):
+        # Install options mean a headless install: no elevation, no window, a JSON result.
+        sys.exit(cli.main(sys.argv[1:]))
+    
     if not is_admin():
         restart_as_admin()
     